@@ -0,0 +1 @@
+"""Benchmarks for the Python side of Orbital Viewer (run with ``python -m benchmarks.<name>``)."""
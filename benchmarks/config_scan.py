@@ -0,0 +1,92 @@
+"""Config generation throughput on a synthetic calculation tree.
+
+Builds a tree of empty files shaped like a batch of excited-state jobs (one
+folder per job with hole/electron cubes and a few log files), then times
+``generate_config`` with different worker counts and checks that every run
+produces the same groups as the serial scan.
+
+    python -m benchmarks.config_scan --files 50000 --workers 1 4 16
+
+Cold-cache numbers (the interesting case on network filesystems) require
+dropping the page cache between runs, e.g. ``sync; echo 3 > /proc/sys/vm/drop_caches``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from orbviewer.config_gen import ScanStats, generate_config
+
+# Files per job folder: 4 hole/electron pairs, 2 stand-alone cubes, 6 others.
+_JOB_FILES = (
+    [f"hole_{i}.cub" for i in range(1, 5)]
+    + [f"electron_{i}.cub" for i in range(1, 5)]
+    + ["density.cube", "esp.cub"]
+    + ["job.log", "job.fchk", "job.gjf", "job.chk", "run.sh", "notes.txt"]
+)
+
+
+def make_tree(root: Path, n_files: int, jobs_per_batch: int = 50) -> int:
+    """Create ``batch_XXX/job_YYYY/<files>`` below ``root``; returns the file count."""
+
+    per_job = len(_JOB_FILES)
+    n_jobs = max(1, n_files // per_job)
+    for job in range(n_jobs):
+        folder = root / f"batch_{job // jobs_per_batch:03d}" / f"job_{job:05d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        for name in _JOB_FILES:
+            (folder / name).touch()
+    return n_jobs * per_job
+
+
+def _groups(config: dict) -> List[tuple]:
+    return [(v["id"], v["fileName1"], v["fileName2"]) for v in config["viewers"]]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50000, help="approximate number of files in the tree")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="worker counts to compare")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per worker count (best is reported)")
+    parser.add_argument("--tree", type=Path, help="reuse/create the tree here instead of a temp dir")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="orbviewer-bench-") as tmp:
+        root = args.tree or Path(tmp)
+        t0 = time.perf_counter()
+        total = make_tree(root, args.files)
+        print(f"tree: {root} ({total} files, built in {time.perf_counter() - t0:.1f} s)")
+
+        reference = None
+        for workers in args.workers:
+            best = None
+            best_total = float("inf")
+            for _ in range(args.repeat):
+                stats = ScanStats()
+                t0 = time.perf_counter()
+                config = generate_config(root, workers=workers, stats=stats)
+                best_total = min(best_total, time.perf_counter() - t0)
+                if best is None or stats.seconds < best.seconds:
+                    best = stats
+
+                groups = _groups(config)
+                if reference is None:
+                    reference = groups
+                elif groups != reference:
+                    raise SystemExit(f"workers={workers}: groups differ from the first run")
+
+            print(f"workers={workers:>3}  scan {best.seconds:7.3f} s  {best.files_per_second:10.0f} files/s  "
+                  f"total {best_total:7.3f} s  "
+                  f"({best.directories} dirs, {best.cube_files} cubes, {len(reference)} groups)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,136 @@
+"""Peak memory of reading a large cube file.
+
+Writes a synthetic Gaussian-style cube of the requested size (header + values in
+``%13.5E`` format, 6 per line), then reads it in a fresh process per mode and
+reports peak RSS, the tracemalloc peak (NumPy reports its buffers to tracemalloc)
+and throughput:
+
+- ``stream``: :func:`orbviewer.cube.read_cube` (chunked, into a float32 array)
+- ``memmap``: the same, streamed into a ``.npy`` memory map on disk
+- ``whole``:  the previous approach (read the whole file, then parse it);
+  needs several times the file size in RAM
+
+    python -m benchmarks.cube_memory --size-gb 4 --modes stream memmap
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from orbviewer.cube import read_cube, read_cube_header
+
+BYTES_PER_VALUE = 13 + 1 / 6  # "%13.5E" plus a newline every 6 values
+
+
+def make_cube(path: Path, size_bytes: int) -> int:
+    """Write a cube of about ``size_bytes``; returns the grid edge length."""
+
+    n = max(6, int(round((size_bytes / BYTES_PER_VALUE) ** (1 / 3))))
+    n -= n % 6  # whole lines per z column
+    rng = np.random.default_rng(0)
+
+    with path.open("w", encoding="ascii") as f:
+        f.write(" synthetic cube\n memory benchmark\n")
+        f.write(f"{1:5d}{-10.0:12.6f}{-10.0:12.6f}{-10.0:12.6f}\n")
+        step = 20.0 / n
+        for axis in range(3):
+            v = [0.0, 0.0, 0.0]
+            v[axis] = step
+            f.write(f"{n:5d}{v[0]:12.6f}{v[1]:12.6f}{v[2]:12.6f}\n")
+        f.write(f"{6:5d}{6.0:12.6f}{0.0:12.6f}{0.0:12.6f}{0.0:12.6f}\n")
+
+        # One formatted block of z columns, repeated (the values do not matter here).
+        column_lines = n // 6
+        block_values = rng.normal(0.0, 0.01, size=(min(n * n, 4096) * column_lines, 6))
+        block = "\n".join("".join(f"{x:13.5E}" for x in row) for row in block_values) + "\n"
+        columns_per_block = block_values.shape[0] // column_lines
+
+        columns = n * n
+        while columns > 0:
+            take = min(columns, columns_per_block)
+            f.write(block if take == columns_per_block else "\n".join(block.split("\n")[: take * column_lines]) + "\n")
+            columns -= take
+    return n
+
+
+def _peak_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _read_whole(path: Path) -> np.ndarray:
+    header = read_cube_header(path)
+    with path.open("rb") as f:
+        f.seek(header.data_offset)
+        raw = f.read()
+    values = np.fromstring(raw, dtype=np.float64, sep=" ")
+    del raw
+    return values[: header.n_values].astype(np.float32).reshape(header.shape)
+
+
+def _run(mode: str, path: str, workdir: str) -> dict:
+    path = Path(path)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    if mode == "stream":
+        data = read_cube(path).data
+    elif mode == "memmap":
+        header = read_cube_header(path)
+        out = np.lib.format.open_memmap(Path(workdir) / "grid.npy", mode="w+", dtype="<f4", shape=header.shape)
+        data = read_cube(path, out=out).data
+        data.flush()
+    elif mode == "whole":
+        data = _read_whole(path)
+    else:
+        raise ValueError(mode)
+    seconds = time.perf_counter() - t0
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mode": mode,
+        "seconds": seconds,
+        "array_bytes": int(data.nbytes),
+        "peak_rss": _peak_rss_bytes(),
+        "traced_peak": traced_peak,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-gb", type=float, default=4.0, help="size of the synthetic cube")
+    parser.add_argument("--path", type=Path, help="use/create the cube here instead of a temp file")
+    parser.add_argument("--modes", nargs="+", default=["stream", "memmap"], choices=["stream", "memmap", "whole"])
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="orbviewer-bench-") as tmp:
+        path = args.path or Path(tmp) / "synthetic.cube"
+        if not path.exists():
+            t0 = time.perf_counter()
+            n = make_cube(path, int(args.size_gb * 1024 ** 3))
+            print(f"wrote {path} ({n}^3 grid) in {time.perf_counter() - t0:.0f} s")
+        size = path.stat().st_size
+        print(f"file: {size / 1024 ** 3:.2f} GB")
+
+        ctx = multiprocessing.get_context("spawn")
+        for mode in args.modes:
+            # A fresh process per mode so ru_maxrss belongs to that run only.
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                r = pool.submit(_run, mode, str(path), tmp).result()
+            print(f"{r['mode']:<7} {r['seconds']:7.1f} s  {size / r['seconds'] / 1024 ** 2:6.1f} MB/s  "
+                  f"array {r['array_bytes'] / 1024 ** 2:8.0f} MB  peak RSS {r['peak_rss'] / 1024 ** 2:8.0f} MB  "
+                  f"tracemalloc peak {r['traced_peak'] / 1024 ** 2:8.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,361 @@
+"""Load test: many concurrent viewer sessions against an in-process server.
+
+The server is built by :func:`orbviewer.server.create_viewer_server` (exactly what
+``orbviewer config.json`` runs) and listens on an ephemeral port in this process.
+Simulated users run as threads in separate client processes, so
+``time.process_time()`` and the RSS of this process are the server's. Every user
+replays the requests of a page load ``--sessions`` times:
+
+- the index page ``/?config=<name>``;
+- every ``/static/`` asset the page references;
+- the config file;
+- for every cube the config references, depending on ``--fetch``:
+  ``mesh`` (what the page does by default: a coarse probe, then the +/-iso surfaces
+  at the coarse and full level), ``volume`` (binary grid at the coarse and full
+  level, as for value mapping) and/or ``raw`` (the cube file itself).
+
+Requests go through ``http.client`` with one connection per user (reused when the
+engine keeps it alive) and ``Accept-Encoding: gzip`` like a browser. Reported:
+throughput, latency percentiles overall and per route, session time, server CPU and
+RSS. Without ``--config`` a synthetic folder of hole/electron groups is generated.
+A warm-up session runs first (``--warmup 0`` measures a cold cache).
+
+    python -m benchmarks.load_test --users 20 --sessions 3
+    python -m benchmarks.load_test --engine threaded pool --users 50 -o load.json
+    python -m benchmarks.load_test --config ~/calc/orbital-viewer-config-x.json --fetch mesh volume
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from orbviewer.config_gen import create_viewer_config, viewer_files
+from orbviewer.server import SERVER_ENGINES, create_viewer_server
+
+# (route, url) of one request
+Request = Tuple[str, str]
+# (route, seconds, bytes received, HTTP status or 0 on a connection error)
+Record = Tuple[str, float, int, int]
+
+# ViewerGroup.coarseLevel in viewer-group.js
+COARSE_LEVEL = 2
+DEFAULT_ISO = 0.002
+REQUEST_TIMEOUT = 120.0
+RSS_SAMPLE_SECONDS = 0.05
+
+_STATIC_RE = re.compile(r"""(?:src|href)\s*=\s*["'](/static/[^"']+)["']""")
+
+
+def make_orbital_cube(path: Path, n: int, shift: float) -> None:
+    """Write a p-orbital-like cube (two signed lobes) on an ``n``^3 grid."""
+
+    step = 16.0 / n
+    axis = -8.0 + step * np.arange(n)
+    x, y, z = np.meshgrid(axis, axis, axis, indexing="ij")
+    values = (x - shift) * np.exp(-((x - shift) ** 2 + y ** 2 + z ** 2) / 4.0) * 0.05
+
+    with path.open("w", encoding="ascii") as f:
+        f.write(" synthetic orbital\n load test\n")
+        f.write(f"{2:5d}{-8.0:12.6f}{-8.0:12.6f}{-8.0:12.6f}\n")
+        for i in range(3):
+            v = [0.0, 0.0, 0.0]
+            v[i] = step
+            f.write(f"{n:5d}{v[0]:12.6f}{v[1]:12.6f}{v[2]:12.6f}\n")
+        f.write(f"{6:5d}{6.0:12.6f}{-1.2:12.6f}{0.0:12.6f}{0.0:12.6f}\n")
+        f.write(f"{6:5d}{6.0:12.6f}{1.2:12.6f}{0.0:12.6f}{0.0:12.6f}\n")
+        for column in values.reshape(n * n, n):
+            for start in range(0, n, 6):
+                f.write("".join(f"{v:13.5E}" for v in column[start:start + 6]) + "\n")
+
+
+def make_dataset(root: Path, groups: int, grid: int) -> Path:
+    """Synthetic calculation folder with ``groups`` hole/electron pairs; returns its config."""
+
+    root.mkdir(parents=True, exist_ok=True)
+    viewers = []
+    for i in range(1, groups + 1):
+        for name, shift in ((f"hole_{i}.cub", -0.5), (f"electron_{i}.cub", 0.5)):
+            if not (root / name).exists():
+                make_orbital_cube(root / name, grid, shift + 0.1 * i)
+        viewers.append(create_viewer_config([f"hole_{i}.cub", f"electron_{i}.cub"], i - 1))
+    config = root / "orbital-viewer-config-loadtest.json"
+    config.write_text(json.dumps({"version": "1.0", "timestamp": datetime.now().isoformat(), "viewers": viewers},
+                                 ensure_ascii=False, indent=2), encoding="utf-8")
+    return config
+
+
+def _quote(name: str) -> str:
+    return urllib.parse.quote(name.replace("\\", "/"))
+
+
+def plan_session(config: Dict[str, Any], config_name: str, default_iso: float,
+                 fetch: Sequence[str]) -> Tuple[str, List[Request]]:
+    """Index URL and the requests after the static assets for one page load."""
+
+    tail: List[Request] = [("config", "/" + _quote(config_name))]
+    for viewer in config.get("viewers", []):
+        try:
+            iso = abs(float(viewer.get("isoValue", default_iso))) or default_iso
+        except (TypeError, ValueError):
+            iso = default_iso
+        files = viewer_files(viewer)
+        if "mesh" in fetch and files:
+            tail.append(("api/mesh", f"/api/mesh/{_quote(files[0])}?iso={iso}&level={COARSE_LEVEL}"))
+            for level in (COARSE_LEVEL, 0):
+                for name in files:
+                    for value in (iso, -iso):
+                        query = f"?iso={value}" + (f"&level={level}" if level else "")
+                        tail.append(("api/mesh", f"/api/mesh/{_quote(name)}{query}"))
+        for name in files:
+            if "volume" in fetch:
+                tail.append(("api/volume", f"/api/volume/{_quote(name)}?level={COARSE_LEVEL}"))
+                tail.append(("api/volume", f"/api/volume/{_quote(name)}"))
+            if "raw" in fetch:
+                tail.append(("cube", "/" + _quote(name)))
+    index = "/?" + urllib.parse.urlencode({"config": config_name})
+    return index, tail
+
+
+def _get(conn: http.client.HTTPConnection, route: str, url: str, records: List[Record]) -> bytes:
+    """GET ``url`` and record it; returns the (decompressed) body."""
+
+    t0 = time.perf_counter()
+    encoding = None
+    try:
+        conn.request("GET", url, headers={"Accept-Encoding": "gzip"})
+        response = conn.getresponse()
+        body = response.read()
+        status = response.status
+        encoding = response.getheader("Content-Encoding")
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        body, status = b"", 0
+    records.append((route, time.perf_counter() - t0, len(body), status))
+    return gzip.decompress(body) if encoding == "gzip" else body
+
+
+def _user(port: int, index: str, tail: Sequence[Request], sessions: int, records: List[Record]) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+    try:
+        for _ in range(sessions):
+            t0 = time.perf_counter()
+            html = _get(conn, "index", index, records).decode("utf-8", "replace")
+            for asset in dict.fromkeys(_STATIC_RE.findall(html)):
+                _get(conn, "static", asset, records)
+            for route, url in tail:
+                _get(conn, route, url, records)
+            records.append(("session", time.perf_counter() - t0, 0, 200))
+    finally:
+        conn.close()
+
+
+def _client_process(port: int, index: str, tail: Sequence[Request], users: int, sessions: int) -> List[Record]:
+    """Run ``users`` simulated users as threads; returns all their records."""
+
+    records: List[Record] = []  # list.append is atomic
+    threads = [threading.Thread(target=_user, args=(port, index, tail, sessions, records)) for _ in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _RssSampler(threading.Thread):
+    """Samples the RSS of this process (the server) while the load runs."""
+
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self.samples: List[int] = []
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(RSS_SAMPLE_SECONDS):
+            rss = _rss_bytes()
+            if rss is not None:
+                self.samples.append(rss)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+def _percentiles(values: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+    return {"p50_ms": pick(0.50) * 1e3, "p95_ms": pick(0.95) * 1e3, "p99_ms": pick(0.99) * 1e3,
+            "max_ms": ordered[-1] * 1e3}
+
+
+def summarize(records: Sequence[Record], wall: float) -> Dict[str, Any]:
+    requests = [r for r in records if r[0] != "session"]
+    received = sum(r[2] for r in requests)
+    errors = sum(1 for r in requests if not 200 <= r[3] < 400)
+    routes: Dict[str, Any] = {}
+    for route in dict.fromkeys(r[0] for r in requests):
+        rows = [r for r in requests if r[0] == route]
+        routes[route] = {"requests": len(rows), "mb": sum(r[2] for r in rows) / 1e6,
+                         **_percentiles([r[1] for r in rows])}
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "seconds": wall,
+        "requests_per_s": len(requests) / wall if wall else 0.0,
+        "mb_per_s": received / wall / 1e6 if wall else 0.0,
+        "latency": _percentiles([r[1] for r in requests]),
+        "session": _percentiles([r[1] for r in records if r[0] == "session"]),
+        "routes": routes,
+    }
+
+
+def run(engine: str, args: argparse.Namespace, pool: Any) -> Dict[str, Any]:
+    httpd, context = create_viewer_server(
+        str(args.config), host="127.0.0.1", port=0, cache_dir=str(args.cache_dir), engine=engine,
+        workers=args.workers, queue_size=args.queue_size, compression=not args.no_gzip,
+        bundle_scripts=args.bundle_js,
+    )
+    port = httpd.server_address[1]
+    index, tail = plan_session(context.config_data or {}, context.config_name or "",
+                               float(context.default_settings.get("isoValue") or DEFAULT_ISO), args.fetch)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        if args.warmup:
+            warm = _client_process(port, index, tail, 1, args.warmup)
+            failed = sum(1 for r in warm if not 200 <= r[3] < 400)
+            if failed:
+                print(f"warning: {failed} of {len(warm)} warm-up requests failed", file=sys.stderr)
+
+        procs = max(1, min(args.client_procs, args.users))
+        shares = [args.users // procs + (i < args.users % procs) for i in range(procs)]
+        sampler = _RssSampler()
+        rss_before = _rss_bytes()
+        sampler.start()
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        results = pool.starmap(_client_process, [(port, index, tail, n, args.sessions) for n in shares])
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        sampler.stop()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        if context.cache is not None:
+            context.cache.flush_stats()
+
+    records = [r for chunk in results for r in chunk]
+    result = {"engine": engine, "users": args.users, "sessions": args.sessions, **summarize(records, wall)}
+    result["server_cpu_s"] = cpu
+    result["server_cpu_pct"] = cpu / wall * 100 if wall else 0.0
+    result["server_rss_mb"] = {
+        "before": (rss_before or 0) / 1e6,
+        "peak": (max(sampler.samples) if sampler.samples else _peak_rss_bytes()) / 1e6,
+    }
+    return result
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    lat = result["latency"]
+    print(f"\n== {result['engine']}: {result['users']} users x {result['sessions']} sessions ==")
+    print(f"requests {result['requests']} ({result['errors']} errors) in {result['seconds']:.2f} s: "
+          f"{result['requests_per_s']:.0f} req/s, {result['mb_per_s']:.1f} MB/s")
+    print(f"latency  p50 {lat['p50_ms']:.1f} ms  p95 {lat['p95_ms']:.1f} ms  p99 {lat['p99_ms']:.1f} ms  "
+          f"max {lat['max_ms']:.1f} ms")
+    if result["session"]:
+        print(f"session  p50 {result['session']['p50_ms']:.0f} ms  p95 {result['session']['p95_ms']:.0f} ms")
+    print(f"server   CPU {result['server_cpu_s']:.2f} s ({result['server_cpu_pct']:.0f}%), "
+          f"RSS {result['server_rss_mb']['before']:.0f} -> {result['server_rss_mb']['peak']:.0f} MB peak")
+    print(f"{'route':<12}{'requests':>10}{'MB':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in result["routes"].items():
+        print(f"{route:<12}{row['requests']:>10}{row['mb']:>10.1f}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", type=Path, help="config to serve (default: a synthetic folder)")
+    parser.add_argument("--groups", type=int, default=8, help="viewer groups of the synthetic folder (default 8)")
+    parser.add_argument("--grid", type=int, default=60, help="grid edge of the synthetic cubes (default 60)")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users (default 10)")
+    parser.add_argument("--sessions", type=int, default=2, help="page loads per user (default 2)")
+    parser.add_argument("--fetch", nargs="+", choices=["mesh", "volume", "raw"], default=["mesh"],
+                        help="cube requests per group (default: mesh, like the page)")
+    parser.add_argument("--engine", nargs="+", choices=SERVER_ENGINES, default=["threaded"],
+                        help="server engines to test one after another")
+    parser.add_argument("--workers", type=int, help="worker threads of the pool engine")
+    parser.add_argument("--queue-size", type=int, help="queue size of the pool engine")
+    parser.add_argument("--no-gzip", action="store_true", help="disable response compression")
+    parser.add_argument("--bundle-js", action="store_true", help="serve the page scripts as bundles")
+    parser.add_argument("--client-procs", type=int, default=os.cpu_count() or 1,
+                        help="client processes the users are spread over (default: CPU count)")
+    parser.add_argument("--warmup", type=int, default=1, help="warm-up sessions before measuring (default 1)")
+    parser.add_argument("--cache-dir", type=Path, help="server cache directory (default: a fresh temporary one)")
+    parser.add_argument("--workdir", type=Path, help="keep the synthetic folder here (reused by later runs)")
+    parser.add_argument("-o", "--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    results: Dict[str, Any] = {"timestamp": datetime.now().isoformat(timespec="seconds"), "runs": []}
+
+    with tempfile.TemporaryDirectory(prefix="orbviewer-load-") as tmp:
+        if args.config is None:
+            t0 = time.perf_counter()
+            args.config = make_dataset(args.workdir or Path(tmp) / "data", args.groups, args.grid)
+            print(f"synthetic folder: {args.groups} groups, {args.grid}^3 grid ({time.perf_counter() - t0:.1f} s)")
+        args.cache_dir = args.cache_dir or Path(tmp) / "cache"
+        results["config"] = str(args.config)
+
+        # Client processes are forked before any server thread exists.
+        with multiprocessing.Pool(max(1, min(args.client_procs, args.users))) as pool:
+            for engine in args.engine:
+                result = run(engine, args, pool)
+                results["runs"].append(result)
+                _print_result(result)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"results: {args.output}")
+    return 1 if any(r["errors"] for r in results["runs"]) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
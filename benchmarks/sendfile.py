@@ -0,0 +1,106 @@
+"""Throughput and server CPU of the sendfile vs buffered-copy file paths.
+
+The server runs in this process; clients run in a separate process and discard
+what they read, so ``time.process_time()`` of this process is the server's CPU.
+
+    python -m benchmarks.sendfile --size-mb 300 --clients 4 --rounds 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from orbviewer.server import ServerContext, ThreadedHTTPServer, make_handler
+
+
+def _make_file(path: Path, size: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with path.open("wb") as f:
+        written = 0
+        while written < size:
+            n = min(len(block), size - written)
+            f.write(block[:n])
+            written += n
+
+
+def _download(port: int, name: str) -> int:
+    with socket.create_connection(("127.0.0.1", port)) as s:
+        s.sendall(f"GET /{name} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode("ascii"))
+        total = 0
+        while True:
+            chunk = s.recv(1024 * 1024)
+            if not chunk:
+                return total
+            total += len(chunk)
+
+
+def _client(port: int, name: str, rounds: int) -> int:
+    return sum(_download(port, name) for _ in range(rounds))
+
+
+def run(size_mb: int, clients: int, rounds: int, use_sendfile: bool, workdir: Path, name: str) -> dict:
+    context = ServerContext(
+        serve_dir=workdir,
+        static_dir=workdir,
+        html_template="",
+        default_settings={},
+        compression=False,
+        use_sendfile=use_sendfile,
+    )
+    httpd = ThreadedHTTPServer(("127.0.0.1", 0), make_handler(context))
+    port = httpd.server_address[1]
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        with multiprocessing.Pool(clients) as pool:
+            received = sum(pool.starmap(_client, [(port, name, rounds)] * clients))
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    return {
+        "mode": "sendfile" if use_sendfile else "copy",
+        "bytes": received,
+        "seconds": wall,
+        "mb_per_s": received / wall / 1e6,
+        "server_cpu_s": cpu,
+        "cpu_s_per_gb": cpu / (received / 1e9) if received else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=300)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    import logging
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        name = "large.bin"
+        _make_file(workdir / name, args.size_mb * 1024 * 1024)
+
+        print(f"{args.clients} clients x {args.rounds} downloads of {args.size_mb} MB")
+        print(f"{'mode':<10}{'MB/s':>10}{'server CPU s':>14}{'CPU s/GB':>10}")
+        for use_sendfile in (False, True):
+            r = run(args.size_mb, args.clients, args.rounds, use_sendfile, workdir, name)
+            print(f"{r['mode']:<10}{r['mb_per_s']:>10.0f}{r['server_cpu_s']:>14.2f}{r['cpu_s_per_gb']:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
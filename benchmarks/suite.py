@@ -0,0 +1,263 @@
+"""Micro-benchmark suite with JSON results for comparing versions.
+
+Runs every benchmark below on synthetic data (no calculation output needed) and
+writes the results as JSON; ``--compare`` checks them against an earlier run and
+exits with status 1 when something got slower than ``--threshold``.
+
+- ``cube_parse``: :func:`orbviewer.cube.read_cube` on a generated cube (MB/s)
+- ``cube_header``: :func:`orbviewer.cube.read_cube_header` per file
+- ``generate_config``: :func:`orbviewer.config_gen.generate_config` on a generated
+  calculation tree (files/s)
+- ``render_index``: ``_render_index_html`` with a config of many viewer groups
+- ``convert_view``: :func:`orbviewer.convert.convert_3dmol_view_to_vmd` per call
+- ``safe_join``: :func:`orbviewer.utils.safe_join` per call (nested, missing,
+  percent-encoded and traversal paths)
+
+Every benchmark reports ``seconds`` (best of ``--repeat`` runs, per call for the
+micro benchmarks); that is the value compared between runs.
+
+    python -m benchmarks.suite -o bench-before.json
+    python -m benchmarks.suite --compare bench-before.json -o bench-after.json
+    python -m benchmarks.suite --quick --only cube_parse safe_join
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from orbviewer.config_gen import create_viewer_config, generate_config
+from orbviewer.convert import convert_3dmol_view_to_vmd
+from orbviewer.cube import read_cube, read_cube_header
+from orbviewer.resources import resolve_resource
+from orbviewer.server import _render_index_html
+from orbviewer.settings import DEFAULT_SETTINGS
+from orbviewer.utils import safe_join
+
+from .config_scan import make_tree
+from .cube_memory import make_cube
+
+# Sizes of the synthetic inputs: (normal, --quick)
+SIZES = {
+    "cube_mb": (64, 8),
+    "tree_files": (20000, 2000),
+    "groups": (5000, 500),
+}
+
+Benchmark = Callable[[Path, argparse.Namespace], Dict[str, Any]]
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of ``repeat`` calls."""
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def _per_call(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Per-call time of a fast function (loop count calibrated like ``python -m timeit``)."""
+
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"seconds": best, "us_per_call": best * 1e6, "loops": number}
+
+
+def bench_cube_parse(workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    path = workdir / "synthetic.cube"
+    if not path.exists():
+        make_cube(path, int(args.cube_mb * 1024 * 1024))
+    size = path.stat().st_size
+    header = read_cube_header(path)
+    seconds = _best(lambda: read_cube(path), args.repeat)
+    return {
+        "seconds": seconds,
+        "mb_per_s": size / seconds / 1024 / 1024,
+        "voxels_per_s": header.n_values / seconds,
+        "file_mb": size / 1024 / 1024,
+        "dims": list(header.dims),
+    }
+
+
+def bench_cube_header(workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    path = workdir / "synthetic.cube"
+    if not path.exists():
+        make_cube(path, int(args.cube_mb * 1024 * 1024))
+    return _per_call(lambda: read_cube_header(path), args.repeat)
+
+
+def bench_generate_config(workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    root = workdir / "tree"
+    if not root.exists():
+        root.mkdir()
+        files = make_tree(root, args.tree_files)
+    else:
+        files = sum(1 for p in root.rglob("*") if p.is_file())
+    groups: List[int] = []
+    seconds = _best(lambda: groups.append(len(generate_config(root, workers=args.workers)["viewers"])), args.repeat)
+    return {"seconds": seconds, "files_per_s": files / seconds, "files": files, "groups": groups[-1],
+            "workers": args.workers}
+
+
+def _synthetic_config(groups: int) -> Dict[str, Any]:
+    viewers = []
+    for i in range(groups):
+        job = f"batch_{i // 50:03d}/job_{i:05d}"
+        viewer = create_viewer_config([f"{job}/hole_1.cub", f"{job}/electron_1.cub"], i)
+        viewer["notes"] = {"notes": f"S{i % 20 + 1} 激发态，振子强度 0.{i % 1000:03d}"}
+        viewers.append(viewer)
+    return {"version": "1.0", "timestamp": datetime.now().isoformat(), "viewers": viewers}
+
+
+def bench_render_index(workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    template = resolve_resource("orbital_viewer.html").read_text(encoding="utf-8")
+    config = _synthetic_config(args.groups)
+    size = len(_render_index_html(template, DEFAULT_SETTINGS, config, "config.json"))
+    seconds = _best(lambda: _render_index_html(template, DEFAULT_SETTINGS, config, "config.json"), max(args.repeat, 5))
+    return {"seconds": seconds, "ms_per_call": seconds * 1e3, "groups": args.groups, "page_kb": size / 1024}
+
+
+def bench_convert_view(workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(0)
+    views = []
+    for _ in range(256):
+        q = np.array([rng.gauss(0, 1) for _ in range(4)])
+        q /= np.linalg.norm(q)
+        views.append([rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(50, 140), *q.tolist()])
+    it = itertools.cycle(views)
+    return _per_call(lambda: convert_3dmol_view_to_vmd(next(it)), args.repeat)
+
+
+def bench_safe_join(workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    base = workdir / "serve"
+    nested = base / "batch_000" / "job_00001"
+    nested.mkdir(parents=True, exist_ok=True)
+    (nested / "hole 1.cub").touch()
+    paths = [
+        "/batch_000/job_00001/hole%201.cub",  # existing, percent-encoded
+        "batch_000/job_00001/electron_1.cub",  # missing file
+        "batch_000\\job_00001\\hole 1.cub",  # Windows separators from a config
+        "/../../etc/passwd",  # traversal, rejected
+        "config.json",
+    ]
+    it = itertools.cycle(paths)
+    return _per_call(lambda: safe_join(base, next(it)), args.repeat)
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "cube_parse": bench_cube_parse,
+    "cube_header": bench_cube_header,
+    "generate_config": bench_generate_config,
+    "render_index": bench_render_index,
+    "convert_view": bench_convert_view,
+    "safe_join": bench_safe_join,
+}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table; returns the names of benchmarks that got slower."""
+
+    slower = []
+    print(f"\n{'benchmark':<18}{'before':>14}{'after':>14}{'change':>10}")
+    for name, result in current["benchmarks"].items():
+        old = previous.get("benchmarks", {}).get(name)
+        if not old or not old.get("seconds"):
+            print(f"{name:<18}{'-':>14}{result['seconds']:>14.6g}{'new':>10}")
+            continue
+        change = result["seconds"] / old["seconds"] - 1
+        flag = ""
+        if change > threshold:
+            slower.append(name)
+            flag = "  SLOWER"
+        print(f"{name:<18}{old['seconds']:>14.6g}{result['seconds']:>14.6g}{change:>+10.1%}{flag}")
+    return slower
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small inputs (smoke test, noisy numbers)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (best is reported)")
+    parser.add_argument("--cube-mb", type=float, help=f"size of the synthetic cube (default {SIZES['cube_mb'][0]})")
+    parser.add_argument("--tree-files", type=int, help=f"files in the synthetic tree (default {SIZES['tree_files'][0]})")
+    parser.add_argument("--groups", type=int, help=f"viewer groups of the synthetic config (default {SIZES['groups'][0]})")
+    parser.add_argument("--workers", type=int, help="generate_config workers (default: its own default)")
+    parser.add_argument("--workdir", type=Path, help="keep the synthetic data here (reused by later runs)")
+    parser.add_argument("-o", "--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="results JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.15, help="slowdown reported as regression (default 0.15)")
+    args = parser.parse_args(argv)
+
+    for key, (normal, quick) in SIZES.items():
+        if getattr(args, key) is None:
+            setattr(args, key, quick if args.quick else normal)
+
+    logging.basicConfig(level=logging.WARNING)
+    names = args.only or list(BENCHMARKS)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "repeat": args.repeat,
+        },
+        "benchmarks": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="orbviewer-bench-") as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            t0 = time.perf_counter()
+            result = BENCHMARKS[name](workdir, args)
+            results["benchmarks"][name] = result
+            details = ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                                for k, v in result.items() if k != "seconds")
+            print(f"{name:<18}{result['seconds']:>12.6g} s   {details}   ({time.perf_counter() - t0:.1f} s)")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"results: {args.output}")
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))
+        slower = compare(previous, results, args.threshold)
+        if slower:
+            print(f"\nslower than {args.compare} by more than {args.threshold:.0%}: {', '.join(slower)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,7 @@
+"""Allow ``python -m orbviewer ...`` (same as main.py)."""
+
+from .cli import main
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
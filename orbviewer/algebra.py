@@ -0,0 +1,160 @@
+"""Volume arithmetic on cube grids (``/api/combine``).
+
+Hole/electron analyses and density differences need a combination of two cubes,
+e.g. ``electron_3 - hole_3``. Instead of downloading both full grids and combining
+them in the browser, the server computes the derived grid once with NumPy, caches
+it like a parsed cube (keyed by the operands and the operation) and serves it
+through the same pipeline as :func:`orbviewer.volume.load_volume`, so levels of
+detail, cropping and quantized encodings apply to it as well.
+
+Operations (:data:`VOLUME_OPS`): ``add`` (a + b), ``sub`` (a - b), ``mul`` (a * b)
+and ``abs`` (|a|). The first operand defines the common grid; operands on a
+different grid are resampled onto it with trilinear interpolation (zero outside
+their box).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .volume import load_volume, select_volume
+
+if TYPE_CHECKING:
+    from .cache import VolumeCache
+
+# operation -> number of operands
+VOLUME_OPS = {
+    "add": 2,
+    "sub": 2,
+    "mul": 2,
+    "abs": 1,
+}
+
+# Grids whose origin/axes agree within this tolerance (Bohr) are combined directly.
+GRID_TOLERANCE = 1e-6
+
+
+def same_grid(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """True when two volume headers describe the same grid points."""
+
+    return (
+        list(a["dims"]) == list(b["dims"])
+        and np.allclose(a["origin"], b["origin"], rtol=0, atol=GRID_TOLERANCE)
+        and np.allclose(a["axes"], b["axes"], rtol=0, atol=GRID_TOLERANCE)
+    )
+
+
+def _trilinear(grid: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """Interpolate ``grid`` at fractional indices ``index`` (n, 3); zero outside the grid."""
+
+    shape = np.asarray(grid.shape[:3])
+    inside = np.all((index >= -GRID_TOLERANCE) & (index <= shape - 1 + GRID_TOLERANCE), axis=1)
+
+    # Cells are addressed by their lower corner; the last cell is reused on the upper faces.
+    lower = np.clip(np.floor(index).astype(np.intp), 0, np.maximum(shape - 2, 0))
+    t = np.clip(index - lower, 0.0, 1.0)
+    upper = np.minimum(lower + 1, shape - 1)
+
+    out = np.zeros(index.shape[0], dtype=np.float64)
+    for dx in (0, 1):
+        wx = t[:, 0] if dx else 1 - t[:, 0]
+        ix = upper[:, 0] if dx else lower[:, 0]
+        for dy in (0, 1):
+            wy = t[:, 1] if dy else 1 - t[:, 1]
+            iy = upper[:, 1] if dy else lower[:, 1]
+            for dz in (0, 1):
+                wz = t[:, 2] if dz else 1 - t[:, 2]
+                iz = upper[:, 2] if dz else lower[:, 2]
+                out += wx * wy * wz * grid[ix, iy, iz]
+    out[~inside] = 0.0
+    return out.astype(np.float32)
+
+
+def sample_grid(grid: np.ndarray, meta: Dict[str, Any], points: np.ndarray) -> np.ndarray:
+    """Interpolate a grid at world points ``points`` (n, 3, Bohr); zero outside its box."""
+
+    inv = np.linalg.inv(np.asarray(meta["axes"], dtype=np.float64))
+    index = (np.asarray(points, dtype=np.float64) - np.asarray(meta["origin"], dtype=np.float64)) @ inv
+    return _trilinear(grid, index)
+
+
+def resample_grid(grid: np.ndarray, source: Dict[str, Any], target: Dict[str, Any]) -> np.ndarray:
+    """Resample a grid described by ``source`` onto the grid points of ``target``.
+
+    Works one plane (first axis) of the target at a time, so the index arrays stay
+    small even for large grids.
+    """
+
+    inv = np.linalg.inv(np.asarray(source["axes"], dtype=np.float64))
+    # Target grid point (i, j, k) in source index space: base + i*step[0] + j*step[1] + k*step[2].
+    base = (np.asarray(target["origin"], dtype=np.float64) - np.asarray(source["origin"], dtype=np.float64)) @ inv
+    step = np.asarray(target["axes"], dtype=np.float64) @ inv
+
+    nx, ny, nz = (int(n) for n in target["dims"])
+    j, k = np.meshgrid(np.arange(ny), np.arange(nz), indexing="ij")
+    plane = base + j.reshape(-1, 1) * step[1] + k.reshape(-1, 1) * step[2]
+
+    out = np.empty((nx, ny, nz), dtype=np.float32)
+    for i in range(nx):
+        out[i] = _trilinear(grid, plane + i * step[0]).reshape(ny, nz)
+    return out
+
+
+def combine_grids(op: str, grids: Sequence[np.ndarray]) -> np.ndarray:
+    """Apply ``op`` to grids on the same grid points."""
+
+    if op not in VOLUME_OPS:
+        raise ValueError(f"未知的体数据运算: {op}")
+    if len(grids) != VOLUME_OPS[op]:
+        raise ValueError(f"{op} 需要 {VOLUME_OPS[op]} 个体数据，实际 {len(grids)} 个")
+
+    a = np.asarray(grids[0], dtype=np.float32)
+    if op == "abs":
+        return np.abs(a)
+    b = np.asarray(grids[1], dtype=np.float32)
+    if op == "add":
+        return np.add(a, b)
+    if op == "sub":
+        return np.subtract(a, b)
+    return np.multiply(a, b)
+
+
+def load_combined(op: str, paths: Sequence[Path], cache: Optional["VolumeCache"] = None, level: int = 0,
+                  crop: Optional[float] = None, names: Optional[Sequence[str]] = None) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Return ``(json_header, float32_grid)`` of ``op`` applied to the cubes ``paths``.
+
+    The header is the first operand's (atoms and grid) with the value range of the
+    result and an ``operation`` object (``op``, ``operands``; ``names`` defaults to
+    the file names). ``level`` and ``crop`` behave as in :func:`orbviewer.volume.load_volume`.
+    """
+
+    paths = [Path(p) for p in paths]
+    if op not in VOLUME_OPS:
+        raise ValueError(f"未知的体数据运算: {op}")
+    if len(paths) != VOLUME_OPS[op]:
+        raise ValueError(f"{op} 需要 {VOLUME_OPS[op]} 个体数据，实际 {len(paths)} 个")
+    operands = list(names) if names is not None else [p.name for p in paths]
+
+    def build():
+        volumes = [load_volume(p, cache) for p in paths]
+        target = volumes[0][0]
+        grids: List[np.ndarray] = []
+        for meta, grid in volumes:
+            grids.append(grid if same_grid(meta, target) else resample_grid(grid, meta, target))
+        result = combine_grids(op, grids)
+
+        meta = dict(target, min=float(result.min()), max=float(result.max()),
+                    operation={"op": op, "operands": operands})
+        return meta, {"grid": result.astype("<f4", copy=False)}
+
+    params = {"op": op}
+    if cache is None:
+        meta, arrays = build()
+        grid = arrays["grid"]
+    else:
+        entry = cache.get_or_create(paths, "grid", build, params=params)
+        meta, grid = entry.meta, entry.arrays["grid"]
+    return select_volume(paths, meta, grid, cache, level, crop, params=params)
@@ -0,0 +1,179 @@
+"""Content-hashed static assets (fingerprinted URLs with immutable caching).
+
+The page template references its scripts and styles as ``/static/<name>``. Served
+under those names they can only be cached for a short time (``max-age``), so every
+fresh client, and every client after the cache expired, downloads ~600 KB of
+scripts again. :class:`StaticAssets` rewrites the template instead:
+
+- every ``src``/``href`` pointing to ``/static/<path>`` becomes
+  ``/static/<stem>.<hash>.<ext>``, where ``hash`` is derived from the file content.
+  These URLs never change meaning, so they are served with
+  ``Cache-Control: public, max-age=31536000, immutable``;
+- with ``bundle=True`` every run of consecutive ``<script src="/static/...">`` tags
+  is replaced by one script ``/static/bundle.<hash>.js`` (the files concatenated
+  in order), which saves requests on high-latency connections;
+- fingerprinted assets are kept in memory together with a gzip-compressed variant
+  (compressed once, on first use).
+
+Assets are read through :func:`orbviewer.resources.static_dir`, so this works the
+same inside a PyInstaller bundle (``sys._MEIPASS``); nothing is written to disk.
+Source files are checked by (mtime, size) whenever the page is rendered
+(:meth:`StaticAssets.version`): an edited script gets a new hash and the page is
+rendered with the new URL. Plain ``/static/<path>`` URLs keep working.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+from .compress import GZIP_LEVEL, MIN_COMPRESS_SIZE
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Hex digits of the content hash in asset names
+HASH_LENGTH = 10
+
+_ASSET_REF = re.compile(r"""(?P<attr>\b(?:src|href)\s*=\s*)(?P<q>["'])/static/(?P<rel>[^"'?#]+)(?P=q)""")
+_SCRIPT_TAG = r"""[ \t]*<script\s+src=["']/static/[^"'?#]+\.js["']\s*>\s*</script>[ \t]*\r?\n?"""
+_SCRIPT_RUN = re.compile(f"(?:{_SCRIPT_TAG}){{2,}}")
+_SCRIPT_SRC = re.compile(r"""src=["']/static/([^"'?#]+)["']""")
+
+
+@dataclass
+class Asset:
+    """One fingerprinted asset (a static file or a script bundle)."""
+
+    url: str
+    data: bytes
+    digest: str
+    # Files the asset was built from (relative to the static dir)
+    sources: Tuple[str, ...]
+    _gzipped: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+    def gzipped(self) -> Optional[bytes]:
+        """gzip variant (None when the asset is too small to bother)."""
+
+        if self._gzipped is None and len(self.data) >= MIN_COMPRESS_SIZE:
+            self._gzipped = gzip.compress(self.data, GZIP_LEVEL)
+        return self._gzipped
+
+
+def hashed_name(rel: str, digest: str) -> str:
+    """``js/app.js`` -> ``js/app.<digest>.js``."""
+
+    p = PurePosixPath(rel)
+    return str(p.with_name(f"{p.stem}.{digest}{p.suffix}"))
+
+
+class StaticAssets:
+    """Fingerprinted versions of the files under ``root`` referenced by the page template."""
+
+    def __init__(self, root: Path, *, bundle: bool = False) -> None:
+        self.root = Path(root)
+        self.bundle = bundle
+        # (mtime_ns, size) and current asset of every source file seen so far
+        self._files: Dict[str, Tuple[Tuple[int, int], Asset]] = {}
+        # URL path -> asset; older versions stay available for pages rendered before a change
+        self._by_url: Dict[str, Asset] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _path(self, rel: str) -> Optional[Path]:
+        path = (self.root / rel).resolve()
+        try:
+            path.relative_to(self.root.resolve())
+        except ValueError:
+            return None
+        return path if path.is_file() else None
+
+    def _file(self, rel: str) -> Optional[Asset]:
+        """Current asset of one source file (re-hashed when its stamp changed)."""
+
+        path = self._path(rel)
+        if path is None:
+            return None
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            known = self._files.get(rel)
+        if known is not None and known[0] == stamp:
+            return known[1]
+
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        asset = Asset("/static/" + hashed_name(rel, digest), data, digest, (rel,))
+        with self._lock:
+            self._files[rel] = (stamp, asset)
+            self._by_url[asset.url] = asset
+            if known is not None:
+                self._version += 1
+        return asset
+
+    def _bundle(self, rels: List[str]) -> Optional[Asset]:
+        parts: List[bytes] = []
+        for rel in rels:
+            asset = self._file(rel)
+            if asset is None:
+                return None
+            # The separator guards against files without a trailing newline/semicolon.
+            parts.append(f"/* {rel} */\n".encode("utf-8") + asset.data + b"\n;\n")
+        data = b"".join(parts)
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        url = f"/static/bundle.{digest}.js"
+        with self._lock:
+            asset = self._by_url.get(url)
+            if asset is None:
+                asset = self._by_url[url] = Asset(url, data, digest, tuple(rels))
+        return asset
+
+    def version(self) -> int:
+        """Changes whenever a source file seen by :meth:`rewrite` was modified."""
+
+        with self._lock:
+            rels = list(self._files)
+        for rel in rels:
+            try:
+                self._file(rel)
+            except OSError:
+                continue
+        return self._version
+
+    def rewrite(self, template: str) -> str:
+        """Point the template's ``/static/`` references to fingerprinted URLs."""
+
+        if self.bundle:
+            def bundle_run(match: "re.Match[str]") -> str:
+                run = match.group(0)
+                asset = self._bundle(_SCRIPT_SRC.findall(run))
+                if asset is None:
+                    return run
+                indent = run[: len(run) - len(run.lstrip(" \t"))]
+                return f'{indent}<script src="{asset.url}"></script>\n'
+
+            template = _SCRIPT_RUN.sub(bundle_run, template)
+
+        def fingerprint(match: "re.Match[str]") -> str:
+            try:
+                asset = self._file(match.group("rel"))
+            except OSError:
+                asset = None
+            if asset is None:
+                return match.group(0)
+            return f'{match.group("attr")}{match.group("q")}{asset.url}{match.group("q")}'
+
+        return _ASSET_REF.sub(fingerprint, template)
+
+    def lookup(self, url_path: str) -> Optional[Asset]:
+        """Fingerprinted asset served at ``url_path`` (``/static/...``), if any."""
+
+        with self._lock:
+            return self._by_url.get(url_path)
@@ -0,0 +1,346 @@
+"""Persistent on-disk cache for data derived from cube files.
+
+Parsing a large cube costs seconds, and the same calculation folders are opened
+again and again. Everything derived from a cube (float32 grid, meshes, statistics,
+...) is therefore stored here and reused as long as the source file is unchanged.
+
+Layout of the cache directory::
+
+    <key>.json              metadata of the entry (written last => entry is complete)
+    <key>.<name>.npy        one NumPy array per named buffer, memory-mapped on reload
+
+The key is a SHA-1 over the entry kind, its parameters and (path, size, mtime) of
+every source file, so a modified cube simply produces a new key and the stale entry
+ages out. The metadata file's mtime records the last use; when the total size exceeds
+its share of the cache size cap the least recently used entries are deleted. The cap
+(``max_bytes``, ``--cache-size``) covers the whole cache directory: the gzip sidecars
+of :mod:`orbviewer.compress` get their share of it (see :func:`split_cache_budget`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .utils import default_cache_dir, split_cache_budget
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of cached entries changes.
+CACHE_FORMAT_VERSION = 1
+
+# The cache size is re-measured on disk at most this often (other processes may
+# write to the same directory); in between, writes are added to the last value.
+USAGE_RECHECK_SECONDS = 30.0
+
+Sources = Union[Path, Sequence[Path]]
+BuildResult = Tuple[Dict[str, Any], Mapping[str, np.ndarray]]
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    meta: Dict[str, Any]
+    arrays: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+
+
+class VolumeCache:
+    """Content-addressed, size-capped cache of NumPy arrays with LRU eviction."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None) -> None:
+        self.root = Path(root) if root is not None else default_cache_dir()
+        # max_bytes caps the whole cache directory; cube data gets its share of it.
+        self.max_bytes = split_cache_budget(max_bytes)[0]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Builds for the same key are serialised so concurrent requests parse a cube once.
+        # Each lock lives only while some thread uses it: [lock, number of users].
+        self._key_locks: Dict[str, List[Any]] = {}
+        # Estimated size of the cache directory and when it was last measured.
+        self._usage: Optional[int] = None
+        self._usage_checked = 0.0
+
+    # -- keys -------------------------------------------------------------
+
+    @staticmethod
+    def _source_list(sources: Sources) -> List[Path]:
+        if isinstance(sources, (str, Path)):
+            sources = [sources]
+        return [Path(src).resolve() for src in sources]
+
+    @classmethod
+    def make_key(cls, sources: Sources, kind: str, params: Optional[Mapping[str, Any]] = None) -> str:
+        stamp = []
+        for src in cls._source_list(sources):
+            st = src.stat()
+            stamp.append([str(src), st.st_size, st.st_mtime_ns])
+
+        blob = json.dumps([CACHE_FORMAT_VERSION, kind, dict(params or {}), stamp], sort_keys=True)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _array_path(self, key: str, name: str) -> Path:
+        return self.root / f"{key}.{name}.npy"
+
+    # -- lookup / store ---------------------------------------------------
+
+    def _load(self, key: str) -> Optional[CacheEntry]:
+        meta_path = self._meta_path(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            arrays = {
+                name: np.load(self._array_path(key, name), mmap_mode="r", allow_pickle=False)
+                for name in meta.get("_arrays", [])
+            }
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("缓存条目损坏，将重新生成 (%s): %s", key, e)
+            self._remove(key)
+            return None
+
+        try:
+            # Record the access for LRU eviction.
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return CacheEntry(key=key, meta=meta.get("meta", {}), arrays=arrays)
+
+    def get(self, sources: Sources, kind: str, params: Optional[Mapping[str, Any]] = None) -> Optional[CacheEntry]:
+        entry = self._load(self.make_key(sources, kind, params))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def peek(self, sources: Sources, kind: str, params: Optional[Mapping[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return the metadata of an entry without loading its arrays.
+
+        Unlike :meth:`get` this neither counts as a hit/miss nor refreshes the entry's
+        LRU timestamp.
+        """
+
+        try:
+            doc = json.loads(self._meta_path(self.make_key(sources, kind, params)).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        return doc.get("meta", {})
+
+    def put(self, sources: Sources, kind: str, meta: Dict[str, Any], arrays: Mapping[str, np.ndarray],
+            params: Optional[Mapping[str, Any]] = None) -> CacheEntry:
+        key = self.make_key(sources, kind, params)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        suffix = f".tmp{os.getpid()}.{threading.get_ident()}"
+        written = 0
+        for name, arr in arrays.items():
+            final = self._array_path(key, name)
+            tmp = final.with_name(final.name + suffix)
+            with tmp.open("wb") as f:
+                np.save(f, np.ascontiguousarray(arr), allow_pickle=False)
+                written += f.tell()
+            os.replace(tmp, final)
+
+        # The metadata file is written last; its presence marks a complete entry.
+        doc = {
+            "kind": kind,
+            "created": time.time(),
+            "sources": [str(p) for p in self._source_list(sources)],
+            "meta": meta,
+            "_arrays": list(arrays),
+        }
+        meta_path = self._meta_path(key)
+        tmp = meta_path.with_name(meta_path.name + suffix)
+        written += tmp.write_text(json.dumps(doc), encoding="utf-8")
+        os.replace(tmp, meta_path)
+
+        # Listing every entry is expensive; only do it when the cache may be over its cap.
+        if self._add_usage(written) > self.max_bytes:
+            self.evict()
+        return self._load(key) or CacheEntry(key=key, meta=meta, arrays=dict(arrays))
+
+    def get_or_create(self, sources: Sources, kind: str, build: Callable[[], BuildResult],
+                      params: Optional[Mapping[str, Any]] = None) -> CacheEntry:
+        """Return a cached entry, building and storing it on a miss."""
+
+        key = self.make_key(sources, kind, params)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                entry = self._load(key)
+                with self._lock:
+                    if entry is None:
+                        self.misses += 1
+                    else:
+                        self.hits += 1
+                if entry is not None:
+                    return entry
+
+                meta, arrays = build()
+                try:
+                    return self.put(sources, kind, meta, arrays, params)
+                except OSError as e:
+                    # A read-only or full disk should not break serving.
+                    logger.warning("写入缓存失败: %s", e)
+                    return CacheEntry(key=key, meta=meta, arrays=dict(arrays))
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+
+    # -- maintenance ------------------------------------------------------
+
+    def _files_of(self, key: str) -> List[Path]:
+        return [p for p in self.root.glob(f"{key}.*") if p.is_file()]
+
+    def _remove(self, key: str) -> int:
+        freed = 0
+        for p in self._files_of(key):
+            try:
+                size = p.stat().st_size
+                p.unlink()
+                freed += size
+            except OSError:
+                # Still memory-mapped somewhere (Windows) or already gone.
+                pass
+        return freed
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """List entries, most recently used first."""
+
+        if not self.root.is_dir():
+            return []
+
+        sizes: Dict[str, int] = {}
+        metas: Dict[str, os.DirEntry] = {}
+        with os.scandir(self.root) as it:
+            for de in it:
+                if not de.is_file():
+                    continue
+                key, _, rest = de.name.partition(".")
+                try:
+                    sizes[key] = sizes.get(key, 0) + de.stat().st_size
+                except OSError:
+                    continue
+                if rest == "json" and key != "stats":
+                    metas[key] = de
+
+        out: List[Dict[str, Any]] = []
+        for key, de in metas.items():
+            try:
+                doc = json.loads(Path(de.path).read_text(encoding="utf-8"))
+                last_used = de.stat().st_mtime
+            except Exception:
+                continue
+            out.append({
+                "key": key,
+                "kind": doc.get("kind", "?"),
+                "sources": doc.get("sources", []),
+                "bytes": sizes.get(key, 0),
+                "last_used": last_used,
+            })
+        out.sort(key=lambda e: e["last_used"], reverse=True)
+        return out
+
+    def _add_usage(self, nbytes: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            if self._usage is not None and now - self._usage_checked < USAGE_RECHECK_SECONDS:
+                self._usage += nbytes
+                return self._usage
+        usage = self.total_bytes()
+        with self._lock:
+            self._usage, self._usage_checked = usage, now
+        return usage
+
+    def total_bytes(self) -> int:
+        if not self.root.is_dir():
+            return 0
+        return sum(p.stat().st_size for p in self.root.iterdir() if p.is_file())
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Delete least recently used entries until the cache fits ``max_bytes``."""
+
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            entries = self.entries()
+            total = sum(e["bytes"] for e in entries)
+            freed = 0
+            for e in reversed(entries):
+                if total <= limit:
+                    break
+                n = self._remove(e["key"])
+                total -= n
+                freed += n
+            self._usage, self._usage_checked = total, time.monotonic()
+            if freed:
+                logger.info("缓存已清理 %.1f MB", freed / 1024 / 1024)
+            return freed
+
+    def purge(self) -> int:
+        """Delete every entry; returns the number of bytes freed."""
+
+        return self.evict(max_bytes=0)
+
+    # -- statistics -------------------------------------------------------
+
+    def _stats_path(self) -> Path:
+        return self.root / "stats.json"
+
+    def _stored_stats(self) -> Dict[str, int]:
+        try:
+            return json.loads(self._stats_path().read_text(encoding="utf-8"))
+        except Exception:
+            return {"hits": 0, "misses": 0}
+
+    def flush_stats(self) -> None:
+        """Add this process' hit/miss counters to the persisted totals."""
+
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            self.hits = self.misses = 0
+        if not hits and not misses:
+            return
+
+        stored = self._stored_stats()
+        stored["hits"] = stored.get("hits", 0) + hits
+        stored["misses"] = stored.get("misses", 0) + misses
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._stats_path().write_text(json.dumps(stored), encoding="utf-8")
+        except OSError as e:
+            logger.warning("保存缓存统计失败: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        stored = self._stored_stats()
+        with self._lock:
+            hits = self.hits + stored.get("hits", 0)
+            misses = self.misses + stored.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "dir": str(self.root),
+            "entries": len(self.entries()),
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,181 @@
+"""Header-only catalog of the cube files under a directory (``/api/index``).
+
+Knowing what a folder contains used to mean opening every file in the browser.
+The catalog reads only the header of each cube (:func:`orbviewer.cube.read_cube_header`),
+so listing thousands of outputs costs a few milliseconds per file the first time and
+nothing afterwards: summaries are memoized per file and re-read only when the file's
+(size, mtime) changes.
+
+Value ranges (``min``/``max``) are not computed here; they are filled in from the
+volume cache once a grid has been parsed for any other reason. Files without a range
+are only looked up again after the cache directory changed.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config_gen import SUPPORTED_CUBE_EXTS
+from .cube import BOHR_TO_ANGSTROM, CubeHeader, read_cube_header
+
+if TYPE_CHECKING:
+    from .cache import VolumeCache
+
+logger = logging.getLogger(__name__)
+
+ELEMENT_SYMBOLS = (
+    "H", "He",
+    "Li", "Be", "B", "C", "N", "O", "F", "Ne",
+    "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar",
+    "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br", "Kr",
+    "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Tc", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Xe",
+    "Cs", "Ba", "La", "Ce", "Pr", "Nd", "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb", "Lu",
+    "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg", "Tl", "Pb", "Bi", "Po", "At", "Rn",
+)
+
+
+def element_symbol(number: int) -> str:
+    return ELEMENT_SYMBOLS[number - 1] if 0 < number <= len(ELEMENT_SYMBOLS) else "X"
+
+
+def chemical_formula(numbers: Iterable[int]) -> str:
+    """Hill formula (C first, then H, then the rest alphabetically), e.g. ``C6H6``."""
+
+    counts = Counter(element_symbol(n) for n in numbers if n > 0)
+    order: List[str] = []
+    if "C" in counts:
+        order = ["C"] + (["H"] if "H" in counts else [])
+    order += sorted(s for s in counts if s not in order)
+    return "".join(s + (str(counts[s]) if counts[s] > 1 else "") for s in order)
+
+
+def summarize_header(header: CubeHeader) -> Dict[str, Any]:
+    spacing = [round(sum(c * c for c in axis) ** 0.5 * BOHR_TO_ANGSTROM, 6) for axis in header.axes]
+    return {
+        "dims": list(header.dims),
+        "spacing": spacing,  # Angstrom
+        "nval": header.nval,
+        "atomCount": len(header.atoms),
+        "formula": chemical_formula(a.number for a in header.atoms),
+        "comment": header.comments[0].strip(),
+    }
+
+
+def iter_cube_files(root: Path) -> Iterator[os.DirEntry]:
+    """Cube files below ``root`` in a deterministic (sorted, depth-first) order."""
+
+    try:
+        with os.scandir(root) as it:
+            entries = sorted(it, key=lambda de: de.name)
+    except OSError as e:
+        logger.warning("无法读取目录 %s: %s", root, e)
+        return
+
+    for de in entries:
+        try:
+            if de.is_dir(follow_symlinks=False):
+                if not de.name.startswith("."):
+                    yield from iter_cube_files(Path(de.path))
+            elif de.is_file() and os.path.splitext(de.name)[1].lower() in SUPPORTED_CUBE_EXTS:
+                yield de
+        except OSError:
+            continue
+
+
+class CubeCatalog:
+    """Memoized header summaries of every cube under ``root``."""
+
+    def __init__(self, root: Path, cache: Optional["VolumeCache"] = None) -> None:
+        self.root = Path(root).resolve()
+        self.cache = cache
+        self._lock = threading.Lock()
+        # rel path -> ((size, mtime_ns), summary)
+        self._memo: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        # rel path -> cache directory mtime when its value range was last looked up
+        self._range_checked: Dict[str, int] = {}
+
+    def _cache_stamp(self) -> int:
+        try:
+            return os.stat(self.cache.root).st_mtime_ns if self.cache is not None else 0
+        except OSError:
+            return 0
+
+    def _with_value_range(self, path: Path, rel: str, summary: Dict[str, Any], cache_stamp: int) -> Dict[str, Any]:
+        if self.cache is None or "min" in summary:
+            return summary
+        with self._lock:
+            if self._range_checked.get(rel) == cache_stamp:
+                return summary
+            self._range_checked[rel] = cache_stamp
+        try:
+            meta = self.cache.peek(path, "grid")
+        except OSError:
+            return summary
+        if meta is None or "min" not in meta:
+            return summary
+
+        summary = dict(summary, min=meta["min"], max=meta["max"])
+        with self._lock:
+            memo = self._memo.get(rel)
+            if memo is not None:
+                self._memo[rel] = (memo[0], summary)
+        return summary
+
+    def scan(self) -> Dict[str, Any]:
+        """Return the catalog, reading headers only for new or modified files."""
+
+        started = time.perf_counter()
+        files: List[Dict[str, Any]] = []
+        errors: List[Dict[str, str]] = []
+        seen = set()
+        parsed = 0
+        cache_stamp = self._cache_stamp()
+
+        prefix = len(os.path.join(str(self.root), ""))
+        for de in iter_cube_files(self.root):
+            rel = de.path[prefix:].replace(os.sep, "/")
+            try:
+                st = de.stat()
+            except OSError:
+                continue
+            stamp = (st.st_size, st.st_mtime_ns)
+            seen.add(rel)
+
+            with self._lock:
+                memo = self._memo.get(rel)
+            if memo is not None and memo[0] == stamp:
+                summary = memo[1]
+            else:
+                try:
+                    summary = summarize_header(read_cube_header(de.path))
+                except (OSError, ValueError) as e:
+                    errors.append({"path": rel, "error": str(e)})
+                    continue
+                parsed += 1
+                summary = dict(summary, path=rel, size=st.st_size, mtime=st.st_mtime)
+                with self._lock:
+                    self._memo[rel] = (stamp, summary)
+                    self._range_checked.pop(rel, None)
+
+            files.append(self._with_value_range(Path(de.path), rel, summary, cache_stamp))
+
+        with self._lock:
+            for rel in set(self._memo) - seen:
+                del self._memo[rel]
+                self._range_checked.pop(rel, None)
+
+        return {
+            "root": str(self.root),
+            "count": len(files),
+            "totalBytes": sum(f["size"] for f in files),
+            "files": files,
+            "errors": errors,
+            "headersRead": parsed,
+            "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+        }
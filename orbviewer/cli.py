@@ -8,8 +8,10 @@ import time
 from pathlib import Path
 from typing import Optional
 
+from .compress import GzipCache
 from .config_gen import write_config
-from .server import start_viewer_server
+from .profiling import Profiler
+from .server import SERVER_ENGINES, start_viewer_server
 from .utils import setup_logging
 
 logger = logging.getLogger(__name__)
@@ -58,7 +60,8 @@ def _validate_config_path(path: str) -> Path:
     return p.resolve()
 
 
-def generate_config_file_interactive() -> None:
+def generate_config_file_interactive(options: Optional[dict] = None) -> None:
+    options = options or {}
     clear_screen()
     print_header()
     print("请输入要生成配置的文件夹路径：")
@@ -79,7 +82,7 @@ def generate_config_file_interactive() -> None:
         print(f"\n配置文件已生成: {config_path}")
         print("\n是否立即加载该配置？(y/n)")
         if input().lower().strip() == "y":
-            start_viewer_server(config_path)
+            start_viewer_server(config_path, **options)
     except Exception as e:
         print(f"\n生成配置文件时出错: {e}")
 
@@ -92,21 +95,205 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("-c", "--config", help="指定要加载的JSON配置文件路径")
     parser.add_argument("-s", "--silent", action="store_true", help="静默模式（不显示欢迎信息）")
     parser.add_argument("--quick", action="store_true", help="快速启动（无交互菜单）")
+    parser.add_argument("--no-cache", action="store_true", help="禁用 cube 预处理缓存")
+    parser.add_argument("--cache-dir", help="cube 预处理缓存目录")
+    parser.add_argument("--cache-size", type=float, metavar="MB", help="缓存大小上限（MB，cube 缓存与压缩缓存合计）")
+    parser.add_argument("--no-gzip", action="store_true", help="禁用 gzip 压缩传输")
+    parser.add_argument("--no-sendfile", action="store_true", help="禁用 sendfile 零拷贝发送（排查网络问题时使用）")
+    parser.add_argument("--no-crop", action="store_true", help="不裁剪体数据（默认只传输等值面附近的子网格）")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模式：自动发现新增/修改的 cube 文件并推送到已打开的页面（无配置时自动生成）")
+    parser.add_argument("--watch-interval", type=float, metavar="SEC", help="监视模式的检查间隔（秒，默认 2）")
+    parser.add_argument("--engine", choices=SERVER_ENGINES, default="threaded",
+                        help="服务器引擎：threaded（每请求一线程）或 pool（固定线程池 + HTTP/1.1 keep-alive）")
+    parser.add_argument("--workers", type=int, metavar="N", help="pool 引擎的工作线程数（默认 8）")
+    parser.add_argument("--queue-size", type=int, metavar="N", help="pool 引擎的请求队列长度（默认 64）")
+    parser.add_argument("--keepalive-timeout", type=float, metavar="SEC", help="pool 引擎空闲连接保持时间（秒，默认 15）")
+    parser.add_argument("--bundle-js", action="store_true",
+                        help="将页面中连续引用的脚本合并为一个文件传输（减少请求数，适合高延迟网络）")
+    parser.add_argument("--profile", action="store_true",
+                        help="性能分析：记录 cProfile、内存快照和慢请求堆栈（也可设置环境变量 ORBVIEWER_PROFILE）")
+    parser.add_argument("--profile-dir", metavar="DIR", help="性能分析报告目录（默认 ./orbviewer-profile-<时间>）")
+    parser.add_argument("--profile-requests", action="store_true", help="性能分析时为每个请求单独保存 cProfile 结果")
+    parser.add_argument("--slow-request", type=float, metavar="MS",
+                        help="性能分析时记录超过该耗时的请求及其堆栈（毫秒，默认 1000）")
+
+    sub = parser.add_subparsers(dest="command")
+
+    cache_cmd = sub.add_parser("cache", help="查看或清空 cube 预处理缓存")
+    cache_cmd.add_argument("action", nargs="?", choices=["info", "purge"], default="info",
+                           help="info: 显示缓存统计；purge: 清空缓存")
+    cache_cmd.add_argument("-v", "--verbose", action="store_true", help="列出缓存条目")
+
+    config_cmd = sub.add_parser("config", help="扫描文件夹并生成配置文件（非交互）")
+    config_cmd.add_argument("folder", help="包含 cube 文件的文件夹")
+    config_cmd.add_argument("-o", "--output", help="输出文件名（默认 orbital-viewer-config-<日期>.json）")
+    config_cmd.add_argument("-j", "--workers", type=int, metavar="N",
+                            help="并行扫描目录的线程数（默认 CPU 数 x2，最多 16；1 表示串行）")
+    config_cmd.add_argument("-i", "--incremental", action="store_true",
+                            help="增量更新已有配置：保留已编辑的组，追加新组，只重新扫描有变化的目录")
+
+    precompute_cmd = sub.add_parser("precompute", help="预先处理文件夹中的所有 cube 文件并写入缓存，之后打开查看器无需等待")
+    precompute_cmd.add_argument("folder", help="包含 cube 文件的文件夹")
+    precompute_cmd.add_argument("-j", "--workers", type=int, metavar="N", help="并行处理的进程数（默认 CPU 数）")
+    precompute_cmd.add_argument("--iso", type=float, action="append", metavar="VALUE",
+                                help="预先提取该等值面值的网格（可重复；默认取配置文件或 default.txt 中的值）")
+    precompute_cmd.add_argument("-q", "--quiet", action="store_true", help="不显示进度")
+
+    render_cmd = sub.add_parser("render", help="无需浏览器/GPU，将配置中的每个组渲染为 PNG 图片")
+    render_cmd.add_argument("config", help="配置文件（JSON）")
+    render_cmd.add_argument("-o", "--output", help="输出目录（默认 <配置名>-renders，位于配置文件旁）")
+    render_cmd.add_argument("-j", "--workers", type=int, metavar="N", help="并行渲染的进程数（默认 CPU 数）")
+    render_cmd.add_argument("--size", default="800x600", metavar="WxH", help="图片尺寸（默认 800x600）")
+    render_cmd.add_argument("--supersample", type=int, default=2, metavar="N",
+                            help="超采样倍数，用于抗锯齿（默认 2；1 最快）")
+
     return parser
 
 
-def run_non_interactive(config: Optional[str], *, silent: bool) -> int:
+def _server_options(args: argparse.Namespace, profiler: Optional[Profiler] = None) -> dict:
+    return {
+        "use_cache": not args.no_cache,
+        "cache_dir": args.cache_dir,
+        "cache_max_mb": args.cache_size,
+        "compression": not args.no_gzip,
+        "use_sendfile": not args.no_sendfile,
+        "engine": args.engine,
+        "workers": args.workers,
+        "queue_size": args.queue_size,
+        "keepalive_timeout": args.keepalive_timeout,
+        "crop": not args.no_crop,
+        "watch": args.watch,
+        "watch_interval": args.watch_interval,
+        "profiler": profiler,
+        "bundle_scripts": args.bundle_js,
+    }
+
+
+def run_cache_command(args: argparse.Namespace) -> int:
+    max_bytes = None if args.cache_size is None else int(args.cache_size * 1024 * 1024)
+    cache_dir = Path(args.cache_dir).expanduser() if args.cache_dir else None
+    gzip_cache = GzipCache(cache_dir / "gzip" if cache_dir else None, max_bytes)
+
+    try:
+        from .cache import VolumeCache
+    except ImportError as e:
+        print(f"cube 预处理缓存需要 numpy: {e}")
+        if args.action == "purge":
+            freed = gzip_cache.purge()
+            print(f"已清空压缩缓存 {gzip_cache.root}，释放 {freed / 1024 / 1024:.1f} MB")
+        return 1
+
+    cache = VolumeCache(cache_dir, max_bytes)
+
+    if args.action == "purge":
+        freed = cache.purge() + gzip_cache.purge()
+        print(f"已清空缓存 {cache.root}，释放 {freed / 1024 / 1024:.1f} MB")
+        return 0
+
+    stats = cache.stats()
+    gz = gzip_cache.stats()
+    # Both caches share one size cap (--cache-size), see split_cache_budget().
+    limit = cache.max_bytes + gzip_cache.max_bytes
+    print(f"缓存目录: {stats['dir']}")
+    print(f"条目数:   {stats['entries']}")
+    print(f"占用:     {(stats['bytes'] + gz['bytes']) / 1024 / 1024:.1f} MB / {limit / 1024 / 1024:.0f} MB")
+    print(f"  cube 数据: {stats['bytes'] / 1024 / 1024:.1f} MB / {cache.max_bytes / 1024 / 1024:.0f} MB")
+    print(f"  压缩缓存: {gz['entries']} 个文件，{gz['bytes'] / 1024 / 1024:.1f} MB / "
+          f"{gzip_cache.max_bytes / 1024 / 1024:.0f} MB ({gz['dir']})")
+    print(f"命中/未命中: {stats['hits']} / {stats['misses']} (命中率 {stats['hit_rate']:.1%})")
+
+    if args.verbose:
+        for e in cache.entries():
+            used = time.strftime("%Y-%m-%d %H:%M", time.localtime(e["last_used"]))
+            sources = ", ".join(e["sources"])
+            print(f"  {e['key'][:12]}  {e['kind']:<8} {e['bytes'] / 1024 / 1024:8.1f} MB  {used}  {sources}")
+    return 0
+
+
+def run_config_command(args: argparse.Namespace) -> int:
+    # write_config() logs the output path and the scan statistics (files/sec).
+    try:
+        write_config(args.folder, args.output, workers=args.workers, incremental=args.incremental)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        return 1
+    return 0
+
+
+def run_precompute_command(args: argparse.Namespace) -> int:
+    if args.no_cache:
+        print("预计算的结果保存在缓存中，不能与 --no-cache 同时使用")
+        return 1
+    try:
+        from .precompute import precompute_folder
+    except ImportError as e:
+        print(f"预计算需要 numpy: {e}")
+        return 1
+
+    try:
+        summary = precompute_folder(
+            args.folder, workers=args.workers, cache_dir=args.cache_dir,
+            cache_max_bytes=None if args.cache_size is None else int(args.cache_size * 1024 * 1024),
+            isovalues=args.iso, progress=not args.quiet,
+        )
+    except FileNotFoundError as e:
+        print(e)
+        return 1
+
+    mb = 1024 * 1024
+    built = summary.files - summary.skipped - summary.failed
+    print(f"cube 文件: {summary.files} 个（新处理 {built}，已是最新 {summary.skipped}，失败 {summary.failed}）")
+    print(f"生成缓存条目: {summary.built} 个，新增缓存 {summary.cache_bytes / mb:.1f} MB")
+    if summary.cube_bytes:
+        saved = summary.cube_bytes - summary.served_bytes
+        print(f"传输量: cube 文本 {summary.cube_bytes / mb:.1f} MB → 二进制体数据 {summary.served_bytes / mb:.1f} MB"
+              f"（节省 {saved / mb:.1f} MB，{saved / summary.cube_bytes:.0%}）")
+    print(f"用时: {summary.seconds:.1f} 秒")
+    return 1 if summary.failed else 0
+
+
+def run_render_command(args: argparse.Namespace) -> int:
+    try:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        if width <= 0 or height <= 0:
+            raise ValueError
+    except ValueError:
+        print(f"无效的图片尺寸: {args.size}（格式如 1200x900）")
+        return 1
+
+    try:
+        from .render import render_config
+    except ImportError as e:
+        print(f"渲染需要 numpy: {e}")
+        return 1
+
+    try:
+        cfg = _validate_config_path(args.config)
+        _, failed = render_config(
+            cfg, args.output, workers=args.workers, size=(width, height), supersample=args.supersample,
+            use_cache=not args.no_cache, cache_dir=args.cache_dir,
+            cache_max_bytes=None if args.cache_size is None else int(args.cache_size * 1024 * 1024),
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        return 1
+    return 1 if failed else 0
+
+
+def run_non_interactive(config: Optional[str], *, silent: bool, options: Optional[dict] = None) -> int:
     if not silent:
         print_header()
 
+    options = options or {}
     try:
         if config:
             cfg = _validate_config_path(config)
             logger.info("正在加载配置文件: %s", cfg)
-            start_viewer_server(str(cfg))
+            start_viewer_server(str(cfg), **options)
         else:
             logger.info("以默认模式启动轨道查看器...")
-            start_viewer_server()
+            start_viewer_server(**options)
         return 0
     except KeyboardInterrupt:
         logger.info("程序被中断，正在退出...")
@@ -116,7 +303,8 @@ def run_non_interactive(config: Optional[str], *, silent: bool) -> int:
         return 1
 
 
-def run_interactive() -> int:
+def run_interactive(options: Optional[dict] = None) -> int:
+    options = options or {}
     while True:
         try:
             clear_screen()
@@ -129,7 +317,7 @@ def run_interactive() -> int:
             if choice.lower().endswith(".json"):
                 try:
                     cfg = _validate_config_path(choice)
-                    start_viewer_server(str(cfg))
+                    start_viewer_server(str(cfg), **options)
                 except Exception as e:
                     print(f"\n错误：{e}")
                     time.sleep(2)
@@ -139,7 +327,7 @@ def run_interactive() -> int:
                 clear_screen()
                 print_header()
                 print("正在启动服务器...\n")
-                start_viewer_server()
+                start_viewer_server(**options)
 
             elif choice == "2":
                 clear_screen()
@@ -152,13 +340,13 @@ def run_interactive() -> int:
 
                 try:
                     cfg = _validate_config_path(config_path)
-                    start_viewer_server(str(cfg))
+                    start_viewer_server(str(cfg), **options)
                 except Exception as e:
                     print(f"\n错误：{e}")
                     time.sleep(2)
 
             elif choice == "3":
-                generate_config_file_interactive()
+                generate_config_file_interactive(options)
 
             elif choice == "4":
                 show_help()
@@ -192,14 +380,33 @@ def main(argv: Optional[list[str]] = None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
 
+    profiler = Profiler.from_options(args.profile, args.profile_dir, per_request=args.profile_requests,
+                                     slow_request_ms=args.slow_request)
+    if profiler is None:
+        return run_command(args)
+    with profiler:
+        return run_command(args, profiler)
+
+
+def run_command(args: argparse.Namespace, profiler: Optional[Profiler] = None) -> int:
+    if args.command == "cache":
+        return run_cache_command(args)
+    if args.command == "config":
+        return run_config_command(args)
+    if args.command == "precompute":
+        return run_precompute_command(args)
+    if args.command == "render":
+        return run_render_command(args)
+
     # Non-interactive mode is triggered when:
     # - config specified
     # - --quick specified
     # - --silent specified (keeps backward compatibility with the original main.py)
-    if args.config or args.quick or args.silent:
-        return run_non_interactive(args.config, silent=args.silent)
+    # - --watch specified
+    if args.config or args.quick or args.silent or args.watch:
+        return run_non_interactive(args.config, silent=args.silent, options=_server_options(args, profiler))
 
-    return run_interactive()
+    return run_interactive(_server_options(args, profiler))
 
 
 if __name__ == "__main__":
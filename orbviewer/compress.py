@@ -0,0 +1,189 @@
+"""On-the-fly gzip for served files, with a sidecar cache of compressed copies.
+
+Cube text compresses 4-8x, which matters a lot over Wi-Fi/VPN. Files are compressed
+while they are streamed (fixed-size chunks, never the whole file in memory) and the
+compressed stream is written to a sidecar file at the same time. Later requests for
+the unchanged file are answered straight from the sidecar.
+
+Sidecars live in ``<cache dir>/gzip`` and are keyed by (path, size, mtime) like the
+entries of :mod:`orbviewer.cache`; the least recently used ones are deleted when the
+directory grows beyond its share of the cache size cap (``max_bytes`` is the cap of
+the whole cache, see :func:`split_cache_budget`). This module only needs the
+standard library.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .utils import default_cache_dir, split_cache_budget
+
+logger = logging.getLogger(__name__)
+
+# Files smaller than this are sent as-is: the gzip framing and CPU are not worth it.
+MIN_COMPRESS_SIZE = 1024
+
+# Level 4 compresses cube text at ~35 MB/s (level 6: ~13 MB/s) for ~10% more output,
+# so streaming compression stays faster than the networks it is meant for.
+GZIP_LEVEL = 4
+
+CHUNK_SIZE = 256 * 1024
+
+# Extensions worth compressing (cube text, configs and text assets).
+COMPRESSIBLE_EXTS = {".cub", ".cube", ".json", ".txt", ".html", ".js", ".css", ".svg"}
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Parse an Accept-Encoding header (honours ``gzip;q=0``)."""
+
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def is_compressible(path: Path, size: int) -> bool:
+    return size >= MIN_COMPRESS_SIZE and path.suffix.lower() in COMPRESSIBLE_EXTS
+
+
+def iter_gzip(f, chunk_size: int = CHUNK_SIZE, level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress a binary file object into a gzip stream, chunk by chunk."""
+
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 => gzip container
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
+
+
+class GzipCache:
+    """Directory of gzip sidecars for served files."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None) -> None:
+        self.root = Path(root) if root is not None else default_cache_dir() / "gzip"
+        # max_bytes caps the whole cache directory; the sidecars get their share of it.
+        self.max_bytes = split_cache_budget(max_bytes)[1]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _sidecar(self, path: Path) -> Path:
+        st = path.stat()
+        blob = f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}|{GZIP_LEVEL}"
+        return self.root / (hashlib.sha1(blob.encode("utf-8")).hexdigest() + ".gz")
+
+    def lookup(self, path: Path) -> Optional[Path]:
+        """Return the sidecar of ``path`` if it is up to date."""
+
+        sidecar = self._sidecar(path)
+        found = sidecar.is_file()
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not found:
+            return None
+        try:
+            os.utime(sidecar)  # LRU bookkeeping
+        except OSError:
+            pass
+        return sidecar
+
+    def stream(self, path: Path) -> Iterator[bytes]:
+        """Compress ``path`` chunk by chunk while storing the result as its sidecar.
+
+        The sidecar is only published once the whole stream was produced; if the
+        consumer stops early (client disconnected) the partial file is discarded.
+        """
+
+        sidecar = self._sidecar(path)
+        tmp: Optional[Path] = sidecar.with_name(f"{sidecar.name}.tmp{os.getpid()}.{threading.get_ident()}")
+        out = None
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            out = tmp.open("wb")
+        except OSError as e:
+            logger.warning("无法写入压缩缓存: %s", e)
+            tmp = None
+
+        try:
+            with path.open("rb") as f:
+                for chunk in iter_gzip(f):
+                    if out is not None:
+                        out.write(chunk)
+                    yield chunk
+            if out is not None and tmp is not None:
+                out.close()
+                out = None
+                os.replace(tmp, sidecar)
+                tmp = None
+                self.evict()
+        finally:
+            if out is not None:
+                out.close()
+            if tmp is not None:
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Delete least recently used sidecars until the directory fits ``max_bytes``."""
+
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if not self.root.is_dir():
+            return 0
+
+        with self._lock:
+            files = []
+            with os.scandir(self.root) as it:
+                for de in it:
+                    if de.is_file() and de.name.endswith(".gz"):
+                        st = de.stat()
+                        files.append((st.st_mtime, st.st_size, de.path))
+            total = sum(f[1] for f in files)
+            freed = 0
+            for _, size, p in sorted(files):
+                if total <= limit:
+                    break
+                try:
+                    os.unlink(p)
+                except OSError:
+                    continue
+                total -= size
+                freed += size
+            return freed
+
+    def purge(self) -> int:
+        return self.evict(max_bytes=0)
+
+    def stats(self) -> dict:
+        files = list(self.root.glob("*.gz")) if self.root.is_dir() else []
+        return {
+            "dir": str(self.root),
+            "entries": len(files),
+            "bytes": sum(p.stat().st_size for p in files),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -4,15 +4,27 @@ import json
 import logging
 import os
 import re
+import time
+import queue
+import threading
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_CUBE_EXTS = {".cub", ".cube"}
 
+# Directory listings are I/O bound (os.scandir releases the GIL), so threads overlap
+# the metadata round trips of network/scratch filesystems well.
+DEFAULT_SCAN_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+# Sidecar with the directory listings of the last incremental scan (see ScanCache).
+SCAN_CACHE_NAME = ".orbviewer-scan.json"
+
+DEFAULT_CONFIG_GLOB = "orbital-viewer-config-*.json"
+
 
 class OrbitalRule:
     """Base class for grouping rules."""
@@ -70,7 +82,207 @@ def create_viewer_config(files: Sequence[str], group_id: int) -> Dict:
     }
 
 
-def generate_config(folder_path: str | Path, rules: Optional[List[OrbitalRule]] = None) -> Dict:
+@dataclass
+class ScanStats:
+    """Counters of one directory scan."""
+
+    directories: int = 0
+    files: int = 0
+    cube_files: int = 0
+    seconds: float = 0.0
+    # Directories actually listed (the others were unchanged since the cached scan).
+    rescanned: int = 0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+
+# (directory mtime_ns, subdirs to descend into, cube file names, number of files)
+DirListing = Tuple[int, List[str], List[str], int]
+
+
+class ScanCache:
+    """Directory listings of a previous scan, keyed by relative directory.
+
+    A directory whose mtime is unchanged still has the same entries (creating,
+    deleting or renaming an entry updates the mtime of its directory), so its
+    cached listing is reused instead of listing it again. Grouping only depends on
+    file names, so file contents and sizes do not need to be tracked.
+    """
+
+    VERSION = 1
+
+    def __init__(self, dirs: Optional[Dict[str, DirListing]] = None) -> None:
+        self.dirs: Dict[str, DirListing] = dirs or {}
+
+    @classmethod
+    def load(cls, path: Path) -> "ScanCache":
+        try:
+            doc = json.loads(Path(path).read_text(encoding="utf-8"))
+            if doc.get("version") != cls.VERSION:
+                return cls()
+            dirs = {rel: (int(v[0]), list(v[1]), list(v[2]), int(v[3])) for rel, v in doc["dirs"].items()}
+        except FileNotFoundError:
+            return cls()
+        except Exception as e:
+            logger.warning("扫描缓存无效，将完整扫描 (%s): %s", path, e)
+            return cls()
+        return cls(dirs)
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": self.VERSION, "dirs": self.dirs}, separators=(",", ":")),
+                       encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def _list_dir(path: str, cached: Optional[DirListing] = None) -> DirListing:
+    """List one directory; subdirs and cube files are sorted.
+
+    Mirrors ``os.walk``: symlinked directories are not followed and unreadable
+    directories are skipped. ``cached`` is returned as-is if the directory's mtime
+    did not change.
+    """
+
+    try:
+        # Taken before listing: a change during the listing is picked up next time.
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as e:
+        logger.debug("跳过无法读取的目录 %s: %s", path, e)
+        return 0, [], [], 0
+    if cached is not None and cached[0] == mtime:
+        return cached
+
+    subdirs: List[str] = []
+    cube_files: List[str] = []
+    n_files = 0
+    try:
+        with os.scandir(path) as it:
+            for de in it:
+                try:
+                    is_dir = de.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not de.is_symlink():
+                        subdirs.append(de.name)
+                    continue
+                n_files += 1
+                if os.path.splitext(de.name)[1].lower() in SUPPORTED_CUBE_EXTS:
+                    cube_files.append(de.name)
+    except OSError as e:
+        logger.debug("跳过无法读取的目录 %s: %s", path, e)
+    subdirs.sort()
+    cube_files.sort()
+    return mtime, subdirs, cube_files, n_files
+
+
+def scan_cube_dirs(folder: str | Path, workers: Optional[int] = None, stats: Optional[ScanStats] = None, *,
+                   scan_cache: Optional[ScanCache] = None) -> List[Tuple[str, List[str]]]:
+    """Find the cube files below ``folder``.
+
+    Returns ``(relative dir, sorted cube file names)`` for every directory that
+    contains cube files, in the same order as a sorted top-down ``os.walk`` (the
+    root is ``""``). Directories are listed with ``os.scandir`` on ``workers``
+    threads; the result does not depend on the number of workers.
+
+    With a ``scan_cache`` only directories modified since the cached scan are
+    listed again; the cache is updated in place.
+    """
+
+    root = str(Path(folder).expanduser().resolve())
+    workers = DEFAULT_SCAN_WORKERS if workers is None else max(1, int(workers))
+    started = time.perf_counter()
+    previous = scan_cache.dirs if scan_cache is not None else {}
+
+    listings: Dict[str, DirListing] = {}
+
+    def child(rel: str, name: str) -> str:
+        return f"{rel}/{name}" if rel else name
+
+    if workers == 1:
+        todo = [""]
+        while todo:
+            rel = todo.pop()
+            listings[rel] = _list_dir(os.path.join(root, rel), previous.get(rel))
+            todo.extend(child(rel, d) for d in listings[rel][1])
+    else:
+        # Workers take directories from a shared queue and queue their subdirectories;
+        # queue.join() returns once every discovered directory has been listed.
+        todo: "queue.Queue[Optional[str]]" = queue.Queue()
+
+        def worker() -> None:
+            while True:
+                rel = todo.get()
+                if rel is None:
+                    return
+                try:
+                    listing = _list_dir(os.path.join(root, rel), previous.get(rel))
+                    listings[rel] = listing
+                    for d in listing[1]:
+                        todo.put(child(rel, d))
+                finally:
+                    todo.task_done()
+
+        threads = [threading.Thread(target=worker, name=f"orbviewer-scan-{i}", daemon=True) for i in range(workers)]
+        for t in threads:
+            t.start()
+        todo.put("")
+        todo.join()
+        for _ in threads:
+            todo.put(None)
+        for t in threads:
+            t.join()
+
+    # Deterministic merge: pre-order, sorted children (os.walk order).
+    out: List[Tuple[str, List[str]]] = []
+    n_files = 0
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        _, subdirs, cube_files, count = listings[rel]
+        n_files += count
+        if cube_files:
+            out.append((rel, cube_files))
+        stack.extend(child(rel, d) for d in reversed(subdirs))
+
+    if stats is not None:
+        stats.directories += len(listings)
+        stats.files += n_files
+        stats.cube_files += sum(len(files) for _, files in out)
+        stats.seconds += time.perf_counter() - started
+        stats.rescanned += sum(1 for rel, listing in listings.items() if listing is not previous.get(rel))
+    if scan_cache is not None:
+        scan_cache.dirs = listings
+    return out
+
+
+def group_directory(rel_dir: str, cube_files: Sequence[str], rules: Sequence[OrbitalRule]) -> List[List[str]]:
+    """Apply the grouping rules to the cube files of one directory."""
+
+    rel_path_files = [f"{rel_dir}/{f}" if rel_dir else f for f in cube_files]
+
+    groups: List[List[str]] = []
+    processed: set[str] = set()
+
+    for rule in rules:
+        matched_groups = rule.match(rel_path_files)
+        # Keep stable order
+        matched_groups = sorted(matched_groups, key=lambda g: (g[0] if g else ""))
+        for group in matched_groups:
+            groups.append(list(group))
+            processed.update(group)
+
+    # Any remaining files become their own group
+    groups.extend([f] for f in rel_path_files if f not in processed)
+    return groups
+
+
+def generate_config(folder_path: str | Path, rules: Optional[List[OrbitalRule]] = None, *,
+                    workers: Optional[int] = None, stats: Optional[ScanStats] = None,
+                    scan_cache: Optional[ScanCache] = None) -> Dict:
     folder = Path(folder_path).expanduser().resolve()
 
     if rules is None:
@@ -82,61 +294,138 @@ def generate_config(folder_path: str | Path, rules: Optional[List[OrbitalRule]]
         "viewers": [],
     }
 
+    stats = stats if stats is not None else ScanStats()
     group_id = 0
+    for rel_dir, cube_files in scan_cube_dirs(folder, workers, stats, scan_cache=scan_cache):
+        for group in group_directory(rel_dir, cube_files, rules):
+            config["viewers"].append(create_viewer_config(group, group_id))
+            group_id += 1
 
-    # Deterministic walk
-    for root, dirs, files in os.walk(folder):
-        dirs.sort()
-        files.sort()
+    logger.info("扫描 %d 个目录、%d 个文件（%d 个 cube），用时 %.2f 秒（%.0f 文件/秒）",
+                stats.directories, stats.files, stats.cube_files, stats.seconds, stats.files_per_second)
+    if scan_cache is not None:
+        logger.info("其中 %d 个目录有变化并重新扫描", stats.rescanned)
+    return config
 
-        cube_files = [f for f in files if Path(f).suffix.lower() in SUPPORTED_CUBE_EXTS]
-        if not cube_files:
-            continue
 
-        root_path = Path(root)
+def viewer_files(viewer: Dict[str, Any]) -> List[str]:
+    return [f for f in (viewer.get("fileName1"), viewer.get("fileName2")) if f]
 
-        rel_path_files = [
-            (root_path / f).relative_to(folder).as_posix()
-            for f in cube_files
-        ]
 
-        processed: set[str] = set()
+def merge_config(previous: Dict[str, Any], generated: Dict[str, Any],
+                 folder: Path) -> Tuple[Dict[str, Any], int, int, int]:
+    """Merge a freshly generated config into a previous (possibly hand-edited) one.
 
-        for rule in rules:
-            matched_groups = rule.match(rel_path_files)
-            # Keep stable order
-            matched_groups = sorted(matched_groups, key=lambda g: (g[0] if g else ""))
-            for group in matched_groups:
-                config["viewers"].append(create_viewer_config(group, group_id))
-                processed.update(group)
-                group_id += 1
+    Previous groups are kept (id, title, colors, notes, ...) as long as one of
+    their files still exists; a deleted file is cleared from its group. A group
+    with a single file is completed in place when its partner appears (``hole_N``
+    first, ``electron_N`` in a later run); other generated files not used by a
+    kept group are appended as new groups with new ids.
+    Returns ``(config, added, updated, removed)``.
+    """
 
-        # Any remaining files become their own group
-        for f in rel_path_files:
-            if f in processed:
-                continue
-            config["viewers"].append(create_viewer_config([f], group_id))
-            group_id += 1
-
-    return config
+    present: Set[str] = {f for v in generated["viewers"] for f in viewer_files(v)}
 
+    viewers: List[Dict[str, Any]] = []
+    updated: Set[int] = set()
+    removed = 0
+    for viewer in previous.get("viewers", []):
+        files = viewer_files(viewer)
+        # Groups may reference files outside the scanned tree; check those on disk.
+        existing = [f for f in files if f in present or (folder / f).is_file()]
+        if not existing:
+            removed += 1
+            continue
+        if existing != files:
+            viewer = dict(viewer, fileName1=existing[0], fileName2="")
+            updated.add(id(viewer))
+        viewers.append(viewer)
+
+    owner = {f: v for v in viewers for f in viewer_files(v)}
+    next_id = max((v["id"] for v in viewers if isinstance(v.get("id"), int)), default=-1) + 1
+    added = 0
+    for viewer in generated["viewers"]:
+        files = viewer_files(viewer)
+        kept = [owner[f] for f in files if f in owner]
+        if len(kept) == len(files):
+            continue
+        if len(kept) == 1 and len(viewer_files(kept[0])) == 1:
+            # The group gained its partner: complete it in place, like ConfigWatcher does.
+            group = kept[0]
+            group["fileName1"] = files[0]
+            group["fileName2"] = files[1] if len(files) > 1 else ""
+            updated.add(id(group))
+        else:
+            group = create_viewer_config([f for f in files if f not in owner], next_id)
+            viewers.append(group)
+            next_id += 1
+            added += 1
+        owner.update((f, group) for f in files if f not in owner)
+
+    merged = dict(previous)
+    merged["timestamp"] = generated["timestamp"]
+    merged["viewers"] = viewers
+    return merged, added, len(updated), removed
+
+
+def latest_config(folder: Path) -> Optional[Path]:
+    configs = [p for p in folder.glob(DEFAULT_CONFIG_GLOB) if p.is_file()]
+    return max(configs, key=lambda p: p.stat().st_mtime) if configs else None
+
+
+def write_config(folder_path: str | Path, output_filename: Optional[str] = None, *,
+                 workers: Optional[int] = None, stats: Optional[ScanStats] = None,
+                 incremental: bool = False) -> str:
+    """Generate a config for ``folder_path`` and write it into the folder.
+
+    In incremental mode the previous config (``output_filename``, or else the newest
+    ``orbital-viewer-config-*.json`` in the folder) is updated in place: edited
+    groups are preserved and new groups appended (see :func:`merge_config`), and
+    only directories changed since the last incremental run are listed again
+    (see :class:`ScanCache`).
+    """
 
-def write_config(folder_path: str | Path, output_filename: Optional[str] = None) -> str:
     folder = Path(folder_path).expanduser().resolve()
     if not folder.exists():
         raise FileNotFoundError(f"文件夹不存在: {folder}")
 
-    config = generate_config(folder)
-
-    if not output_filename:
-        output_filename = f"orbital-viewer-config-{datetime.now().strftime('%Y-%m-%d')}.json"
-
-    if not output_filename.endswith(".json"):
+    if output_filename and not output_filename.endswith(".json"):
         output_filename += ".json"
 
-    output_path = folder / output_filename
+    previous_path: Optional[Path] = None
+    if incremental:
+        previous_path = folder / output_filename if output_filename else latest_config(folder)
+        if previous_path is not None and not previous_path.is_file():
+            previous_path = None
+
+    if output_filename:
+        output_path = folder / output_filename
+    elif previous_path is not None:
+        output_path = previous_path
+    else:
+        output_path = folder / f"orbital-viewer-config-{datetime.now().strftime('%Y-%m-%d')}.json"
+
+    scan_cache_path = folder / SCAN_CACHE_NAME
+    scan_cache = ScanCache.load(scan_cache_path) if incremental else None
+    config = generate_config(folder, workers=workers, stats=stats, scan_cache=scan_cache)
+
+    if previous_path is not None:
+        try:
+            previous = json.loads(previous_path.read_text(encoding="utf-8"))
+        except ValueError as e:
+            raise ValueError(f"无法读取已有配置 {previous_path}: {e}") from None
+        config, added, updated, removed = merge_config(previous, config, folder)
+        logger.info("增量更新 %s：新增 %d 组，更新 %d 组（补全或清除文件），"
+                    "移除 %d 组（文件已不存在），保留 %d 组",
+                    previous_path.name, added, updated, removed, len(config["viewers"]) - added)
 
     output_path.write_text(json.dumps(config, indent=2, ensure_ascii=False), encoding="utf-8")
 
+    if scan_cache is not None:
+        try:
+            scan_cache.save(scan_cache_path)
+        except OSError as e:
+            logger.warning("无法保存扫描缓存 %s: %s", scan_cache_path, e)
+
     logger.info("配置文件已生成: %s", output_path)
     return str(output_path)
@@ -0,0 +1,262 @@
+"""Gaussian cube (.cub/.cube) reader.
+
+The browser used to be the only component that understood cube files: every
+viewer group fetched the raw text and 3Dmol parsed it again. This module gives the
+Python side its own reader so the server can preprocess volumes once.
+
+Layout of a cube file::
+
+    comment line 1
+    comment line 2
+    natoms  ox oy oz  [nval]       (natoms < 0 => an MO index line follows atoms)
+    n1  ax1 ay1 az1                (n1 < 0 => coordinates are in Angstrom)
+    n2  ax2 ay2 az2
+    n3  ax3 ay3 az3
+    Z   charge  x y z              (|natoms| lines)
+    nmo mo1 mo2 ...                (optional, may wrap over several lines)
+    v v v v v v                    (n1*n2*n3*nval values, z fastest)
+
+Performance notes:
+
+- :func:`read_cube_header` only reads the header lines and never touches the voxel
+  block, so it costs the same for a 1 KB and a 1 GB file.
+- :func:`read_cube` tokenizes the voxel block in C via ``numpy.fromstring(sep=" ")``
+  instead of splitting lines in Python. Target throughput is >= 50 MB/s of ASCII on
+  a 200^3 grid (~105 MB file, ~2 s); a per-line ``split()``/``float()`` loop runs
+  at roughly 20 MB/s.
+- The voxel block is streamed in chunks (:func:`iter_cube_values`) straight into
+  the output array, so peak memory is the float32 array plus one chunk rather than
+  several times the file size. ``out=`` accepts a preallocated or memory-mapped
+  array for grids that should not live in RAM at all
+  (see ``python -m benchmarks.cube_memory``).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+BOHR_TO_ANGSTROM = 0.529177210903
+
+# Bytes of ASCII parsed per step (~320k values). The few copies of a chunk made while
+# parsing stay in the CPU caches' neighbourhood: 4 MB parses ~15% faster than 32 MB.
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class CubeFormatError(ValueError):
+    """Raised when a file does not look like a valid cube file."""
+
+
+@dataclass(frozen=True)
+class CubeAtom:
+    number: int
+    charge: float
+    position: Tuple[float, float, float]  # Bohr
+
+
+@dataclass(frozen=True)
+class CubeHeader:
+    comments: Tuple[str, str]
+
+    # Grid origin and axis step vectors, always in Bohr (Angstrom files are converted).
+    origin: Tuple[float, float, float]
+    axes: Tuple[Tuple[float, float, float], ...]
+
+    # Number of points along each axis.
+    dims: Tuple[int, int, int]
+
+    atoms: Tuple[CubeAtom, ...] = ()
+
+    # MO indices from the optional line after the atom block (empty when absent).
+    mo_indices: Tuple[int, ...] = ()
+
+    # Values stored per voxel (number of MOs for MO cubes, usually 1).
+    nval: int = 1
+
+    # Byte offset of the first voxel value in the file.
+    data_offset: int = 0
+
+    @property
+    def n_voxels(self) -> int:
+        return self.dims[0] * self.dims[1] * self.dims[2]
+
+    @property
+    def n_values(self) -> int:
+        return self.n_voxels * self.nval
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        if self.nval == 1:
+            return self.dims
+        return (*self.dims, self.nval)
+
+    def to_dict(self) -> dict:
+        """JSON friendly representation (used by the HTTP API)."""
+
+        return {
+            "comments": list(self.comments),
+            "origin": list(self.origin),
+            "axes": [list(a) for a in self.axes],
+            "dims": list(self.dims),
+            "nval": self.nval,
+            "moIndices": list(self.mo_indices),
+            "atoms": [
+                {"number": a.number, "charge": a.charge, "position": list(a.position)}
+                for a in self.atoms
+            ],
+        }
+
+
+@dataclass
+class CubeVolume:
+    header: CubeHeader
+    data: np.ndarray = field(repr=False)
+
+
+def _split_floats(line: bytes, what: str, count: int) -> List[float]:
+    parts = line.split()
+    if len(parts) < count:
+        raise CubeFormatError(f"Malformed {what} line: {line[:80]!r}")
+    try:
+        return [float(x) for x in parts]
+    except ValueError as e:
+        raise CubeFormatError(f"Malformed {what} line: {line[:80]!r}") from e
+
+
+def _scaled(vec: Tuple[float, float, float], scale: float) -> Tuple[float, float, float]:
+    return (vec[0] * scale, vec[1] * scale, vec[2] * scale)
+
+
+def _read_header(f: BinaryIO) -> CubeHeader:
+    c1 = f.readline()
+    c2 = f.readline()
+
+    first = _split_floats(f.readline(), "atom count/origin", 4)
+    natoms = int(first[0])
+    origin = (first[1], first[2], first[3])
+    nval = int(first[4]) if len(first) > 4 else 1
+
+    dims: List[int] = []
+    axes: List[Tuple[float, float, float]] = []
+    for i in range(3):
+        row = _split_floats(f.readline(), f"axis {i + 1}", 4)
+        dims.append(int(row[0]))
+        axes.append((row[1], row[2], row[3]))
+
+    # A negative first count means the file uses Angstrom (same rule as 3Dmol).
+    scale = 1.0 / BOHR_TO_ANGSTROM if dims[0] < 0 else 1.0
+    dims = [abs(n) for n in dims]
+    if scale != 1.0:
+        origin = _scaled(origin, scale)
+        axes = [_scaled(a, scale) for a in axes]
+
+    if any(n == 0 for n in dims):
+        raise CubeFormatError(f"Invalid grid dimensions: {dims}")
+
+    atoms: List[CubeAtom] = []
+    for _ in range(abs(natoms)):
+        row = _split_floats(f.readline(), "atom", 5)
+        atoms.append(CubeAtom(int(row[0]), row[1], _scaled((row[2], row[3], row[4]), scale)))
+
+    mo_indices: Tuple[int, ...] = ()
+    if natoms < 0:
+        tokens: List[bytes] = f.readline().split()
+        if not tokens:
+            raise CubeFormatError("Missing MO index line")
+        nmo = int(tokens[0])
+        # The index list may wrap over several lines.
+        while len(tokens) < nmo + 1:
+            more = f.readline()
+            if not more:
+                raise CubeFormatError("Truncated MO index line")
+            tokens.extend(more.split())
+        mo_indices = tuple(int(t) for t in tokens[1 : nmo + 1])
+        nval = max(nmo, 1)
+
+    return CubeHeader(
+        comments=(c1.decode("utf-8", "replace").rstrip("\r\n"), c2.decode("utf-8", "replace").rstrip("\r\n")),
+        origin=origin,
+        axes=tuple(axes),
+        dims=(dims[0], dims[1], dims[2]),
+        atoms=tuple(atoms),
+        mo_indices=mo_indices,
+        nval=nval,
+        data_offset=f.tell(),
+    )
+
+
+def read_cube_header(path: str | Path) -> CubeHeader:
+    """Parse only the header/atom block of a cube file."""
+
+    with Path(path).open("rb") as f:
+        return _read_header(f)
+
+
+def iter_cube_values(f: BinaryIO, n_values: int, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[np.ndarray]:
+    """Yield the voxel values of an open cube file as float64 chunks.
+
+    ``f`` must be positioned at the voxel block (after :func:`read_cube_header`'s
+    ``data_offset``). Each chunk ends on a whitespace boundary; the partial token
+    at the end of a read is carried over to the next one. Stops after ``n_values``
+    values and raises :class:`CubeFormatError` if the file has fewer.
+    """
+
+    remaining = n_values
+    carry = b""
+    while remaining > 0:
+        block = f.read(chunk_bytes)
+        eof = not block
+        raw = carry + block
+        if not eof:
+            # Split after the last separator so no number is cut in two.
+            cut = max(raw.rfind(b" "), raw.rfind(b"\n"), raw.rfind(b"\t"), raw.rfind(b"\r")) + 1
+            if cut == 0:
+                carry = raw
+                continue
+            raw, carry = raw[:cut], raw[cut:]
+        else:
+            carry = b""
+
+        # fromstring's text mode tokenizes and converts in a single C loop; it beats
+        # both fromfile(sep=" ") (~1.7x) and bytes.split() + np.array (~1.4x).
+        # Do not pass count=: NumPy pads short input with uninitialised memory instead
+        # of failing, so truncated files have to be detected from the returned size.
+        values = np.fromstring(raw, dtype=np.float64, sep=" ") if raw and not raw.isspace() else np.empty(0)
+        del raw
+        if values.size:
+            values = values[:remaining]
+            remaining -= values.size
+            yield values
+        if eof:
+            break
+
+    if remaining > 0:
+        raise CubeFormatError(f"Expected {n_values} values, found {n_values - remaining}")
+
+
+def read_cube(path: str | Path, dtype: np.dtype | type = np.float32, *, out: Optional[np.ndarray] = None,
+              chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> CubeVolume:
+    """Read a whole cube file into a NumPy array of shape ``header.shape``.
+
+    The values are streamed into ``out`` if given (any writable array with
+    ``header.n_values`` elements, e.g. a ``np.memmap``), otherwise into a new array
+    of ``dtype``.
+    """
+
+    with Path(path).open("rb") as f:
+        header = _read_header(f)
+        if out is None:
+            out = np.empty(header.n_values, dtype=dtype)
+        elif out.size != header.n_values:
+            raise ValueError(f"out has {out.size} elements, the cube has {header.n_values} values")
+
+        flat = out.reshape(-1)
+        pos = 0
+        for values in iter_cube_values(f, header.n_values, chunk_bytes):
+            flat[pos : pos + values.size] = values
+            pos += values.size
+
+    return CubeVolume(header=header, data=out.reshape(header.shape))
@@ -0,0 +1,260 @@
+"""Worker-pool HTTP/1.1 server engine.
+
+The default :class:`orbviewer.server.ThreadedHTTPServer` speaks HTTP/1.0 and spawns
+one thread per request, so opening a page costs ~10 TCP connections and threads
+and a busy lab machine can end up with hundreds of them. :class:`PooledHTTPServer`
+instead uses:
+
+- a fixed number of worker threads fed from a bounded request queue. When the
+  queue is full the accept loop waits (backpressure through the listen backlog)
+  and after ``queue_timeout`` the connection is answered with 503;
+- persistent HTTP/1.1 connections. Between requests an idle connection does not
+  occupy a worker: it is parked in a selector and handed back to the queue when
+  the next request arrives, or closed after ``idle_timeout`` seconds;
+- a socket timeout (``request_timeout``) while a request is being read or written;
+- ``TCP_NODELAY`` on every connection: headers and body are separate writes, and
+  with Nagle's algorithm each response on a reused connection would wait for the
+  client's delayed ACK (~40 ms);
+- long-lived responses (the ``/api/events`` streams of watch mode) are handed to
+  a thread of their own with :meth:`PooledHTTPServer.detach`, so open pages do not
+  hold workers.
+
+HTTP pipelining is not supported (browsers do not use it): a connection is parked
+as soon as one response has been written.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import selectors
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 64
+
+
+class _KeepAliveMixin:
+    """Handle exactly one request per dispatch and keep the connection open."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    # Set by PooledHTTPServer.detach(): the rest of the response, run outside the pool.
+    detached: Optional[Callable[[], None]] = None
+
+    def handle(self) -> None:
+        # handle_one_request() clears this for HTTP/1.1 requests without "Connection: close".
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self) -> None:
+        if self.close_connection and self.detached is None:
+            super().finish()  # type: ignore[misc]
+        else:
+            self.wfile.flush()  # type: ignore[attr-defined]
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    request_queue_size = 128  # listen() backlog
+
+    def __init__(self, server_address: Tuple[str, int], handler_cls: Any, *, workers: int = DEFAULT_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, queue_timeout: float = 5.0, idle_timeout: float = 15.0,
+                 request_timeout: float = 60.0) -> None:
+        handler_cls = type(
+            handler_cls.__name__,
+            (_KeepAliveMixin, handler_cls),
+            {"timeout": request_timeout},
+        )
+        super().__init__(server_address, handler_cls)
+
+        self.workers = max(1, int(workers))
+        self.queue_timeout = queue_timeout
+        self.idle_timeout = idle_timeout
+
+        self._queue: "queue.Queue[Optional[Tuple[Any, socket.socket, Any]]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._selector = selectors.DefaultSelector()
+        self._selector_lock = threading.Lock()
+        self._idle: Dict[socket.socket, Tuple[Any, Any, float]] = {}
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._stopping = threading.Event()
+
+        self.active_connections = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+
+        self._threads: List[threading.Thread] = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"orbviewer-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._idle_loop, name="orbviewer-keepalive", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    # -- accepting --------------------------------------------------------
+
+    def process_request(self, request: socket.socket, client_address: Any) -> None:  # type: ignore[override]
+        with self._stats_lock:
+            self.active_connections += 1
+        try:
+            self._queue.put((None, request, client_address), timeout=self.queue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            logger.warning("请求队列已满，拒绝连接: %s", client_address)
+            self._reject(request)
+
+    def _reject(self, request: socket.socket) -> None:
+        try:
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Retry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+        except OSError:
+            pass
+        self._close(request)
+
+    def _close(self, request: socket.socket) -> None:
+        with self._stats_lock:
+            self.active_connections -= 1
+        self.shutdown_request(request)
+
+    # -- workers ----------------------------------------------------------
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            handler, request, client_address = item
+            try:
+                if handler is None:
+                    # BaseRequestHandler.__init__ runs setup() + the first request.
+                    handler = self.RequestHandlerClass(request, client_address, self)
+                else:
+                    handler.handle()
+                    handler.finish()
+            except Exception:
+                self.handle_error(request, client_address)
+                self._close(request)
+                continue
+
+            if handler.detached is not None:
+                self._run_detached(handler, request, client_address)
+            elif handler.close_connection or self._stopping.is_set():
+                self._close(request)
+            else:
+                self._park(handler, request, client_address)
+
+    def detach(self, handler: Any, stream: Callable[[], None]) -> None:
+        """Finish ``handler``'s response with ``stream()`` on a thread of its own.
+
+        For responses that stay open (event streams): the worker returns to the pool
+        as soon as the handler returns, and the connection is closed when
+        ``stream`` returns.
+        """
+
+        handler.detached = stream
+
+    def _run_detached(self, handler: Any, request: socket.socket, client_address: Any) -> None:
+        stream, handler.detached = handler.detached, None
+
+        def run() -> None:
+            try:
+                stream()
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self._close(request)
+
+        threading.Thread(target=run, name="orbviewer-stream", daemon=True).start()
+
+    # -- idle keep-alive connections --------------------------------------
+
+    def _park(self, handler: Any, request: socket.socket, client_address: Any) -> None:
+        with self._selector_lock:
+            self._idle[request] = (handler, client_address, time.monotonic())
+            self._selector.register(request, selectors.EVENT_READ)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _idle_loop(self) -> None:
+        while not self._stopping.is_set():
+            events = self._selector.select(timeout=1.0)
+            ready: List[Tuple[Any, socket.socket, Any]] = []
+            expired: List[socket.socket] = []
+
+            with self._selector_lock:
+                for key, _ in events:
+                    if key.fileobj is self._wake_r:
+                        try:
+                            while self._wake_r.recv(4096):
+                                pass
+                        except OSError:
+                            pass
+                        continue
+                    sock = key.fileobj
+                    handler, addr, _ = self._idle.pop(sock)  # type: ignore[arg-type]
+                    self._selector.unregister(sock)
+                    ready.append((handler, sock, addr))  # type: ignore[arg-type]
+
+                deadline = time.monotonic() - self.idle_timeout
+                for sock, (_, _, since) in list(self._idle.items()):
+                    if since < deadline:
+                        del self._idle[sock]
+                        self._selector.unregister(sock)
+                        expired.append(sock)
+
+            for item in ready:
+                # Blocking put: a full queue also throttles keep-alive clients.
+                self._queue.put(item)
+            for sock in expired:
+                self._close(sock)
+
+    # -- lifecycle --------------------------------------------------------
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "active_connections": self.active_connections,
+                "idle_connections": len(self._idle),
+                "rejected": self.rejected,
+            }
+
+    def server_close(self) -> None:
+        self._stopping.set()
+        self._wake()
+        for _ in range(self.workers):
+            try:
+                self._queue.put(None, timeout=1.0)
+            except queue.Full:
+                break
+        super().server_close()
+
+        with self._selector_lock:
+            for sock in list(self._idle):
+                self._selector.unregister(sock)
+                self.shutdown_request(sock)
+            self._idle.clear()
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
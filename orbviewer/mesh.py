@@ -0,0 +1,242 @@
+"""Isosurface extraction (marching tetrahedra) on cube grids with NumPy.
+
+Every viewer group used to run four surface extractions in the browser (+/-iso for
+both cube files). The server can instead extract each surface once, cache it per
+(file, isovalue) and ship only the triangles.
+
+Each grid cell is split into six tetrahedra around its main diagonal; this split
+is consistent between neighbouring cells, so the resulting mesh is watertight.
+Everything is vectorised over the "active" cells (cells the surface actually
+crosses), which are usually a few percent of the grid. Vertices on shared grid
+edges are deduplicated, so the output is an indexed mesh. Normals come from the
+field gradient (central differences) rather than from the faces, which gives smooth
+shading comparable to 3Dmol's own surfaces.
+
+The wire format reuses :func:`orbviewer.volume.pack_volume` with the ``OMSH`` magic;
+the payload is positions (float32, Angstrom), normals (float32) and triangle
+indices (uint32), one after another.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cube import BOHR_TO_ANGSTROM
+from .volume import CROP_FRACTION, clamp_level, load_volume, pack_volume
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from .cache import VolumeCache
+
+MESH_MAGIC = b"OMSH"
+
+# Cell corners as (dx, dy, dz); corner 0 and corner 6 span the main diagonal.
+_CORNERS = np.array([
+    (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+    (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1),
+])
+
+# Six tetrahedra sharing the 0-6 diagonal.
+_TETS = np.array([
+    (0, 6, 1, 2), (0, 6, 2, 3), (0, 6, 3, 7),
+    (0, 6, 7, 4), (0, 6, 4, 5), (0, 6, 5, 1),
+])
+
+
+def _build_tet_table() -> np.ndarray:
+    """Triangles (as pairs of tetrahedron vertices) for the 16 inside/outside cases.
+
+    Shape is (16, 2, 3, 2): case, triangle, triangle vertex, edge endpoints. Unused
+    triangles are marked with -1. Winding is fixed later from the normals.
+    """
+
+    table = -np.ones((16, 2, 3, 2), dtype=np.int8)
+    for case in range(16):
+        inside = [v for v in range(4) if case >> v & 1]
+        outside = [v for v in range(4) if not case >> v & 1]
+        if len(inside) in (1, 3):
+            lone = inside[0] if len(inside) == 1 else outside[0]
+            others = [v for v in range(4) if v != lone]
+            table[case, 0] = [(lone, o) for o in others]
+        elif len(inside) == 2:
+            (a, b), (c, d) = inside, outside
+            table[case, 0] = [(a, c), (a, d), (b, d)]
+            table[case, 1] = [(a, c), (b, d), (b, c)]
+    return table
+
+
+_TET_TABLE = _build_tet_table()
+
+
+def _gradient_at(field: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Central-difference gradient (index space) at flat grid indices ``ids``."""
+
+    nx, ny, nz = field.shape
+    flat = field.reshape(-1)
+    i, j, k = np.unravel_index(ids, field.shape)
+    out = np.empty((ids.size, 3), dtype=np.float32)
+    strides = (ny * nz, nz, 1)
+    for axis, (coord, n) in enumerate(((i, nx), (j, ny), (k, nz))):
+        lo = np.where(coord > 0, ids - strides[axis], ids)
+        hi = np.where(coord < n - 1, ids + strides[axis], ids)
+        span = (np.minimum(coord + 1, n - 1) - np.maximum(coord - 1, 0)).astype(np.float32)
+        out[:, axis] = (flat[hi] - flat[lo]) / np.maximum(span, 1.0)
+    return out
+
+
+def marching_tetrahedra(field: np.ndarray, level: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Extract the surface ``field == level``.
+
+    Returns ``(points, gradients, triangles)``: vertex positions in grid index
+    coordinates, the interpolated field gradient at each vertex (index space) and
+    an ``(n, 3)`` array of vertex indices.
+    """
+
+    field = np.ascontiguousarray(field, dtype=np.float32)
+    nx, ny, nz = field.shape
+    empty = (np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32), np.zeros((0, 3), np.uint32))
+    if min(nx, ny, nz) < 2:
+        return empty
+
+    inside = field > level
+
+    # Active cells: corners are neither all inside nor all outside.
+    count = np.zeros((nx - 1, ny - 1, nz - 1), dtype=np.uint8)
+    for dx, dy, dz in _CORNERS:
+        count += inside[dx : nx - 1 + dx, dy : ny - 1 + dy, dz : nz - 1 + dz]
+    ci, cj, ck = np.nonzero((count > 0) & (count < 8))
+    if ci.size == 0:
+        return empty
+
+    base = (ci * (ny * nz) + cj * nz + ck).astype(np.int64)
+    corner_offsets = _CORNERS[:, 0] * (ny * nz) + _CORNERS[:, 1] * nz + _CORNERS[:, 2]
+    corner_ids = base[:, None] + corner_offsets[None, :]  # (cells, 8)
+
+    flat_inside = inside.reshape(-1)
+    edge_a: List[np.ndarray] = []
+    edge_b: List[np.ndarray] = []
+    for tet in _TETS:
+        ids = corner_ids[:, tet]  # (cells, 4)
+        case = (flat_inside[ids] * np.array([1, 2, 4, 8], dtype=np.uint8)).sum(axis=1)
+        for tri in range(2):
+            edges = _TET_TABLE[case, tri]  # (cells, 3, 2)
+            used = edges[:, 0, 0] >= 0
+            if not used.any():
+                continue
+            rows = ids[used]
+            e = edges[used].astype(np.intp)
+            r = np.arange(rows.shape[0])[:, None]
+            edge_a.append(rows[r, e[:, :, 0]])
+            edge_b.append(rows[r, e[:, :, 1]])
+
+    if not edge_a:
+        return empty
+
+    a = np.concatenate(edge_a)  # (triangles, 3) grid ids
+    b = np.concatenate(edge_b)
+    lo = np.minimum(a, b)
+    hi = np.maximum(a, b)
+
+    # One vertex per crossed grid edge.
+    n_points = nx * ny * nz
+    keys, triangles = np.unique((lo * n_points + hi).reshape(-1), return_inverse=True)
+    lo_ids = keys // n_points
+    hi_ids = keys % n_points
+
+    flat = field.reshape(-1)
+    v_lo = flat[lo_ids]
+    v_hi = flat[hi_ids]
+    denom = v_hi - v_lo
+    t = np.where(denom != 0, (level - v_lo) / np.where(denom != 0, denom, 1), 0.5).astype(np.float32)[:, None]
+
+    p_lo = np.stack(np.unravel_index(lo_ids, field.shape), axis=1).astype(np.float32)
+    p_hi = np.stack(np.unravel_index(hi_ids, field.shape), axis=1).astype(np.float32)
+    points = p_lo + t * (p_hi - p_lo)
+
+    g_lo = _gradient_at(field, lo_ids)
+    g_hi = _gradient_at(field, hi_ids)
+    gradients = g_lo + t * (g_hi - g_lo)
+
+    return points, gradients, triangles.reshape(-1, 3).astype(np.uint32)
+
+
+def extract_isosurface(grid: np.ndarray, meta: Dict[str, Any], iso: float) -> Dict[str, np.ndarray]:
+    """Isosurface of a cube grid in world coordinates (Angstrom).
+
+    A negative ``iso`` selects the region ``value < iso`` (negative lobes), like
+    3Dmol does for negative isovalues. Normals point out of the selected region.
+    """
+
+    field = np.asarray(grid, dtype=np.float32)
+    if iso < 0:
+        field = -field
+    points, gradients, triangles = marching_tetrahedra(field, abs(iso))
+
+    axes = np.asarray(meta["axes"], dtype=np.float64)  # rows are step vectors (Bohr)
+    origin = np.asarray(meta["origin"], dtype=np.float64)
+    positions = (origin + points.astype(np.float64) @ axes) * BOHR_TO_ANGSTROM
+
+    # d/dworld = A^-1 d/dindex (A rows are the axis vectors); outward = -gradient.
+    normals = -(gradients.astype(np.float64) @ np.linalg.inv(axes).T)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = normals / np.where(lengths > 0, lengths, 1.0)
+
+    # Orient every triangle consistently with its vertex normals.
+    if triangles.size:
+        p0, p1, p2 = (positions[triangles[:, i]] for i in range(3))
+        face = np.cross(p1 - p0, p2 - p0)
+        vnorm = normals[triangles].sum(axis=1)
+        flip = (face * vnorm).sum(axis=1) < 0
+        triangles[flip] = triangles[flip][:, [0, 2, 1]]
+
+    return {
+        "positions": positions.astype(np.float32),
+        "normals": normals.astype(np.float32),
+        "indices": triangles.astype(np.uint32),
+    }
+
+
+def load_mesh(path: "Path", iso: float, cache: Optional["VolumeCache"] = None,
+              level: int = 0, crop: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Return ``(json_header, buffers)`` of the isosurface of a cube at ``iso``.
+
+    ``level`` extracts the surface from a coarse level of detail (see
+    :func:`orbviewer.volume.load_volume`). Meshes are cached per (file, isovalue,
+    level) when a cache is given.
+
+    ``crop`` extracts from the cropped grid; it is capped below ``|iso|`` so the
+    surface is the same as without cropping (hence not part of the cache key).
+    """
+
+    level = clamp_level(path, level)
+    if crop is not None:
+        crop = min(crop, CROP_FRACTION * abs(iso))
+
+    def build():
+        meta, grid = load_volume(path, cache, level, crop)
+        buffers = extract_isosurface(grid, meta, iso)
+        meta = dict(meta, iso=iso, units="angstrom",
+                    vertexCount=int(buffers["positions"].shape[0]),
+                    triangleCount=int(buffers["indices"].shape[0]))
+        return meta, buffers
+
+    if cache is None:
+        return build()
+
+    params: Dict[str, Any] = {"iso": iso}
+    if level:
+        params["level"] = level
+    entry = cache.get_or_create(path, "mesh", build, params=params)
+    return entry.meta, entry.arrays
+
+
+def encode_mesh(meta: Dict[str, Any], buffers: Dict[str, np.ndarray]) -> bytes:
+    payload = b"".join([
+        np.ascontiguousarray(buffers["positions"], dtype="<f4").tobytes(),
+        np.ascontiguousarray(buffers["normals"], dtype="<f4").tobytes(),
+        np.ascontiguousarray(buffers["indices"], dtype="<u4").tobytes(),
+    ])
+    return pack_volume(meta, payload, magic=MESH_MAGIC)
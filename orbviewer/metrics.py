@@ -0,0 +1,285 @@
+"""Request metrics of the viewer server (``/metrics``).
+
+:class:`ServerMetrics` counts every request the handler serves, by route (see
+:func:`route_for`) and status, with two latency histograms per route:
+
+- ``duration``: from the parsed request line until the response is written (disk,
+  processing and network);
+- ``first_byte``: until the first byte of the response (status line) is written,
+  i.e. without the transfer of the body. A route whose duration is much larger
+  than its first-byte time is limited by the network (or a slow client), not by
+  the server or the disk.
+
+Bytes sent (headers and bodies, including ``sendfile``) are counted per route.
+The handler adds point-in-time gauges when the endpoint is requested: active
+connections, requests in flight, the hit/miss counters of the volume and gzip
+caches and the state of the pool engine. ``/metrics`` returns the Prometheus text
+format, ``/metrics?format=json`` a JSON summary with latency percentiles estimated
+from the histograms.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# API prefixes reported as their own route; other paths below "/" are user files.
+_API_ROUTES = {
+    "/api/index": "api_index",
+    "/api/combine": "api_combine",
+    "/api/events": "api_events",
+    "/metrics": "metrics",
+    "/convert-view": "convert_view",
+}
+_API_PREFIXES = (
+    ("/api/volume/", "api_volume"),
+    ("/api/mesh/", "api_mesh"),
+    ("/static/", "static"),
+)
+
+
+def route_for(path: str) -> str:
+    """Route label of a request path (without the query string)."""
+
+    if path == "/":
+        return "index"
+    if path in _API_ROUTES:
+        return _API_ROUTES[path]
+    for prefix, route in _API_PREFIXES:
+        if path.startswith(prefix):
+            return route
+    return "user_file"
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        out, total = [], 0
+        for bound, n in zip(self.buckets + (math.inf,), self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate like PromQL ``histogram_quantile`` (linear within a bucket)."""
+
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if math.isinf(bound):
+                    return lower
+                inside = total - below
+                return lower + (bound - lower) * ((rank - below) / inside if inside else 0.0)
+            lower, below = bound, total
+        return lower
+
+    def copy(self) -> "Histogram":
+        h = Histogram(self.buckets)
+        h.counts, h.count, h.sum = list(self.counts), self.count, self.sum
+        return h
+
+
+class _RouteStats:
+    def __init__(self) -> None:
+        self.status: Dict[int, int] = {}
+        self.bytes_sent = 0
+        self.duration = Histogram()
+        self.first_byte = Histogram()
+
+    def copy(self) -> "_RouteStats":
+        c = _RouteStats()
+        c.status, c.bytes_sent = dict(self.status), self.bytes_sent
+        c.duration, c.first_byte = self.duration.copy(), self.first_byte.copy()
+        return c
+
+
+class CountingWriter:
+    """Wraps a handler's ``wfile``: counts the bytes written and the time of the first write."""
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+        self.count = 0
+        self.first_write: Optional[float] = None
+
+    def reset(self) -> None:
+        self.count = 0
+        self.first_write = None
+
+    def write(self, data: bytes) -> int:
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        n = self._raw.write(data)
+        self.count += len(data)
+        return n
+
+    def add(self, n: int) -> None:
+        """Count bytes sent around the writer (``socket.sendfile``)."""
+
+        self.count += n
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+
+class ServerMetrics:
+    """Thread-safe per-route request counters and latency histograms."""
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.in_flight = 0
+        self._routes: Dict[str, _RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, route: str, status: int, seconds: float, first_byte: Optional[float],
+                         bytes_sent: int) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = _RouteStats()
+            stats.status[status] = stats.status.get(status, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.duration.observe(seconds)
+            if first_byte is not None:
+                stats.first_byte.observe(first_byte)
+
+    def routes(self) -> Dict[str, _RouteStats]:
+        with self._lock:
+            return {route: stats.copy() for route, stats in sorted(self._routes.items())}
+
+    # -- exposition -------------------------------------------------------
+
+    def summary(self, gauges: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """JSON summary; ``gauges`` (see the module docstring) are included as given."""
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1e3, 3)
+
+        routes: Dict[str, Any] = {}
+        for route, stats in self.routes().items():
+            d = stats.duration
+            routes[route] = {
+                "requests": d.count,
+                "errors": sum(n for code, n in stats.status.items() if code >= 400),
+                "not_modified": stats.status.get(304, 0),
+                "status": {str(code): n for code, n in sorted(stats.status.items())},
+                "bytes_sent": stats.bytes_sent,
+                "mean_ms": ms(d.sum / d.count) if d.count else None,
+                "p50_ms": ms(d.quantile(0.50)),
+                "p95_ms": ms(d.quantile(0.95)),
+                "p99_ms": ms(d.quantile(0.99)),
+                "first_byte_p50_ms": ms(stats.first_byte.quantile(0.50)),
+                "first_byte_p95_ms": ms(stats.first_byte.quantile(0.95)),
+            }
+
+        gauges = dict(gauges or {})
+        caches = gauges.pop("caches", {})
+        for stats in caches.values():
+            lookups = stats.get("hits", 0) + stats.get("misses", 0)
+            stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else None
+        not_modified = sum(r["not_modified"] for r in routes.values())
+        requests = sum(r["requests"] for r in routes.values())
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "requests": requests,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "bytes_sent": sum(r["bytes_sent"] for r in routes.values()),
+            "in_flight": self.in_flight,
+            **gauges,
+            "caches": {
+                **caches,
+                # Browser caches revalidated with ETag / If-Modified-Since
+                "http_not_modified": {"hits": not_modified, "requests": requests,
+                                      "hit_rate": not_modified / requests if requests else None},
+            },
+            "routes": routes,
+        }
+
+    def prometheus(self, gauges: Optional[Dict[str, Any]] = None) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+
+        lines: List[str] = []
+
+        def header(name: str, kind: str, text: str) -> None:
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        routes = self.routes()
+        header("orbviewer_requests_total", "counter", "HTTP requests by route and status.")
+        for route, stats in routes.items():
+            for code, n in sorted(stats.status.items()):
+                lines.append(f'orbviewer_requests_total{{route="{route}",status="{code}"}} {n}')
+
+        header("orbviewer_sent_bytes_total", "counter", "Bytes sent (headers and bodies) by route.")
+        for route, stats in routes.items():
+            lines.append(f'orbviewer_sent_bytes_total{{route="{route}"}} {stats.bytes_sent}')
+
+        for name, attr, text in (
+            ("orbviewer_request_duration_seconds", "duration", "Time from request line to last byte sent."),
+            ("orbviewer_request_first_byte_seconds", "first_byte", "Time from request line to first byte sent."),
+        ):
+            header(name, "histogram", text)
+            for route, stats in routes.items():
+                hist: Histogram = getattr(stats, attr)
+                for bound, total in hist.cumulative():
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    lines.append(f'{name}_bucket{{route="{route}",le="{le}"}} {total}')
+                lines.append(f'{name}_sum{{route="{route}"}} {hist.sum:.6f}')
+                lines.append(f'{name}_count{{route="{route}"}} {hist.count}')
+
+        gauges = dict(gauges or {})
+        header("orbviewer_requests_in_flight", "gauge", "Requests being handled.")
+        lines.append(f"orbviewer_requests_in_flight {self.in_flight}")
+        caches = gauges.pop("caches", {})
+        engine = gauges.pop("engine", {})
+        for key, value in gauges.items():
+            if isinstance(value, (int, float)):
+                header(f"orbviewer_{key}", "gauge", key.replace("_", " ").capitalize() + ".")
+                lines.append(f"orbviewer_{key} {value}")
+        for key, value in engine.items():
+            # "rejected" counts connections answered with 503 since the start.
+            name, kind = f"orbviewer_engine_{key}", "gauge"
+            if key == "rejected":
+                name, kind = name + "_total", "counter"
+            header(name, kind, f"Pool engine: {key.replace('_', ' ')}.")
+            lines.append(f"{name} {value}")
+
+        header("orbviewer_cache_lookups_total", "counter", "Cache lookups since the server started.")
+        for cache, stats in caches.items():
+            for key, result in (("hits", "hit"), ("misses", "miss")):
+                lines.append(f'orbviewer_cache_lookups_total{{cache="{cache}",result="{result}"}} {stats.get(key, 0)}')
+
+        header("orbviewer_uptime_seconds", "gauge", "Seconds since the server started.")
+        lines.append(f"orbviewer_uptime_seconds {time.time() - self.started:.3f}")
+        return "\n".join(lines) + "\n"
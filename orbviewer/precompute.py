@@ -0,0 +1,291 @@
+"""Fill the cache for a whole calculation folder ahead of time (``orbviewer precompute``).
+
+Opening a group makes the server parse its cubes, build the coarse levels of
+detail, find the crop box and extract the +/-iso surfaces. All of it ends up in the
+volume cache (:mod:`orbviewer.cache`), so only the first opening is slow. This
+module does that work in batch, e.g. as the last step of a compute job, so the
+viewer is instant later.
+
+For every cube under the folder (found like ``write_config`` does) the artifacts a
+page requests are built:
+
+- the float32 grid with its value range (statistics of ``/api/index``);
+- every coarse level of detail;
+- the crop box for the thresholds the server will use (``default.txt`` alone and
+  together with the newest config of the folder, see :func:`orbviewer.volume.crop_threshold`);
+- the +/-iso surfaces at full resolution and at the coarse preview level, for the
+  isovalue of the config group the file belongs to (``default.txt`` otherwise).
+
+Files are processed in a process pool. The run is resumable: cache entries are
+keyed by the cube's (size, mtime), so a file whose artifacts are all present is
+skipped after a few ``stat`` calls, and an interrupted run continues where it
+stopped.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, TextIO, Tuple
+
+from .config_gen import latest_config, scan_cube_dirs, viewer_files
+from .cube import read_cube_header
+from .mesh import load_mesh
+from .resources import default_settings_search_paths
+from .settings import load_default_settings
+from .volume import LOD_MAX_LEVEL, crop_threshold, load_volume, lod_levels
+
+if TYPE_CHECKING:
+    from .cache import VolumeCache
+
+logger = logging.getLogger(__name__)
+
+# Coarse level the viewer requests first (ViewerGroup.coarseLevel in viewer-group.js).
+PREVIEW_LEVEL = LOD_MAX_LEVEL
+
+# Non-interactive progress output: at most one log line per this many seconds.
+PROGRESS_LOG_SECONDS = 10.0
+
+# (kind, params) of one cache entry
+Artifact = Tuple[str, Dict[str, Any]]
+
+
+@dataclass
+class FileResult:
+    """Outcome of one cube file."""
+
+    path: str
+    cube_bytes: int = 0
+    # Bytes of the (cropped) float32 grid /api/volume serves.
+    served_bytes: int = 0
+    built: int = 0
+    skipped: bool = False
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class PrecomputeSummary:
+    files: int = 0
+    skipped: int = 0
+    failed: int = 0
+    built: int = 0
+    cube_bytes: int = 0
+    served_bytes: int = 0
+    cache_bytes: int = 0
+    seconds: float = 0.0
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def plan_artifacts(path: Path, isovalues: Sequence[float], thresholds: Sequence[float]) -> List[Artifact]:
+    """Cache entries the viewer needs for one cube (see the module docstring)."""
+
+    header = read_cube_header(path)
+    levels = lod_levels(header.dims)
+    artifacts: List[Artifact] = [("grid", {})]
+    artifacts += [("grid", {"level": lv}) for lv in range(1, levels + 1)]
+    artifacts += [("crop", {"threshold": t}) for t in thresholds]
+    mesh_levels = sorted({0, min(PREVIEW_LEVEL, levels)})
+    for iso in isovalues:
+        for value in (iso, -iso):
+            for lv in mesh_levels:
+                params: Dict[str, Any] = {"iso": value}
+                if lv:
+                    params["level"] = lv
+                artifacts.append(("mesh", params))
+    return artifacts
+
+
+def served_bytes(path: Path, cache: "VolumeCache", threshold: Optional[float]) -> int:
+    """Size of the float32 grid /api/volume serves for ``path`` (cropped when the box is cached)."""
+
+    dims = list(read_cube_header(path).dims)
+    if threshold:
+        meta = cache.peek(path, "crop", {"threshold": threshold})
+        if meta is not None and meta.get("bounds"):
+            start, stop = meta["bounds"]
+            # Padded by one voxel like the served grid (see orbviewer.volume).
+            dims = [min(n, b + 1) - max(0, a - 1) for a, b, n in zip(start, stop, dims)]
+    return 4 * dims[0] * dims[1] * dims[2]
+
+
+def precompute_file(path: Path, isovalues: Sequence[float], thresholds: Sequence[float],
+                    cache: "VolumeCache") -> FileResult:
+    """Build the missing artifacts of one cube."""
+
+    started = time.perf_counter()
+    result = FileResult(str(path))
+    try:
+        result.cube_bytes = path.stat().st_size
+        artifacts = plan_artifacts(path, isovalues, thresholds)
+        missing = [(kind, params) for kind, params in artifacts if cache.peek(path, kind, params) is None]
+        if not missing:
+            result.skipped = True
+        else:
+            misses = cache.misses
+            load_volume(path, cache, max(p.get("level", 0) for k, p in artifacts if k == "grid"))
+            for threshold in thresholds:
+                load_volume(path, cache, 0, threshold)
+            for kind, params in missing:
+                if kind == "mesh":
+                    load_mesh(path, params["iso"], cache, params.get("level", 0), min(thresholds, default=None))
+            result.built = cache.misses - misses
+        # The server crops with the smaller threshold when a config is opened.
+        result.served_bytes = served_bytes(path, cache, min(thresholds, default=None))
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    finally:
+        result.seconds = time.perf_counter() - started
+    return result
+
+
+def _precompute_job(path: str, isovalues: Sequence[float], thresholds: Sequence[float],
+                    cache_dir: Optional[str], cache_max_bytes: Optional[int]) -> FileResult:
+    """Process pool entry point (each process opens the cache itself)."""
+
+    from .cache import VolumeCache
+
+    cache = VolumeCache(Path(cache_dir) if cache_dir else None, cache_max_bytes)
+    try:
+        return precompute_file(Path(path), isovalues, thresholds, cache)
+    finally:
+        cache.flush_stats()
+
+
+def _isovalue(value: Any) -> Optional[float]:
+    try:
+        iso = abs(float(value))
+    except (TypeError, ValueError):
+        return None
+    return iso if 0 < iso < float("inf") else None
+
+
+class _Progress:
+    """One updating status line on a terminal, periodic log lines otherwise."""
+
+    def __init__(self, total: int, stream: TextIO = sys.stderr) -> None:
+        self.total = total
+        self.done = 0
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.started = time.perf_counter()
+        self.last_log = self.started
+
+    def update(self, result: FileResult) -> None:
+        self.done += 1
+        now = time.perf_counter()
+        elapsed = now - self.started
+        eta = elapsed / self.done * (self.total - self.done)
+        line = f"[{self.done}/{self.total}] {self.done / self.total:.0%}  剩余约 {eta:.0f} 秒  {Path(result.path).name}"
+        if self.interactive:
+            self.stream.write("\r" + line[:120].ljust(120))
+            self.stream.flush()
+        elif now - self.last_log >= PROGRESS_LOG_SECONDS or self.done == self.total:
+            self.last_log = now
+            logger.info("%s", line)
+
+    def clear(self) -> None:
+        if self.interactive:
+            self.stream.write("\r" + " " * 120 + "\r")
+            self.stream.flush()
+
+
+def precompute_folder(folder: str | Path, *, workers: Optional[int] = None, cache_dir: Optional[str] = None,
+                      cache_max_bytes: Optional[int] = None, isovalues: Optional[Sequence[float]] = None,
+                      progress: bool = True) -> PrecomputeSummary:
+    """Precompute the cache entries of every cube under ``folder``.
+
+    ``isovalues`` replaces the isovalues taken from the config/``default.txt`` for
+    every file. ``workers`` processes are used (default: CPU count).
+    """
+
+    from .cache import VolumeCache
+
+    root = Path(folder).expanduser().resolve()
+    if not root.is_dir():
+        raise FileNotFoundError(f"文件夹不存在: {root}")
+
+    started = time.perf_counter()
+    defaults = load_default_settings(default_settings_search_paths(root))
+    config_data: Optional[Dict[str, Any]] = None
+    config_path = latest_config(root)
+    if config_path is not None:
+        try:
+            config_data = json.loads(config_path.read_text(encoding="utf-8"))
+            logger.info("使用配置文件中的等值面值: %s", config_path.name)
+        except (OSError, ValueError) as e:
+            logger.warning("无法读取配置文件 %s: %s", config_path, e)
+
+    # The server crops with the threshold of the folder alone or of the opened config.
+    thresholds = sorted({t for t in (crop_threshold(defaults), crop_threshold(defaults, config_data)) if t})
+
+    default_iso = _isovalue(defaults.get("isoValue"))
+    file_isos: Dict[str, set] = {}
+    for viewer in (config_data or {}).get("viewers", []):
+        iso = _isovalue(viewer.get("isoValue")) if isinstance(viewer, dict) else None
+        if iso is not None:
+            for name in viewer_files(viewer):
+                file_isos.setdefault(name, set()).add(iso)
+
+    jobs: List[Tuple[str, List[float]]] = []
+    for rel_dir, cube_files in scan_cube_dirs(root, workers):
+        for name in cube_files:
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if isovalues is not None:
+                isos = sorted({abs(v) for v in isovalues if v})
+            else:
+                isos = sorted(file_isos.get(rel) or ({default_iso} if default_iso else set()))
+            jobs.append((str(root / rel), isos))
+
+    cache = VolumeCache(Path(cache_dir) if cache_dir else None, cache_max_bytes)
+    cache_before = cache.total_bytes()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    logger.info("预计算 %d 个 cube 文件（%d 个进程）→ 缓存 %s", len(jobs), workers, cache.root)
+
+    summary = PrecomputeSummary(files=len(jobs))
+    bar = _Progress(len(jobs)) if progress and jobs else None
+
+    def done(result: FileResult) -> None:
+        summary.cube_bytes += result.cube_bytes
+        if result.error:
+            summary.failed += 1
+            summary.errors.append((result.path, result.error))
+            if bar is not None:
+                bar.clear()
+            logger.error("预计算失败 %s: %s", result.path, result.error)
+        elif result.skipped:
+            summary.skipped += 1
+        else:
+            summary.built += result.built
+        if not result.error:
+            summary.served_bytes += result.served_bytes
+        if bar is not None:
+            bar.update(result)
+
+    # The workers split the whole cache size cap like this process (see split_cache_budget).
+    args = (str(cache.root), cache_max_bytes)
+    try:
+        if workers == 1:
+            for path, isos in jobs:
+                done(_precompute_job(path, isos, thresholds, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_precompute_job, path, isos, thresholds, *args) for path, isos in jobs]
+                for future in as_completed(futures):
+                    done(future.result())
+    finally:
+        if bar is not None:
+            bar.clear()
+
+    summary.cache_bytes = cache.total_bytes() - cache_before
+    summary.seconds = time.perf_counter() - started
+    if cache.total_bytes() >= cache.max_bytes * 0.95:
+        logger.warning("缓存已接近容量上限（%.0f MB），部分结果可能已被清理；可用 --cache-size 增大",
+                       cache.max_bytes / 1024 / 1024)
+    return summary
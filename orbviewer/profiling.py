@@ -0,0 +1,343 @@
+"""Opt-in profiling of the server and the CLI (``--profile`` / ``ORBVIEWER_PROFILE``).
+
+When a user reports that "the viewer hangs" on a big config, run it once with
+profiling enabled and send the report directory. :class:`Profiler` writes:
+
+- ``session.prof`` / ``session.txt``: cProfile of the whole session. The main
+  thread (CLI commands, the server loop) is profiled from start to end, and every
+  HTTP request is profiled in its handler thread and merged in. ``.prof`` files
+  open with ``python -m pstats``, snakeviz and similar tools;
+- ``requests/NNNNN-<route>-<ms>ms.prof``: one profile per request (``--profile-requests``);
+- ``slow-requests.log``: requests slower than the threshold (``--slow-request``) with
+  stack samples: the handler threads are sampled every :data:`STACK_SAMPLE_SECONDS`
+  and the most frequent stacks of a slow request are logged. A request that is
+  still running when it crosses the threshold is logged right away with its
+  current stack, so a request that never finishes shows up as well;
+- ``memory-NN.txt``: tracemalloc snapshots every :data:`MEMORY_SNAPSHOT_SECONDS`
+  and at the end (``memory-final.txt`` plus ``memory-final.snapshot`` for
+  :meth:`tracemalloc.Snapshot.load`): the top allocation sites and their growth
+  since the start.
+
+Profiling slows the server down noticeably (tracemalloc most of all); it is meant
+for diagnosis only. Worker processes (``precompute``/``render`` with several
+processes) are not profiled.
+
+Since Python 3.12 only one cProfile profiler can be active at a time, and it
+records the calls of every thread. The session profiler is therefore paused while
+the server loop runs (:meth:`Profiler.serving`): ``session.prof`` is then the
+startup profile plus the merged request profiles, and ``--profile-requests`` works.
+A request that starts while another one is being profiled is not profiled.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import contextlib
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .metrics import route_for
+
+logger = logging.getLogger(__name__)
+
+# Environment variables (used when the command line does not set the option)
+PROFILE_ENV = "ORBVIEWER_PROFILE"  # report directory, or "1" for the default one
+PROFILE_REQUESTS_ENV = "ORBVIEWER_PROFILE_REQUESTS"
+SLOW_REQUEST_ENV = "ORBVIEWER_SLOW_REQUEST_MS"
+
+DEFAULT_SLOW_REQUEST_MS = 1000.0
+STACK_SAMPLE_SECONDS = 0.05
+MEMORY_SNAPSHOT_SECONDS = 60.0
+TRACEMALLOC_FRAMES = 10
+# Lines of the text reports (functions, allocation sites, stacks per slow request)
+REPORT_LINES = 40
+SLOW_REQUEST_STACKS = 3
+STACK_DEPTH = 12
+
+Stack = Tuple[Tuple[str, int, str], ...]
+
+# Python 3.12+: one active cProfile profiler per interpreter, recording all threads.
+_SINGLE_PROFILER = sys.version_info >= (3, 12)
+
+# The profiler's own allocations (cProfile call records, merged stats) are not reported.
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def default_profile_dir() -> Path:
+    return Path.cwd() / f"orbviewer-profile-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def profile_dir_from_env() -> Optional[Path]:
+    value = os.environ.get(PROFILE_ENV, "").strip()
+    if not value or value == "0":
+        return None
+    return default_profile_dir() if value == "1" else Path(value).expanduser()
+
+
+def _stack(frame: Optional[FrameType]) -> Stack:
+    """Outermost-first (file, line, function) of a frame, without reading source lines."""
+
+    out = []
+    while frame is not None:
+        out.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(out))
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip() not in ("", "0")
+
+
+class _Request:
+    __slots__ = ("seq", "label", "thread_id", "started", "profile", "samples", "reported")
+
+    def __init__(self, seq: int, label: str) -> None:
+        self.seq = seq
+        self.label = label
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.profile: Optional[cProfile.Profile] = None
+        self.samples: Counter = Counter()
+        self.reported = False
+
+
+class Profiler:
+    """Collects the reports described in the module docstring into ``directory``."""
+
+    def __init__(self, directory: Path, *, per_request: bool = False,
+                 slow_request_ms: float = DEFAULT_SLOW_REQUEST_MS, memory: bool = True) -> None:
+        self.directory = Path(directory)
+        self.per_request = per_request
+        self.slow_seconds = max(0.0, slow_request_ms) / 1000
+        self.memory = memory
+
+        self.requests = 0
+        self.slow_requests = 0
+        self.skipped_profiles = 0
+        self._seq = 0
+        self._active: Dict[int, _Request] = {}
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._main: Optional[cProfile.Profile] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._snapshots = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    @classmethod
+    def from_options(cls, enabled: bool = False, directory: Optional[str] = None, *, per_request: bool = False,
+                     slow_request_ms: Optional[float] = None) -> Optional["Profiler"]:
+        """Profiler for the command line options, falling back to the environment variables.
+
+        Returns None when profiling is not enabled by ``enabled``, ``directory`` or
+        :data:`PROFILE_ENV`.
+        """
+
+        if directory:
+            path: Optional[Path] = Path(directory).expanduser()
+        elif enabled:
+            path = default_profile_dir()
+        else:
+            path = profile_dir_from_env()
+        if path is None:
+            return None
+        if slow_request_ms is None:
+            try:
+                slow_request_ms = float(os.environ.get(SLOW_REQUEST_ENV, DEFAULT_SLOW_REQUEST_MS))
+            except ValueError:
+                slow_request_ms = DEFAULT_SLOW_REQUEST_MS
+        per_request = per_request or _env_flag(PROFILE_REQUESTS_ENV)
+        return cls(path, per_request=per_request, slow_request_ms=slow_request_ms)
+
+    # -- session ----------------------------------------------------------
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.per_request:
+            (self.directory / "requests").mkdir(exist_ok=True)
+        self._started = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._baseline = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+        self._sampler = threading.Thread(target=self._sample_loop, name="orbviewer-profiler", daemon=True)
+        self._sampler.start()
+
+        self._main = cProfile.Profile()
+        try:
+            self._main.enable()
+        except ValueError as e:  # another profiler is active (Python 3.12+)
+            logger.warning("无法启用 cProfile: %s", e)
+            self._main = None
+        logger.info("性能分析已启用，报告目录: %s（慢请求阈值 %.0f ms）", self.directory, self.slow_seconds * 1000)
+
+    def stop(self) -> None:
+        if self._main is not None:
+            self._main.disable()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+        if tracemalloc.is_tracing() and self._baseline is not None:
+            snapshot = self._write_memory_report("final")
+            snapshot.dump(str(self.directory / "memory-final.snapshot"))
+            tracemalloc.stop()
+
+        stats = pstats.Stats(self._main) if self._main is not None else None
+        with self._lock:
+            if self._stats is not None:
+                stats = self._stats if stats is None else stats.add(self._stats)
+        if stats is not None:
+            stats.dump_stats(str(self.directory / "session.prof"))
+            with (self.directory / "session.txt").open("w", encoding="utf-8") as f:
+                f.write(f"session: {time.perf_counter() - self._started:.1f} s, {self.requests} requests "
+                        f"({self.slow_requests} slow, {self.skipped_profiles} not profiled)\n\n")
+                stats.stream = f  # type: ignore[attr-defined]
+                stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+                stats.sort_stats("tottime").print_stats(REPORT_LINES)
+        logger.info("性能分析报告已写入: %s", self.directory)
+
+    @contextlib.contextmanager
+    def serving(self) -> Iterator[None]:
+        """Wrap the server loop: lets the handler threads profile their requests.
+
+        Before Python 3.12 this does nothing. Since 3.12 the session profiler would
+        keep every request profile from starting, so it is paused meanwhile.
+        """
+
+        paused = _SINGLE_PROFILER and self._main is not None
+        if paused:
+            self._main.disable()
+        try:
+            yield
+        finally:
+            if paused:
+                self._main.enable()
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    # -- requests ---------------------------------------------------------
+
+    def start_request(self, label: str) -> _Request:
+        """Start profiling the request handled by the calling thread."""
+
+        with self._lock:
+            self._seq += 1
+            request = _Request(self._seq, label)
+            self._active[request.thread_id] = request
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            request.profile = profile
+        except ValueError:  # another profiler is active (Python 3.12+)
+            with self._lock:
+                self.skipped_profiles += 1
+        return request
+
+    def finish_request(self, request: _Request, status: int) -> None:
+        seconds = time.perf_counter() - request.started
+        if request.profile is not None:
+            request.profile.disable()
+        with self._lock:
+            self._active.pop(request.thread_id, None)
+            # The sampler thread updates the counter under the same lock.
+            samples = Counter(request.samples)
+            self.requests += 1
+            if request.profile is not None:
+                if self._stats is None:
+                    self._stats = pstats.Stats(request.profile)
+                else:
+                    self._stats.add(request.profile)
+
+        if self.per_request and request.profile is not None:
+            path = urllib.parse.urlsplit(request.label.partition(" ")[2]).path
+            name = f"{request.seq:05d}-{route_for(path)}-{seconds * 1000:.0f}ms.prof"
+            request.profile.dump_stats(str(self.directory / "requests" / name))
+
+        if self.slow_seconds and seconds >= self.slow_seconds:
+            with self._lock:
+                self.slow_requests += 1
+            logger.warning("慢请求 %.0f ms: %s（详见 %s）", seconds * 1000, request.label,
+                           self.directory / "slow-requests.log")
+            self._log_slow(request, f"{seconds * 1000:.0f} ms, status {status}", samples)
+
+    # -- sampling ---------------------------------------------------------
+
+    def _sample_loop(self) -> None:
+        next_snapshot = time.perf_counter() + MEMORY_SNAPSHOT_SECONDS
+        while not self._stop.wait(STACK_SAMPLE_SECONDS):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            with self._lock:
+                active = list(self._active.values())
+            for request in active:
+                frame = frames.get(request.thread_id)
+                if frame is None:
+                    continue
+                stack = _stack(frame)
+                with self._lock:
+                    request.samples[stack] += 1
+                if self.slow_seconds and not request.reported and now - request.started >= self.slow_seconds:
+                    # Still running: log it now in case it never finishes.
+                    request.reported = True
+                    self._log_slow(request, f"仍在处理，已 {(now - request.started) * 1000:.0f} ms",
+                                   Counter({stack: 1}))
+            if self._baseline is not None and now >= next_snapshot:
+                next_snapshot = now + MEMORY_SNAPSHOT_SECONDS
+                self._snapshots += 1
+                self._write_memory_report(f"{self._snapshots:02d}")
+
+    def _log_slow(self, request: _Request, what: str, samples: Counter) -> None:
+        total = sum(samples.values())
+        lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S')}  {request.label}  ({what}, {total} samples)"]
+        for stack, n in samples.most_common(SLOW_REQUEST_STACKS):
+            lines.append(f"  {n} samples ({n / total:.0%}):")
+            for filename, lineno, name in stack[-STACK_DEPTH:]:
+                lines.append(f'    File "{filename}", line {lineno}, in {name}')
+        with self._log_lock, (self.directory / "slow-requests.log").open("a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n\n")
+
+    # -- memory -----------------------------------------------------------
+
+    def _write_memory_report(self, name: str) -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        lines: List[str] = [
+            f"after {time.perf_counter() - self._started:.1f} s: traced {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB",
+            "",
+            "Top allocation sites:",
+            *(str(stat) for stat in snapshot.statistics("lineno")[:REPORT_LINES]),
+        ]
+        if self._baseline is not None:
+            lines += ["", "Growth since start:"]
+            lines += [str(stat) for stat in snapshot.compare_to(self._baseline, "lineno")[:REPORT_LINES]]
+        lines += ["", "Largest allocation tracebacks:"]
+        for stat in snapshot.statistics("traceback")[:5]:
+            lines.append(f"{stat.count} blocks, {stat.size / 1e6:.1f} MB")
+            lines += ["  " + line for line in stat.traceback.format()]
+        (self.directory / f"memory-{name}.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return snapshot
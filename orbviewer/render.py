@@ -0,0 +1,601 @@
+"""Headless rendering of viewer groups to PNG (``orbviewer render``).
+
+Screenshots used to need a browser tab per group. This module renders the groups of
+a config with a small software rasterizer written in NumPy, so figures can be made
+in batch on compute nodes without a display or GPU. Groups are rendered in
+parallel with a process pool.
+
+The scene follows what ``viewer-group.js`` draws:
+
+- atoms as spheres (covalent radius x 0.4) and bonds as light gray cylinders,
+  with the colors and radii of ``static/utility.js``;
+- the +/-iso surfaces of both cube files (``color1``/``color2`` and their
+  complementary colors) at opacity 0.85, or, with value mapping, the +iso surface
+  of file 1 colored by the values of file 2 (``gradientType``, ``minMapValue``,
+  ``maxMapValue``; midpoint 0);
+- the 3Dmol camera: 20 degree perspective, camera at z = 150. A stored ``view``
+  (3Dmol ``getView()`` array, saved with the config) is used as is; otherwise the
+  view is fitted like ``viewer.zoomTo()``.
+
+Rasterization is vectorised over triangles: triangles are grouped by screen size,
+every group is expanded into candidate pixels at once and the nearest fragment per
+pixel is kept with a sort. Colors are lit per vertex (headlight, Lambert) and
+interpolated. Opaque geometry (atoms, bonds) has its own depth buffer; for the
+transparent surfaces only the nearest layer is blended over it. Images are rendered
+at ``supersample`` times the size and averaged down for anti-aliasing, then written
+as RGB PNG with zlib (no imaging library needed).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import re
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .algebra import sample_grid
+from .catalog import element_symbol
+from .convert import quaternion_to_rotation_matrix
+from .cube import BOHR_TO_ANGSTROM
+from .mesh import load_mesh
+from .resources import default_settings_search_paths
+from .settings import load_default_settings
+from .utils import safe_join
+from .volume import CROP_FRACTION, load_volume
+
+if TYPE_CHECKING:
+    from .cache import VolumeCache
+
+logger = logging.getLogger(__name__)
+
+# 3Dmol's camera (see $3Dmol.GLViewer): vertical field of view and camera distance.
+CAMERA_FOV = 20.0
+CAMERA_Z = 150.0
+
+DEFAULT_IMAGE_SIZE = (800, 600)
+DEFAULT_SUPERSAMPLE = 2
+
+SURFACE_OPACITY = 0.85
+BACKGROUND = "#FFFFFF"
+
+# Same values as static/utility.js and displayMolecule() in viewer-group.js.
+ATOM_COLORS = {
+    "H": "#FFFFFF", "C": "#808080", "N": "#0000FF", "O": "#FF0000",
+    "F": "#FFFF00", "Cl": "#00FF00", "Br": "#A52A2A", "I": "#940094",
+    "Si": "#D9FFFF", "Ne": "#B3E3F5", "Ar": "#80D1E3", "Kr": "#48D1CC",
+    "Xe": "#4194B3", "S": "#F1E266", "B": "#FEB5B8",
+}
+COVALENT_RADII = {
+    "H": 0.31, "He": 0.28,
+    "Li": 1.28, "Be": 0.96, "B": 0.84, "C": 0.76, "N": 0.71, "O": 0.66, "F": 0.57, "Ne": 0.58,
+    "Na": 1.66, "Mg": 1.41, "Al": 1.21, "Si": 1.11, "P": 1.07, "S": 1.05, "Cl": 1.02, "Ar": 1.06,
+    "K": 2.03, "Ca": 1.76, "Sc": 1.70, "Ti": 1.60, "V": 1.53, "Cr": 1.39, "Mn": 1.39, "Fe": 1.32,
+    "Co": 1.26, "Ni": 1.24, "Cu": 1.32, "Zn": 1.22, "Ga": 1.22, "Ge": 1.20, "As": 1.19, "Se": 1.20,
+    "Br": 1.20, "Kr": 1.16,
+    "I": 1.39, "Xe": 1.40,
+}
+DEFAULT_ATOM_COLOR = "#808080"
+DEFAULT_COVALENT_RADIUS = 0.76
+ATOM_RADIUS_SCALE = 0.4
+BOND_TOLERANCE = 1.3
+BOND_RADIUS_SCALE = 0.25
+BOND_COLOR = "#D3D3D3"  # CSS lightgray
+
+# Directional light in camera space (3Dmol's default light position) and ambient term.
+_LIGHT = np.array([0.2, 0.2, 1.0]) / math.sqrt(1.08)
+_AMBIENT = 0.125
+
+# Candidate pixels expanded at once by the rasterizer (bounds the temporary arrays).
+_MAX_FRAGMENTS = 1 << 21
+
+# Triangles closer to the camera than this are dropped (no near-plane clipping).
+_NEAR = 1e-3
+
+Mesh = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]  # positions, normals, rgb, indices
+
+
+# -- colors ---------------------------------------------------------------
+
+def hex_to_rgb(color: str) -> np.ndarray:
+    """``#RRGGBB`` -> float RGB in [0, 1]."""
+
+    value = color.lstrip("#")
+    if len(value) != 6:
+        raise ValueError(f"无效的颜色: {color}")
+    return np.array([int(value[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.float64) / 255.0
+
+
+def complementary_color(color: str) -> str:
+    """The color ``getComplementaryColor()`` gives the negative lobe."""
+
+    r, g, b = (255 - int(round(c * 255)) for c in hex_to_rgb(color))
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def gradient_colors(values: np.ndarray, gradient: str, lo: float, hi: float, mid: float = 0.0) -> np.ndarray:
+    """Map values to float RGB like 3Dmol's gradients (``rwb``, ``bwr``, ``roygb``, ``sinebow``)."""
+
+    if lo > hi:
+        lo, hi = hi, lo
+    v = np.clip(np.asarray(values, dtype=np.float64), lo, hi)
+    rgb = np.ones((v.shape[0], 3))
+
+    def ramp(x: np.ndarray) -> np.ndarray:
+        # 3Dmol: floor(255 * sqrt(fraction))
+        return np.floor(255 * np.sqrt(np.clip(x, 0.0, 1.0))) / 255
+
+    def fraction(x: np.ndarray, start: float, stop: float) -> np.ndarray:
+        return (x - start) / (stop - start) if stop != start else np.ones_like(x)
+
+    if gradient in ("rwb", "bwr"):
+        # Red (low) - white (mid) - blue (high); bwr swaps the ends.
+        low = np.array([1.0, 0.0, 0.0]) if gradient == "rwb" else np.array([0.0, 0.0, 1.0])
+        high = low[::-1]
+        below, above = v < mid, v > mid
+        rgb[below] = low + (1 - low) * ramp(fraction(v[below], lo, mid))[:, None]
+        rgb[above] = high + (1 - high) * ramp(1 - fraction(v[above], mid, hi))[:, None]
+    elif gradient == "roygb":
+        # Red - yellow - green - cyan - blue in four quarters.
+        m = (lo + hi) / 2
+        q1, q3 = (lo + m) / 2, (m + hi) / 2
+        quarters = [
+            (v < q1, lambda x: (1, ramp(fraction(x, lo, q1)), 0)),
+            ((v >= q1) & (v < m), lambda x: (ramp(1 - fraction(x, q1, m)), 1, 0)),
+            ((v >= m) & (v < q3), lambda x: (0, 1, ramp(fraction(x, m, q3)))),
+            (v >= q3, lambda x: (0, ramp(1 - fraction(x, q3, hi)), 1)),
+        ]
+        for mask, channels in quarters:
+            x = v[mask]
+            rgb[mask] = np.stack([np.broadcast_to(np.asarray(c, dtype=np.float64), x.shape)
+                                  for c in channels(x)], axis=1)
+    elif gradient == "sinebow":
+        h = 5 * fraction(v, lo, hi) / 6.0 + 0.5
+        rgb = np.stack([np.sin(np.pi * (h + k / 3.0)) ** 2 for k in (0, 1, 2)], axis=1)
+    else:
+        raise ValueError(f"未知的渐变: {gradient}")
+    return rgb
+
+
+# -- geometry -------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _unit_sphere(subdivisions: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """Icosphere (vertices on the unit sphere, triangles)."""
+
+    t = (1 + math.sqrt(5)) / 2
+    verts = [(-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0), (0, -1, t), (0, 1, t),
+             (0, -1, -t), (0, 1, -t), (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)]
+    faces = [(0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11), (1, 5, 9), (5, 11, 4),
+             (11, 10, 2), (10, 7, 6), (7, 1, 8), (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8),
+             (3, 8, 9), (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1)]
+    points = [np.array(v, dtype=np.float64) / np.linalg.norm(v) for v in verts]
+    for _ in range(subdivisions):
+        midpoints: Dict[Tuple[int, int], int] = {}
+
+        def midpoint(a: int, b: int) -> int:
+            key = (min(a, b), max(a, b))
+            if key not in midpoints:
+                p = points[a] + points[b]
+                points.append(p / np.linalg.norm(p))
+                midpoints[key] = len(points) - 1
+            return midpoints[key]
+
+        refined = []
+        for a, b, c in faces:
+            ab, bc, ca = midpoint(a, b), midpoint(b, c), midpoint(c, a)
+            refined += [(a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca)]
+        faces = refined
+    return np.array(points), np.array(faces, dtype=np.int64)
+
+
+@lru_cache(maxsize=None)
+def _unit_cylinder(segments: int = 12) -> Tuple[np.ndarray, np.ndarray]:
+    """Open cylinder of radius 1 along z from 0 to 1 (vertices, triangles)."""
+
+    angle = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    ring = np.stack([np.cos(angle), np.sin(angle), np.zeros(segments)], axis=1)
+    verts = np.concatenate([ring, ring + [0, 0, 1]])
+    i = np.arange(segments)
+    j = (i + 1) % segments
+    faces = np.concatenate([np.stack([i, j, i + segments], 1), np.stack([j, j + segments, i + segments], 1)])
+    return verts, faces
+
+
+def find_bonds(positions: np.ndarray, radii: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Atom pairs closer than ``BOND_TOLERANCE x (r1 + r2)`` (same rule as the viewer)."""
+
+    n = positions.shape[0]
+    first: List[np.ndarray] = []
+    second: List[np.ndarray] = []
+    block = 512
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        d = np.linalg.norm(positions[start:stop, None, :] - positions[None, :, :], axis=2)
+        limit = (radii[start:stop, None] + radii[None, :]) * BOND_TOLERANCE
+        i, j = np.nonzero((d < limit) & (np.arange(start, stop)[:, None] < np.arange(n)[None, :]))
+        first.append(i + start)
+        second.append(j)
+    if not first:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def _merge_meshes(meshes: Sequence[Mesh]) -> Mesh:
+    meshes = [m for m in meshes if m[3].size]
+    if not meshes:
+        empty = np.zeros((0, 3))
+        return empty, empty, empty, np.zeros((0, 3), dtype=np.int64)
+    offsets = np.cumsum([0] + [m[0].shape[0] for m in meshes[:-1]])
+    return (
+        np.concatenate([m[0] for m in meshes]),
+        np.concatenate([m[1] for m in meshes]),
+        np.concatenate([m[2] for m in meshes]),
+        np.concatenate([m[3].astype(np.int64) + off for m, off in zip(meshes, offsets)]),
+    )
+
+
+def molecule_mesh(numbers: Sequence[int], positions: np.ndarray) -> Tuple[Mesh, np.ndarray]:
+    """Spheres and bonds of a molecule (positions in Angstrom).
+
+    Returns the mesh and the points 3Dmol's ``zoomTo()`` fits (shape bounding spheres).
+    """
+
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    symbols = [element_symbol(int(z)) for z in numbers]
+    covalent = np.array([COVALENT_RADII.get(s, DEFAULT_COVALENT_RADIUS) for s in symbols])
+    colors = np.array([hex_to_rgb(ATOM_COLORS.get(s, DEFAULT_ATOM_COLOR)) for s in symbols]).reshape(-1, 3)
+    radii = covalent * ATOM_RADIUS_SCALE
+
+    sphere_v, sphere_f = _unit_sphere()
+    nv = sphere_v.shape[0]
+    atoms: Mesh = (
+        (positions[:, None, :] + radii[:, None, None] * sphere_v[None]).reshape(-1, 3),
+        np.tile(sphere_v, (positions.shape[0], 1)),
+        np.repeat(colors, nv, axis=0),
+        (sphere_f[None] + (np.arange(positions.shape[0]) * nv)[:, None, None]).reshape(-1, 3),
+    )
+    fit = [positions[:, None, :] + radii[:, None, None] * np.concatenate([np.eye(3), -np.eye(3)])[None]]
+
+    i, j = find_bonds(positions, covalent)
+    bonds: Mesh = _merge_meshes([])
+    if i.size:
+        start, end = positions[i], positions[j]
+        axis = end - start
+        length = np.linalg.norm(axis, axis=1)
+        keep = length > 0
+        start, axis, length = start[keep], axis[keep], length[keep]
+        radius = np.minimum(covalent[i], covalent[j])[keep] * BOND_RADIUS_SCALE
+        w = axis / length[:, None]
+        # Orthonormal frame (u, v, w) per bond.
+        helper = np.where(np.abs(w[:, 0:1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+        u = np.cross(w, helper)
+        u /= np.linalg.norm(u, axis=1, keepdims=True)
+        v = np.cross(w, u)
+        cyl_v, cyl_f = _unit_cylinder()
+        nc = cyl_v.shape[0]
+        normals = cyl_v[None, :, 0:1] * u[:, None] + cyl_v[None, :, 1:2] * v[:, None]
+        verts = start[:, None] + radius[:, None, None] * normals + cyl_v[None, :, 2:3] * axis[:, None]
+        bonds = (
+            verts.reshape(-1, 3),
+            normals.reshape(-1, 3),
+            np.tile(hex_to_rgb(BOND_COLOR), (verts.shape[0] * nc, 1)),
+            (cyl_f[None] + (np.arange(verts.shape[0]) * nc)[:, None, None]).reshape(-1, 3),
+        )
+        mid = start + axis / 2
+        half = (length / 2)[:, None, None]
+        fit.append(mid[:, None, :] + half * np.concatenate([np.eye(3), -np.eye(3)])[None])
+
+    return _merge_meshes([atoms, bonds]), np.concatenate(fit).reshape(-1, 3)
+
+
+# -- camera ---------------------------------------------------------------
+
+def fit_view(points: np.ndarray) -> List[float]:
+    """The 3Dmol view (``getView()`` array) ``zoomTo()`` sets for ``points``."""
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if not points.size:
+        return [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+    center = points.mean(axis=0)
+    max_d = max(2 * float(np.sqrt(((points - center) ** 2).sum(axis=1).max())), 5.0)
+    z = -(max_d * 0.5 / math.tan(math.radians(CAMERA_FOV / 2)) - CAMERA_Z)
+    return [*(-center).tolist(), z, 0.0, 0.0, 0.0, 1.0]
+
+
+def project(points: np.ndarray, view: Sequence[float], width: int, height: int) -> np.ndarray:
+    """World points (Angstrom) -> ``(x_pixel, y_pixel, depth)`` for a 3Dmol view."""
+
+    rot = np.asarray(quaternion_to_rotation_matrix(*view[4:8]))
+    cam = (np.asarray(points, dtype=np.float64) + np.asarray(view[:3], dtype=np.float64)) @ rot.T
+    depth = CAMERA_Z - (cam[:, 2] + view[3])
+    focal = 1.0 / math.tan(math.radians(CAMERA_FOV / 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ndc_x = cam[:, 0] * focal / (depth * width / height)
+        ndc_y = cam[:, 1] * focal / depth
+    return np.stack([(ndc_x + 1) * width / 2, (1 - ndc_y) * height / 2, depth], axis=1)
+
+
+def shade(normals: np.ndarray, colors: np.ndarray, view: Sequence[float]) -> np.ndarray:
+    """Per-vertex Lambert lighting (two-sided) with the camera-fixed light."""
+
+    rot = np.asarray(quaternion_to_rotation_matrix(*view[4:8]))
+    lambert = np.abs((np.asarray(normals, dtype=np.float64) @ rot.T) @ _LIGHT)
+    return np.clip(colors * (_AMBIENT + lambert)[:, None], 0.0, 1.0)
+
+
+# -- rasterizer -----------------------------------------------------------
+
+class Rasterizer:
+    """Depth-buffered triangle rasterizer with an opaque and a transparent layer."""
+
+    LAYERS = ("opaque", "surface")
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = int(width)
+        self.height = int(height)
+        n = self.width * self.height
+        self.depth = {layer: np.full(n, np.inf) for layer in self.LAYERS}
+        self.color = {layer: np.zeros((n, 3)) for layer in self.LAYERS}
+
+    def draw(self, screen: np.ndarray, colors: np.ndarray, indices: np.ndarray, layer: str = "opaque") -> None:
+        """Rasterize triangles ``indices`` of projected vertices ``screen`` (x, y, depth)."""
+
+        if not indices.size:
+            return
+        tri = screen[indices]  # (T, 3, 3)
+        cols = colors[indices]
+        lo = np.ceil(tri[:, :, :2].min(axis=1) - 0.5)
+        hi = np.floor(tri[:, :, :2].max(axis=1) - 0.5)
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, [self.width - 1, self.height - 1])
+        a, b, c = tri[:, 0], tri[:, 1], tri[:, 2]
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        keep = (
+            np.all(tri[:, :, 2] > _NEAR, axis=1) & np.all(np.isfinite(tri), axis=(1, 2))
+            & np.all(hi >= lo, axis=1) & (area != 0)
+        )
+        if not keep.any():
+            return
+        tri, cols, lo, hi, area = tri[keep], cols[keep], lo[keep].astype(np.int64), hi[keep].astype(np.int64), area[keep]
+
+        # Group triangles by the power of two covering their pixel bounding box.
+        extent = (hi - lo).max(axis=1) + 1
+        size = 1 << np.ceil(np.log2(extent)).astype(np.int64)
+        for s in np.unique(size):
+            sel = np.nonzero(size == s)[0]
+            chunk = max(1, _MAX_FRAGMENTS // int(s * s))
+            for start in range(0, sel.size, chunk):
+                part = sel[start:start + chunk]
+                self._fill(tri[part], cols[part], lo[part], hi[part], area[part], int(s), layer)
+
+    def _fill(self, tri: np.ndarray, cols: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+              area: np.ndarray, s: int, layer: str) -> None:
+        offset = np.arange(s)
+        px = lo[:, 0, None, None] + offset[None, None, :]  # (T, 1, s)
+        py = lo[:, 1, None, None] + offset[None, :, None]  # (T, s, 1)
+        cx, cy = px + 0.5, py + 0.5
+
+        def edge(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+            return ((v[:, 0, None, None] - u[:, 0, None, None]) * (cy - u[:, 1, None, None])
+                    - (v[:, 1, None, None] - u[:, 1, None, None]) * (cx - u[:, 0, None, None])) / area[:, None, None]
+
+        a, b, c = tri[:, 0], tri[:, 1], tri[:, 2]
+        wa, wb, wc = edge(b, c), edge(c, a), edge(a, b)
+        inside = (wa >= 0) & (wb >= 0) & (wc >= 0) & (px <= hi[:, 0, None, None]) & (py <= hi[:, 1, None, None])
+        t, y, x = np.nonzero(inside)
+        if not t.size:
+            return
+        wa, wb, wc = wa[t, y, x], wb[t, y, x], wc[t, y, x]
+        depth = wa * tri[t, 0, 2] + wb * tri[t, 1, 2] + wc * tri[t, 2, 2]
+        pix = (lo[t, 1] + y) * self.width + lo[t, 0] + x
+
+        # Nearest fragment per pixel within this batch, then against the depth buffer.
+        order = np.lexsort((depth, pix))
+        pix, depth = pix[order], depth[order]
+        first = np.ones(pix.size, dtype=bool)
+        first[1:] = pix[1:] != pix[:-1]
+        order, pix, depth = order[first], pix[first], depth[first]
+        closer = depth < self.depth[layer][pix]
+        order, pix = order[closer], pix[closer]
+        self.depth[layer][pix] = depth[closer]
+        t = t[order]
+        self.color[layer][pix] = (wa[order, None] * cols[t, 0] + wb[order, None] * cols[t, 1]
+                                  + wc[order, None] * cols[t, 2])
+
+    def resolve(self, background: np.ndarray, opacity: float = SURFACE_OPACITY) -> np.ndarray:
+        """Composite the layers; float RGB image of shape (height, width, 3)."""
+
+        image = np.tile(np.asarray(background, dtype=np.float64), (self.width * self.height, 1))
+        opaque = np.isfinite(self.depth["opaque"])
+        image[opaque] = self.color["opaque"][opaque]
+        front = self.depth["surface"] < self.depth["opaque"]
+        image[front] = opacity * self.color["surface"][front] + (1 - opacity) * image[front]
+        return image.reshape(self.height, self.width, 3)
+
+
+def write_png(path: Path, image: np.ndarray) -> None:
+    """Write an 8-bit RGB image (height, width, 3) as PNG."""
+
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    # Filter type 0 (none) in front of every row.
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)], axis=1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    Path(path).write_bytes(
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+# -- viewer groups --------------------------------------------------------
+
+def _float(value: Any, default: float) -> float:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return default
+    return result if math.isfinite(result) else default
+
+
+def _surface(path: Path, iso: float, cache: Optional["VolumeCache"]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Cropping at CROP_FRACTION x |iso| does not change the surface (see load_mesh).
+    _, buffers = load_mesh(path, iso, cache, crop=CROP_FRACTION * abs(iso))
+    return (buffers["positions"].astype(np.float64), buffers["normals"].astype(np.float64),
+            buffers["indices"].astype(np.int64))
+
+
+def viewer_scene(viewer: Dict[str, Any], root: Path, defaults: Dict[str, Any],
+                 cache: Optional["VolumeCache"] = None) -> Tuple[Mesh, Mesh, np.ndarray]:
+    """Opaque mesh, surface mesh and zoomTo points of one viewer group of a config."""
+
+    files = [safe_join(root, name) for name in (viewer["fileName1"], viewer.get("fileName2")) if name]
+    if any(path is None for path in files):
+        raise ValueError(f"文件不在配置目录中: {viewer['fileName1']} {viewer.get('fileName2') or ''}")
+    file1, file2 = files[0], (files[1] if len(files) > 1 else None)
+    iso = _float(viewer.get("isoValue"), _float(defaults.get("isoValue"), 0.002))
+    color1 = viewer.get("color1") or defaults.get("color1", "#0000FF")
+    color2 = viewer.get("color2") or defaults.get("color2", "#FF0000")
+
+    meta, _ = load_volume(file1, cache, crop=CROP_FRACTION * abs(iso))
+    numbers = [a["number"] for a in meta["atoms"]]
+    positions = np.array([a["position"] for a in meta["atoms"]], dtype=np.float64).reshape(-1, 3) * BOHR_TO_ANGSTROM
+    molecule, fit_points = molecule_mesh(numbers, positions)
+
+    surfaces: List[Mesh] = []
+    if viewer.get("isColorMappingEnabled") and file2 is not None:
+        pos, nrm, idx = _surface(file1, iso, cache)
+        meta2, grid2 = load_volume(file2, cache)
+        values = sample_grid(grid2, meta2, pos / BOHR_TO_ANGSTROM)
+        colors = gradient_colors(values, viewer.get("gradientType") or "rwb",
+                                 _float(viewer.get("minMapValue"), -0.02), _float(viewer.get("maxMapValue"), 0.03))
+        surfaces.append((pos, nrm, colors, idx))
+    else:
+        for path, color in ((file1, color1), (file2, color2)):
+            if path is None:
+                continue
+            for value, rgb in ((iso, color), (-iso, complementary_color(color))):
+                pos, nrm, idx = _surface(path, value, cache)
+                surfaces.append((pos, nrm, np.tile(hex_to_rgb(rgb), (pos.shape[0], 1)), idx))
+
+    return molecule, _merge_meshes(surfaces), fit_points
+
+
+def render_viewer(viewer: Dict[str, Any], root: Path, *, size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
+                  supersample: int = DEFAULT_SUPERSAMPLE, defaults: Optional[Dict[str, Any]] = None,
+                  cache: Optional["VolumeCache"] = None) -> np.ndarray:
+    """Render one viewer group of a config; uint8 RGB image (height, width, 3)."""
+
+    width, height = size
+    ss = max(1, int(supersample))
+    molecule, surfaces, fit_points = viewer_scene(viewer, Path(root), defaults or {}, cache)
+
+    view = viewer.get("view")
+    if not (isinstance(view, (list, tuple)) and len(view) == 8):
+        view = fit_view(fit_points)
+
+    raster = Rasterizer(width * ss, height * ss)
+    for mesh, layer in ((molecule, "opaque"), (surfaces, "surface")):
+        positions, normals, colors, indices = mesh
+        if indices.size:
+            screen = project(positions, view, raster.width, raster.height)
+            raster.draw(screen, shade(normals, colors, view), indices, layer)
+
+    image = raster.resolve(hex_to_rgb(BACKGROUND))
+    if ss > 1:
+        image = image.reshape(height, ss, width, ss, 3).mean(axis=(1, 3))
+    return np.round(image * 255).astype(np.uint8)
+
+
+def output_name(index: int, viewer: Dict[str, Any]) -> str:
+    title = re.sub(r"[^\w.-]+", "_", str(viewer.get("title") or "")).strip("._")
+    return f"{index + 1:03d}_{title or 'group'}.png"
+
+
+def _render_job(viewer: Dict[str, Any], root: str, output: str, size: Tuple[int, int], supersample: int,
+                defaults: Dict[str, Any], cache_dir: Optional[str], cache_max_bytes: Optional[int],
+                use_cache: bool) -> float:
+    """Process pool entry point: render one group to ``output``; returns the seconds spent."""
+
+    started = time.perf_counter()
+    cache = None
+    if use_cache:
+        from .cache import VolumeCache
+
+        cache = VolumeCache(Path(cache_dir) if cache_dir else None, cache_max_bytes)
+    image = render_viewer(viewer, Path(root), size=size, supersample=supersample, defaults=defaults, cache=cache)
+    write_png(Path(output), image)
+    return time.perf_counter() - started
+
+
+def render_config(config_path: str | Path, output_dir: Optional[str | Path] = None, *,
+                  workers: Optional[int] = None, size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
+                  supersample: int = DEFAULT_SUPERSAMPLE, use_cache: bool = True,
+                  cache_dir: Optional[str] = None, cache_max_bytes: Optional[int] = None) -> Tuple[List[Path], int]:
+    """Render every group of a config to ``output_dir`` (default ``<config>-renders``).
+
+    Groups are rendered in a process pool of ``workers`` processes (default: CPU
+    count; 1 renders in this process). Returns ``(written files, failed groups)``.
+    """
+
+    config_path = Path(config_path).expanduser().resolve()
+    config = json.loads(config_path.read_text(encoding="utf-8"))
+    root = config_path.parent
+    out = Path(output_dir).expanduser() if output_dir else root / f"{config_path.stem}-renders"
+    out.mkdir(parents=True, exist_ok=True)
+    defaults = load_default_settings(default_settings_search_paths(root))
+
+    viewers = [v for v in config.get("viewers", []) if isinstance(v, dict) and v.get("fileName1")]
+    jobs = [
+        (viewer, str(root), str(out / output_name(i, viewer)), tuple(size), supersample, defaults,
+         cache_dir, cache_max_bytes, use_cache)
+        for i, viewer in enumerate(viewers)
+    ]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    logger.info("正在渲染 %d 个查看器组（%dx%d，%d 个进程）→ %s", len(jobs), size[0], size[1], workers, out)
+
+    written: List[Path] = []
+    failed = 0
+    started = time.perf_counter()
+
+    def done(job: Tuple[Any, ...], seconds: Optional[float], error: Optional[BaseException]) -> None:
+        nonlocal failed
+        name = Path(job[2]).name
+        if error is not None:
+            failed += 1
+            logger.error("渲染失败 %s (%s): %s", name, job[0].get("fileName1"), error)
+            return
+        written.append(Path(job[2]))
+        logger.info("[%d/%d] %s（%.1f 秒）", len(written) + failed, len(jobs), name, seconds)
+
+    if workers == 1:
+        for job in jobs:
+            try:
+                done(job, _render_job(*job), None)
+            except Exception as e:
+                done(job, None, e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_render_job, *job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    done(futures[future], future.result(), None)
+                except Exception as e:
+                    done(futures[future], None, e)
+
+    logger.info("渲染完成：%d 张图片，%d 个失败，用时 %.1f 秒", len(written), failed, time.perf_counter() - started)
+    return sorted(written), failed
@@ -1,29 +1,56 @@
 from __future__ import annotations
 
+import contextlib
+import gzip
 import json
 import logging
+import math
 import mimetypes
 import os
+import queue
+import re
 import subprocess
+import threading
+import time
 import urllib.parse
 import webbrowser
+import zlib
+from collections import OrderedDict
 from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler
 from pathlib import Path
 from socketserver import ThreadingMixIn
-from typing import Any, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, List, Optional, Tuple
 
 import socket
 import socketserver
 
+from .assets import IMMUTABLE_CACHE_CONTROL, Asset, StaticAssets
+from .compress import GZIP_LEVEL, MIN_COMPRESS_SIZE, GzipCache, accepts_gzip, is_compressible, iter_gzip
+from .config_gen import SUPPORTED_CUBE_EXTS
 from .convert import convert_3dmol_view_to_vmd
+from .engine import DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS, PooledHTTPServer
+from .metrics import PROMETHEUS_CONTENT_TYPE, CountingWriter, ServerMetrics, route_for
+from .profiling import Profiler
 from .resources import default_settings_search_paths, resolve_resource, static_dir
 from .settings import load_default_settings
-from .utils import find_available_port, get_local_ip, is_wsl, safe_join
+from .utils import find_available_port, get_local_ip, is_wsl, safe_join, split_cache_budget
+from .watch import DEFAULT_WATCH_INTERVAL, ConfigWatcher
+
+if TYPE_CHECKING:
+    from .cache import VolumeCache
+    from .catalog import CubeCatalog
 
 logger = logging.getLogger(__name__)
 
+# Buffer size of the buffered (non-sendfile) copy path.
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Comment line sent on idle /api/events streams so proxies and browsers keep them open.
+EVENT_KEEPALIVE_SECONDS = 15
+
 
 @dataclass(frozen=True)
 class ServerContext:
@@ -45,14 +72,53 @@ class ServerContext:
     # Optional config filename (for display / query compatibility).
     config_name: Optional[str] = None
 
+    # On-disk cache for data derived from cube files (None disables caching).
+    cache: Optional["VolumeCache"] = None
+
+    # gzip responses for clients sending Accept-Encoding: gzip.
+    compression: bool = True
+
+    # Sidecar cache of gzip-compressed user files (None: compress on every request).
+    gzip_cache: Optional[GzipCache] = None
+
+    # Send files with os.sendfile() instead of copying them through Python.
+    use_sendfile: bool = True
+
+    # Header-only listing of the cubes under serve_dir for /api/index (None without numpy).
+    catalog: Optional["CubeCatalog"] = None
+
+    # Grids served by /api/volume and /api/mesh are cropped to |value| > crop_threshold
+    # (None disables cropping, see orbviewer.volume.crop_bounds).
+    crop_threshold: Optional[float] = None
+
+    # --watch: keeps the served config in sync with serve_dir and feeds /api/events.
+    watcher: Optional[ConfigWatcher] = None
+
+    # Per-route request counters and latency histograms for /metrics (None disables both).
+    metrics: Optional[ServerMetrics] = None
+
+    # --profile: cProfile/stack samples of every request (see orbviewer.profiling).
+    profiler: Optional[Profiler] = None
+
+    # File html_template was read from; the template is re-read when it changes.
+    template_path: Optional[Path] = None
+
+    # Content-hashed URLs of the template's static assets (None: plain /static/ URLs).
+    assets: Optional[StaticAssets] = None
+
 
 class ThreadedHTTPServer(ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
     daemon_threads = True
 
 
+# Selectable with --engine: "threaded" (thread per request, HTTP/1.0) or "pool"
+# (fixed worker pool with HTTP/1.1 keep-alive, see orbviewer.engine).
+SERVER_ENGINES = ("threaded", "pool")
+
+
 def _render_index_html(template: str, default_settings: Dict[str, Any], config_data: Optional[Dict[str, Any]] = None,
-                       config_path: Optional[str] = None) -> bytes:
+                       config_path: Optional[str] = None, watch_version: Optional[str] = None) -> bytes:
     """Inject window.ORBITAL_VIEWER_CONFIG into the HTML template."""
 
     payload: Dict[str, Any] = {
@@ -62,13 +128,16 @@ def _render_index_html(template: str, default_settings: Dict[str, Any], config_d
         payload["configData"] = config_data
     if config_path is not None:
         payload["configPath"] = config_path
+    if watch_version is not None:
+        # The page subscribes to /api/events from this event id (config version) on.
+        payload["watchVersion"] = watch_version
 
     init_script = "<script>\n" + "window.ORBITAL_VIEWER_CONFIG = " + json.dumps(payload) + ";\n" + "</script>\n"
 
     # Insert before </head> if possible
-    lower = template.lower()
-    idx = lower.find("</head>")
-    if idx != -1:
+    match = _HEAD_END.search(template)
+    if match is not None:
+        idx = match.start()
         rendered = template[:idx] + init_script + template[idx:]
     else:
         rendered = init_script + template
@@ -76,6 +145,124 @@ def _render_index_html(template: str, default_settings: Dict[str, Any], config_d
     return rendered.encode("utf-8")
 
 
+_HEAD_END = re.compile("</head>", re.IGNORECASE)
+
+# Rendered index pages (and parsed ?config= files) kept by IndexPageCache.
+INDEX_CACHE_ENTRIES = 16
+
+# (st_mtime_ns, st_size) of a file
+FileStamp = Tuple[int, int]
+
+
+def _file_stamp(path: Path) -> FileStamp:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass(frozen=True)
+class IndexPage:
+    body: bytes
+    etag: str
+    # gzip-compressed body (None when compression is off or the page is too small)
+    gzipped: Optional[bytes] = None
+
+
+class IndexPageCache:
+    """Rendered index pages and parsed config files, revalidated by mtime and size.
+
+    Rendering a page with a config of thousands of viewer groups (serializing it
+    into the page and gzip-compressing the result) is done once per version of
+    the template and the config; later requests cost one ``stat`` per file. Pages
+    are keyed by the caller's key (config file stamp, watch version, ...) plus the
+    template stamp, so editing either file invalidates them. At most
+    :data:`INDEX_CACHE_ENTRIES` pages and configs are kept (least recently used).
+    """
+
+    def __init__(self, template: str, template_path: Optional[Path] = None, *, compression: bool = True,
+                 max_entries: int = INDEX_CACHE_ENTRIES) -> None:
+        self.template_path = template_path
+        self.compression = compression
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._template = template
+        self._template_stamp: Optional[FileStamp] = None
+        if template_path is not None:
+            try:
+                self._template_stamp = _file_stamp(template_path)
+            except OSError:
+                self.template_path = None
+        self._configs: "OrderedDict[Path, Tuple[FileStamp, Dict[str, Any]]]" = OrderedDict()
+        self._pages: "OrderedDict[Tuple[Any, ...], IndexPage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def template(self) -> Tuple[str, Optional[FileStamp]]:
+        """Current template text and stamp (re-read when the file changed)."""
+
+        if self.template_path is None:
+            return self._template, None
+        try:
+            stamp = _file_stamp(self.template_path)
+        except OSError:
+            return self._template, self._template_stamp
+        if stamp != self._template_stamp:
+            try:
+                text = self.template_path.read_text(encoding="utf-8")
+            except OSError:
+                return self._template, self._template_stamp
+            with self._lock:
+                self._template, self._template_stamp = text, stamp
+                self._pages.clear()
+            logger.info("HTML 模板已修改，重新加载: %s", self.template_path)
+        return self._template, stamp
+
+    def config(self, path: Path) -> Tuple[Dict[str, Any], FileStamp]:
+        """Parsed JSON of ``path`` and its stamp; raises OSError/ValueError like reading it."""
+
+        stamp = _file_stamp(path)
+        with self._lock:
+            cached = self._configs.get(path)
+            if cached is not None and cached[0] == stamp:
+                self._configs.move_to_end(path)
+                return cached[1], stamp
+        data = _read_json_file(path)
+        with self._lock:
+            self._configs[path] = (stamp, data)
+            self._configs.move_to_end(path)
+            while len(self._configs) > self.max_entries:
+                self._configs.popitem(last=False)
+        return data, stamp
+
+    def cached_config(self, path: Path) -> Optional[Tuple[Dict[str, Any], FileStamp]]:
+        """Last successfully parsed version of ``path`` (e.g. while the file is being rewritten)."""
+
+        with self._lock:
+            cached = self._configs.get(path)
+        return None if cached is None else (cached[1], cached[0])
+
+    def page(self, key: Tuple[Any, ...], render: Callable[[str], bytes]) -> IndexPage:
+        """Cached page for ``key``; ``render(template)`` builds the body on a miss."""
+
+        template, stamp = self.template()
+        key = (stamp,) + key
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+
+        body = render(template)
+        gzipped = gzip.compress(body, GZIP_LEVEL) if self.compression and len(body) >= MIN_COMPRESS_SIZE else None
+        page = IndexPage(body, f'"{zlib.crc32(body):08x}-{len(body):x}"', gzipped)
+        with self._lock:
+            self.misses += 1
+            self._pages[key] = page
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+
 def _guess_mime(path: Path) -> str:
     # Ensure common web types even if the platform mimetypes is incomplete.
     ext = path.suffix.lower()
@@ -93,13 +280,167 @@ def _guess_mime(path: Path) -> str:
     return mime or "application/octet-stream"
 
 
+def _file_etag(st: os.stat_result, variant: str = "") -> str:
+    """Strong validator from mtime and size (plus a representation variant)."""
+
+    tag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    if variant:
+        tag += f"-{variant}"
+    return f'"{tag}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list."""
+
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None for headers we do not handle (other units, multiple ranges,
+    malformed values), in which case the whole file is sent. Raises ValueError when
+    the range cannot be satisfied.
+    """
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if not sep or not (first or last) or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+
+    if first == "":
+        # Suffix range: the last N bytes.
+        n = int(last)
+        if n == 0 or size == 0:
+            raise ValueError("unsatisfiable range")
+        return max(size - n, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("unsatisfiable range")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
 def _read_json_file(path: Path) -> Dict[str, Any]:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+class ApiError(Exception):
+    """Client error raised by API handlers (mapped to an HTTP error response)."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _query_float(query: Dict[str, list], name: str, default: Optional[float] = None) -> float:
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Missing parameter: {name}")
+        return default
+    try:
+        value = float(values[0])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid parameter: {name}") from None
+    if not math.isfinite(value):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid parameter: {name}")
+    return value
+
+
+CubeApiHandler = Callable[[Path, Dict[str, list], ServerContext], Tuple[bytes, str]]
+
+
+def _query_level(query: Dict[str, list]) -> int:
+    from .volume import LOD_MAX_LEVEL
+
+    level = _query_float(query, "level", 0.0)
+    if level != int(level) or not 0 <= level <= LOD_MAX_LEVEL:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"level must be an integer between 0 and {LOD_MAX_LEVEL}")
+    return int(level)
+
+
+def _volume_api(path: Path, query: Dict[str, list], context: ServerContext) -> Tuple[bytes, str]:
+    """/api/volume/<file>[?level=<n>][&encoding=f32|u16|u8|log16|log8][&crop=<threshold>]: grid.
+
+    ``crop`` overrides the server's crop threshold; ``crop=0`` returns the full box.
+    See orbviewer.volume.
+    """
+
+    from .volume import VOLUME_CONTENT_TYPE, VOLUME_ENCODINGS, encode_grid, load_volume
+
+    encoding = (query.get("encoding") or ["f32"])[0]
+    if encoding not in VOLUME_ENCODINGS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"encoding must be one of {', '.join(VOLUME_ENCODINGS)}")
+    crop = _query_float(query, "crop", context.crop_threshold or 0.0)
+    if crop < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "crop must not be negative")
+
+    meta, grid = load_volume(path, context.cache, _query_level(query), crop or None)
+    return encode_grid(meta, grid, encoding), VOLUME_CONTENT_TYPE
+
+
+def _mesh_api(path: Path, query: Dict[str, list], context: ServerContext) -> Tuple[bytes, str]:
+    """/api/mesh/<file>?iso=<value>[&level=<n>]: isosurface triangles (see orbviewer.mesh)."""
+
+    from .mesh import encode_mesh, load_mesh
+    from .volume import VOLUME_CONTENT_TYPE
+
+    iso = _query_float(query, "iso")
+    if iso == 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "iso must be non-zero")
+    mesh = load_mesh(path, iso, context.cache, _query_level(query), context.crop_threshold)
+    return encode_mesh(*mesh), VOLUME_CONTENT_TYPE
+
+
+def _combine_api(paths: List[Path], query: Dict[str, list], context: ServerContext) -> Tuple[bytes, str]:
+    """/api/combine?op=add|sub|mul|abs&file=<a>[&file=<b>]: derived grid (see orbviewer.algebra).
+
+    Accepts the ``level``/``encoding``/``crop`` parameters of /api/volume.
+    """
+
+    from .algebra import load_combined
+    from .volume import VOLUME_CONTENT_TYPE, VOLUME_ENCODINGS, encode_grid
+
+    encoding = (query.get("encoding") or ["f32"])[0]
+    if encoding not in VOLUME_ENCODINGS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"encoding must be one of {', '.join(VOLUME_ENCODINGS)}")
+    crop = _query_float(query, "crop", context.crop_threshold or 0.0)
+    if crop < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "crop must not be negative")
+
+    meta, grid = load_combined(query["op"][0], paths, context.cache, _query_level(query), crop or None,
+                               names=query["file"])
+    return encode_grid(meta, grid, encoding), VOLUME_CONTENT_TYPE
+
+
+_CUBE_APIS: Dict[str, CubeApiHandler] = {
+    "/api/volume/": _volume_api,
+    "/api/mesh/": _mesh_api,
+}
+
+
 def make_handler(context: ServerContext):
     """Factory to create a request handler bound to a given ServerContext."""
 
+    pages = IndexPageCache(context.html_template, context.template_path, compression=context.compression)
+
     class OrbitalViewerHandler(BaseHTTPRequestHandler):
         server_version = "OrbitalViewerHTTP/1.0"
 
@@ -107,11 +448,92 @@ def make_handler(context: ServerContext):
             # Delegate to logging
             logger.info("%s - %s", self.address_string(), format % args)
 
-        def _send_bytes(self, data: bytes, content_type: str, status: int = 200, *, cache_control: str = "no-store") -> None:
+        # -- request metrics (see orbviewer.metrics) ------------------------
+
+        def setup(self) -> None:
+            super().setup()
+            if context.metrics is not None:
+                self.wfile = CountingWriter(self.wfile)
+
+        def parse_request(self) -> bool:
+            # Called once the request line has arrived: the request is timed from here.
+            if context.metrics is not None:
+                self._started = time.perf_counter()
+                self._status = 0
+                self.wfile.reset()
+                context.metrics.request_started()
+            ok = super().parse_request()
+            if ok and context.profiler is not None:
+                self._profile = context.profiler.start_request(f"{self.command} {self.path}")
+            return ok
+
+        def log_request(self, code: Any = "-", size: Any = "-") -> None:
+            self._status = int(code) if isinstance(code, int) else 0
+            super().log_request(code, size)
+
+        def handle_one_request(self) -> None:
+            self._started: Optional[float] = None
+            self._profile = None
+            try:
+                super().handle_one_request()
+            finally:
+                if self._profile is not None:
+                    context.profiler.finish_request(self._profile, getattr(self, "_status", 0))
+                if context.metrics is not None and self._started is not None:
+                    first = self.wfile.first_write
+                    context.metrics.request_finished(
+                        route_for(urllib.parse.urlsplit(getattr(self, "path", "")).path),
+                        self._status or HTTPStatus.INTERNAL_SERVER_ERROR,
+                        time.perf_counter() - self._started,
+                        None if first is None else first - self._started,
+                        self.wfile.count,
+                    )
+
+        def _metrics_gauges(self) -> Dict[str, Any]:
+            server_stats = getattr(self.server, "stats", None)
+            engine = server_stats() if callable(server_stats) else {}
+            caches: Dict[str, Dict[str, int]] = {}
+            if context.cache is not None:
+                caches["volume"] = {"hits": context.cache.hits, "misses": context.cache.misses}
+            if context.gzip_cache is not None:
+                caches["gzip"] = {"hits": context.gzip_cache.hits, "misses": context.gzip_cache.misses}
+            caches["index"] = {"hits": pages.hits, "misses": pages.misses}
+            # Without keep-alive (threaded engine) every connection carries one request.
+            active = engine.pop("active_connections", context.metrics.in_flight if context.metrics else 0)
+            return {"active_connections": active, "caches": caches, "engine": engine}
+
+        def _send_metrics(self, query: Dict[str, list]) -> None:
+            # /metrics: Prometheus text format, ?format=json for a JSON summary
+            if context.metrics is None:
+                self.send_error(HTTPStatus.NOT_FOUND, "Metrics are disabled")
+                return
+            if (query.get("format") or [""])[0] == "json":
+                self._send_json(context.metrics.summary(self._metrics_gauges()))
+                return
+            text = context.metrics.prometheus(self._metrics_gauges())
+            self._send_bytes(text.encode("utf-8"), PROMETHEUS_CONTENT_TYPE, cache_control="no-store")
+
+        def _wants_gzip(self) -> bool:
+            return context.compression and accepts_gzip(self.headers.get("Accept-Encoding"))
+
+        def _send_bytes(self, data: bytes, content_type: str, status: int = 200, *, cache_control: str = "no-store",
+                        etag: Optional[str] = None, gzipped: Optional[bytes] = None) -> None:
+            # gzipped: precompressed ``data``, used instead of compressing it again
+            compressible = content_type.startswith(("text/", "application/json"))
+            encoded = compressible and len(data) >= MIN_COMPRESS_SIZE and self._wants_gzip()
+            if encoded:
+                data = gzipped if gzipped is not None else gzip.compress(data, GZIP_LEVEL)
+
             self.send_response(status)
             self.send_header("Content-Type", content_type)
+            if encoded:
+                self.send_header("Content-Encoding", "gzip")
+            if compressible:
+                self.send_header("Vary", "Accept-Encoding")
             self.send_header("Content-Length", str(len(data)))
             self.send_header("Cache-Control", cache_control)
+            if etag is not None:
+                self.send_header("ETag", etag)
             # Basic hardening
             self.send_header("X-Content-Type-Options", "nosniff")
             self.end_headers()
@@ -121,28 +543,393 @@ def make_handler(context: ServerContext):
             data = json.dumps(obj).encode("utf-8")
             self._send_bytes(data, "application/json", status=status, cache_control="no-store")
 
-        def _send_file(self, path: Path, *, cache_control: str = "no-store") -> None:
-            # Stream file to client
+        def _send_validators(self, etag: str, last_modified: Optional[str], cache_control: str) -> None:
+            self.send_header("ETag", etag)
+            if last_modified is not None:
+                self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", cache_control)
+
+        def _is_not_modified(self, etag: str, mtime: Optional[float]) -> bool:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+            inm = self.headers.get("If-None-Match")
+            if inm is not None:
+                return _etag_matches(inm, etag)
+            ims = self.headers.get("If-Modified-Since")
+            if ims is not None and mtime is not None:
+                try:
+                    since = parsedate_to_datetime(ims).timestamp()
+                except (TypeError, ValueError):
+                    return False
+                return int(mtime) <= since
+            return False
+
+        def _send_not_modified(self, etag: str, last_modified: Optional[str], cache_control: str, *,
+                               vary: bool = False) -> None:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_validators(etag, last_modified, cache_control)
+            if vary:
+                self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+
+        def _requested_range(self, etag: str, last_modified: str, size: int) -> Optional[Tuple[int, int]]:
+            # Single byte range from Range/If-Range; raises ValueError when unsatisfiable
+            header = self.headers.get("Range")
+            if header is None:
+                return None
+            if_range = self.headers.get("If-Range")
+            if if_range is not None and if_range.strip() not in (etag, last_modified):
+                # The client's partial copy is stale: send the whole file.
+                return None
+            return _parse_range(header, size)
+
+        def _write_file(self, f: BinaryIO, start: int, length: int) -> None:
+            # Zero-copy os.sendfile() when possible. socket.sendfile() itself falls back to
+            # send() on platforms/sockets without it (e.g. TLS) before sending anything.
+            if context.use_sendfile and isinstance(self.connection, socket.socket):
+                self.wfile.flush()
+                sent = self.connection.sendfile(f, start, length)
+                if context.metrics is not None:
+                    self.wfile.add(sent)
+                return
+
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+        def _send_asset(self, asset: Asset) -> None:
+            # Fingerprinted static asset (see orbviewer.assets): in memory, cached forever
+            content_type = _guess_mime(Path(asset.url))
+            gzipped = asset.gzipped() if self._wants_gzip() else None
+            etag = asset.etag if gzipped is None else asset.etag[:-1] + '-gz"'
+            if self._is_not_modified(etag, None):
+                self._send_not_modified(etag, None, IMMUTABLE_CACHE_CONTROL, vary=True)
+                return
+            data = gzipped if gzipped is not None else asset.data
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", content_type)
+            if gzipped is not None:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", str(len(data)))
+            self._send_validators(etag, None, IMMUTABLE_CACHE_CONTROL)
+            self.send_header("X-Content-Type-Options", "nosniff")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_file(self, path: Path, *, cache_control: str = "no-cache") -> None:
+            # Stream file to client, honouring conditional and range requests
             try:
                 if not path.exists() or not path.is_file():
                     self.send_error(HTTPStatus.NOT_FOUND, "File not found")
                     return
 
+                st = path.stat()
                 content_type = _guess_mime(path)
-                self.send_response(HTTPStatus.OK)
+                compressible = is_compressible(path, st.st_size)
+                # Range requests address bytes of the identity representation.
+                use_gzip = compressible and "Range" not in self.headers and self._wants_gzip()
+
+                etag = _file_etag(st, "gz" if use_gzip else "")
+                last_modified = formatdate(st.st_mtime, usegmt=True)
+                if self._is_not_modified(etag, st.st_mtime):
+                    self._send_not_modified(etag, last_modified, cache_control, vary=compressible)
+                    return
+
+                if use_gzip:
+                    self._send_file_gzip(path, content_type, cache_control, etag, last_modified)
+                    return
+
+                try:
+                    byte_range = self._requested_range(etag, last_modified, st.st_size)
+                except ValueError:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header("Content-Range", f"bytes */{st.st_size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                start, end = byte_range if byte_range is not None else (0, st.st_size - 1)
+                length = end - start + 1
+
+                self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range is not None else HTTPStatus.OK)
                 self.send_header("Content-Type", content_type)
-                self.send_header("Content-Length", str(path.stat().st_size))
-                self.send_header("Cache-Control", cache_control)
+                self.send_header("Content-Length", str(length))
+                if byte_range is not None:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+                self.send_header("Accept-Ranges", "bytes")
+                self._send_validators(etag, last_modified, cache_control)
+                if compressible:
+                    self.send_header("Vary", "Accept-Encoding")
                 self.send_header("X-Content-Type-Options", "nosniff")
                 self.end_headers()
 
-                import shutil
                 with path.open("rb") as f:
-                    shutil.copyfileobj(f, self.wfile, length=64 * 1024)
+                    self._write_file(f, start, length)
             except Exception as e:
                 logger.exception("发送文件失败: %s", e)
                 self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to send file")
 
+        def _send_file_gzip(self, path: Path, content_type: str, cache_control: str, etag: str,
+                            last_modified: str) -> None:
+            # Precompressed sidecar if available, otherwise compress while streaming
+            sidecar = context.gzip_cache.lookup(path) if context.gzip_cache is not None else None
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Vary", "Accept-Encoding")
+            self._send_validators(etag, last_modified, cache_control)
+            self.send_header("X-Content-Type-Options", "nosniff")
+
+            if sidecar is not None:
+                size = sidecar.stat().st_size
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                with sidecar.open("rb") as f:
+                    self._write_file(f, 0, size)
+                return
+
+            # The compressed length is unknown up front: the body ends when the connection closes.
+            self.send_header("Connection", "close")
+            self.close_connection = True
+            self.end_headers()
+
+            if context.gzip_cache is not None:
+                for chunk in context.gzip_cache.stream(path):
+                    self.wfile.write(chunk)
+            else:
+                with path.open("rb") as f:
+                    for chunk in iter_gzip(f):
+                        self.wfile.write(chunk)
+
+        def _send_cube_api(self, handler: "CubeApiHandler", path: Path, query: Dict[str, list]) -> None:
+            # Send data derived from a cube file (see _CUBE_APIS)
+            self._send_derived([path], lambda: handler(path, query, context))
+
+        def _send_combined(self, query: Dict[str, list]) -> None:
+            # /api/combine: arithmetic on several cube files
+            try:
+                from .algebra import VOLUME_OPS
+            except ImportError as e:
+                logger.warning("cube 预处理接口不可用（需要 numpy）: %s", e)
+                self.send_error(HTTPStatus.NOT_IMPLEMENTED, "This API requires numpy")
+                return
+
+            op = (query.get("op") or [""])[0]
+            if op not in VOLUME_OPS:
+                self.send_error(HTTPStatus.BAD_REQUEST, f"op must be one of {', '.join(VOLUME_OPS)}")
+                return
+            names = query.get("file") or []
+            if len(names) != VOLUME_OPS[op]:
+                self.send_error(HTTPStatus.BAD_REQUEST, f"{op} takes {VOLUME_OPS[op]} file parameter(s)")
+                return
+
+            paths = [safe_join(context.serve_dir, name) for name in names]
+            if any(p is None for p in paths):
+                self.send_error(HTTPStatus.BAD_REQUEST, "Invalid path")
+                return
+            self._send_derived(paths, lambda: _combine_api(paths, query, context))
+
+        def _send_derived(self, paths: List[Path], compute: Callable[[], Tuple[bytes, str]]) -> None:
+            for path in paths:
+                if not path.is_file() or path.suffix.lower() not in SUPPORTED_CUBE_EXTS:
+                    self.send_error(HTTPStatus.NOT_FOUND, "Cube file not found")
+                    return
+
+            # Derived data only changes with the source files, the request parameters
+            # and the crop threshold (which follows the isovalues in default.txt/config).
+            stats = [p.stat() for p in paths]
+            variant = "|".join([self.path, str(context.crop_threshold)]
+                               + [f"{st.st_mtime_ns:x}-{st.st_size:x}" for st in stats[1:]])
+            etag = _file_etag(stats[0], format(zlib.crc32(variant.encode("utf-8")), "x"))
+            if self._is_not_modified(etag, None):
+                self._send_not_modified(etag, None, "no-cache")
+                return
+
+            try:
+                data, content_type = compute()
+            except ImportError as e:
+                # numpy is optional; the browser falls back to fetching the raw cube text.
+                logger.warning("cube 预处理接口不可用（需要 numpy）: %s", e)
+                self.send_error(HTTPStatus.NOT_IMPLEMENTED, "This API requires numpy")
+                return
+            except ApiError as e:
+                self.send_error(e.status, e.message)
+                return
+            except ValueError as e:
+                logger.error("解析 cube 文件失败 %s: %s", ", ".join(str(p) for p in paths), e)
+                self.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, f"Invalid cube file: {e}")
+                return
+
+            self._send_bytes(data, content_type, cache_control="no-cache", etag=etag)
+
+        def _write_event(self, event: str, data: Any, event_id: Optional[str] = None) -> None:
+            lines = [f"id: {event_id}"] if event_id is not None else []
+            lines += [f"event: {event}", "data: " + json.dumps(data, separators=(",", ":"))]
+            self.wfile.write(("\n".join(lines) + "\n\n").encode("utf-8"))
+            self.wfile.flush()
+
+        def _send_events(self, query: Dict[str, list]) -> None:
+            # /api/events: Server-Sent Events stream of watch mode updates
+            watcher = context.watcher
+            if watcher is None:
+                self.send_error(HTTPStatus.NOT_FOUND, "Watch mode is not enabled")
+                return
+
+            # EventSource sends Last-Event-ID when it reconnects; the page passes ?since= first.
+            # An id of another session (server restarted) makes the page reload (see below).
+            since = self.headers.get("Last-Event-ID") or (query.get("since") or [""])[0]
+            last = watcher.parse_event_id(since) if since else watcher.version
+
+            # Subscribe before replaying so no event falls in between.
+            q = watcher.subscribe()
+            try:
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                # The stream has no length; the connection cannot be reused afterwards.
+                self.close_connection = True
+                self.wfile.write(b"retry: 3000\n\n")
+
+                missed = watcher.events_since(last) if last is not None else None
+                if missed is None:
+                    # Too far behind: the page reloads to get the current config.
+                    self._write_event("reset", {"version": watcher.version})
+                    watcher.unsubscribe(q)
+                    return
+                for event in missed:
+                    self._write_event("update", event, watcher.event_id(event["version"]))
+                    last = event["version"]
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError, socket.timeout):
+                watcher.unsubscribe(q)
+                return
+
+            def stream() -> None:
+                nonlocal last
+                try:
+                    while True:
+                        try:
+                            event = q.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                        except queue.Empty:
+                            self.wfile.write(b": ping\n\n")
+                            self.wfile.flush()
+                            continue
+                        if event is None:
+                            return
+                        if event["version"] > last:
+                            self._write_event("update", event, watcher.event_id(event["version"]))
+                            last = event["version"]
+                except (BrokenPipeError, ConnectionResetError, socket.timeout):
+                    pass
+                finally:
+                    watcher.unsubscribe(q)
+
+            # The pool engine runs the stream outside its workers (see orbviewer.engine).
+            detach = getattr(self.server, "detach", None)
+            if detach is not None:
+                detach(self, stream)
+            else:
+                stream()
+
+        def _send_index(self, query: Dict[str, list]) -> None:
+            # Index page with window.ORBITAL_VIEWER_CONFIG, rendered once per template/config version
+            cfg_data = context.config_data
+            cfg_path_str: Optional[str] = None
+            watch_version: Optional[str] = None
+            key: Tuple[Any, ...]
+
+            # The browser is opened at /?config=<config_name>: that page follows the watcher too.
+            requested_config = (query.get("config") or [None])[0]
+            watched = requested_config is None or (
+                context.config_name is not None
+                and safe_join(context.serve_dir, requested_config) == context.serve_dir / context.config_name
+            )
+            if context.watcher is not None and watched:
+                version, cfg_data = context.watcher.snapshot()
+                watch_version = context.watcher.event_id(version)
+                key = ("watch", version)
+            elif cfg_data is None and "config" in query and query["config"]:
+                # Backward compatible: allow /?config=xxx.json to load config from serve_dir.
+                requested = query["config"][0]
+
+                # Only allow files under serve_dir
+                cfg_path = safe_join(context.serve_dir, requested)
+                if cfg_path is None:
+                    self.send_error(HTTPStatus.BAD_REQUEST, "Invalid config path")
+                    return
+                if not cfg_path.exists():
+                    self.send_error(HTTPStatus.NOT_FOUND, "Config not found")
+                    return
+                try:
+                    cfg_data, stamp = pages.config(cfg_path)
+                    cfg_path_str = str(cfg_path)
+                except Exception as e:
+                    logger.error("读取配置文件失败 %s: %s", cfg_path, e)
+                    self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to read config")
+                    return
+                key = ("query", cfg_path_str, stamp)
+            elif cfg_data is not None and context.config_name is not None:
+                # The preloaded config follows edits of its file.
+                cfg_path = context.serve_dir / context.config_name
+                try:
+                    cfg_data, stamp = pages.config(cfg_path)
+                    key = ("preloaded", stamp)
+                except (OSError, ValueError) as e:
+                    # Keep serving the last readable version (the one loaded at startup at first).
+                    logger.warning("重新读取配置文件失败，使用上次读取的配置 %s: %s", cfg_path, e)
+                    cached = pages.cached_config(cfg_path)
+                    if cached is not None:
+                        cfg_data = cached[0]
+                    key = ("preloaded", cached[1] if cached is not None else None)
+            else:
+                key = ("default",)
+
+            if cfg_path_str is None and context.config_name is not None:
+                cfg_path_str = context.config_name
+
+            if context.assets is not None:
+                # New asset URLs when a static file changed
+                key += (context.assets.version(),)
+
+            def render(template: str) -> bytes:
+                if context.assets is not None:
+                    template = context.assets.rewrite(template)
+                return _render_index_html(template, default_settings=context.default_settings, config_data=cfg_data,
+                                          config_path=cfg_path_str, watch_version=watch_version)
+
+            page = pages.page(key + (cfg_path_str, watch_version), render)
+            gzipped = page.gzipped if page.gzipped is not None and self._wants_gzip() else None
+            etag = page.etag if gzipped is None else page.etag[:-1] + '-gz"'
+            if self._is_not_modified(etag, None):
+                self._send_not_modified(etag, None, "no-cache", vary=True)
+                return
+            self._send_bytes(page.body, "text/html; charset=utf-8", cache_control="no-cache", etag=etag,
+                             gzipped=gzipped)
+
+        def _send_catalog(self) -> None:
+            # /api/index: header summaries of every cube under serve_dir
+            if context.catalog is None:
+                self.send_error(HTTPStatus.NOT_IMPLEMENTED, "This API requires numpy")
+                return
+
+            index = context.catalog.scan()
+            listing = json.dumps([index["files"], index["errors"]], sort_keys=True).encode("utf-8")
+            etag = f'"{zlib.crc32(listing):08x}-{len(listing):x}"'
+            if self._is_not_modified(etag, None):
+                self._send_not_modified(etag, None, "no-cache", vary=True)
+                return
+
+            data = json.dumps(index, ensure_ascii=False).encode("utf-8")
+            self._send_bytes(data, "application/json; charset=utf-8", cache_control="no-cache", etag=etag)
+
         def do_GET(self) -> None:  # noqa: N802
             try:
                 parsed = urllib.parse.urlsplit(self.path)
@@ -151,42 +938,15 @@ def make_handler(context: ServerContext):
 
                 # Index page
                 if path == "/":
-                    cfg_data = context.config_data
-                    cfg_path_str: Optional[str] = None
-
-                    # Backward compatible: allow /?config=xxx.json to load config from serve_dir.
-                    if cfg_data is None and "config" in query and query["config"]:
-                        requested = query["config"][0]
-
-                        # Only allow files under serve_dir
-                        cfg_path = safe_join(context.serve_dir, requested)
-                        if cfg_path is None:
-                            self.send_error(HTTPStatus.BAD_REQUEST, "Invalid config path")
-                            return
-                        if not cfg_path.exists():
-                            self.send_error(HTTPStatus.NOT_FOUND, "Config not found")
-                            return
-                        try:
-                            cfg_data = _read_json_file(cfg_path)
-                            cfg_path_str = str(cfg_path)
-                        except Exception as e:
-                            logger.error("读取配置文件失败 %s: %s", cfg_path, e)
-                            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to read config")
-                            return
-                    elif context.config_name is not None:
-                        cfg_path_str = context.config_name
-
-                    html = _render_index_html(
-                        context.html_template,
-                        default_settings=context.default_settings,
-                        config_data=cfg_data,
-                        config_path=cfg_path_str,
-                    )
-                    self._send_bytes(html, "text/html; charset=utf-8")
+                    self._send_index(query)
                     return
 
                 # Static assets
                 if path.startswith("/static/"):
+                    asset = context.assets.lookup(path) if context.assets is not None else None
+                    if asset is not None:
+                        self._send_asset(asset)
+                        return
                     rel = path[len("/static/") :]
                     asset_path = safe_join(context.static_dir, rel)
                     if asset_path is None:
@@ -195,6 +955,32 @@ def make_handler(context: ServerContext):
                     self._send_file(asset_path, cache_control="public, max-age=3600")
                     return
 
+                if path == "/api/index":
+                    self._send_catalog()
+                    return
+
+                if path == "/metrics":
+                    self._send_metrics(query)
+                    return
+
+                if path == "/api/combine":
+                    self._send_combined(query)
+                    return
+
+                if path == "/api/events":
+                    self._send_events(query)
+                    return
+
+                # Data derived from cube files under serve_dir (binary grids, meshes, ...)
+                for prefix, api in _CUBE_APIS.items():
+                    if path.startswith(prefix):
+                        cube_path = safe_join(context.serve_dir, path[len(prefix) :])
+                        if cube_path is None:
+                            self.send_error(HTTPStatus.BAD_REQUEST, "Invalid path")
+                            return
+                        self._send_cube_api(api, cube_path, query)
+                        return
+
                 # User files (.cub/.cube/.json etc) served from serve_dir
                 fs_path = safe_join(context.serve_dir, path)
                 if fs_path is None:
@@ -272,15 +1058,76 @@ def _open_in_browser(url: str, *, wsl: bool) -> None:
         logger.info("请手动访问: %s", url)
 
 
-def start_viewer_server(config_path: Optional[str] = None) -> None:
-    """Start the local Orbital Viewer HTTP server.
+def _create_cache(cache_dir: Optional[str], cache_max_mb: Optional[float]) -> Optional["VolumeCache"]:
+    try:
+        from .cache import VolumeCache
+    except ImportError as e:
+        logger.info("cube 预处理缓存不可用（需要 numpy）: %s", e)
+        return None
 
-    Args:
-        config_path: optional JSON config to preload.
+    max_bytes = None if cache_max_mb is None else int(cache_max_mb * 1024 * 1024)
+    cache = VolumeCache(Path(cache_dir).expanduser() if cache_dir else None, max_bytes)
+    total, gzip_bytes = split_cache_budget(max_bytes)
+    logger.info("cube 缓存目录: %s (上限 %.0f MB，其中 %.0f MB 用于压缩缓存)", cache.root, total / 1024 / 1024,
+                gzip_bytes / 1024 / 1024)
+    return cache
 
-    Behaviour remains compatible with the original serve.py:
-    - Static files come from the bundled static/ directory.
-    - When a config is provided, files (cub/json) are served from the config directory.
+
+def _create_catalog(serve_dir: Path, cache: Optional["VolumeCache"]) -> Optional["CubeCatalog"]:
+    try:
+        from .catalog import CubeCatalog
+    except ImportError as e:
+        logger.info("/api/index 不可用（需要 numpy）: %s", e)
+        return None
+    return CubeCatalog(serve_dir, cache)
+
+
+def _crop_threshold(default_settings: Dict[str, Any], config_data: Optional[Dict[str, Any]]) -> Optional[float]:
+    """CROP_FRACTION of the smallest isovalue in default.txt and the preloaded config."""
+
+    try:
+        from .volume import crop_threshold
+    except ImportError:
+        return None
+    return crop_threshold(default_settings, config_data)
+
+
+def _create_gzip_cache(cache_dir: Optional[str], cache_max_mb: Optional[float]) -> GzipCache:
+    max_bytes = None if cache_max_mb is None else int(cache_max_mb * 1024 * 1024)
+    root = Path(cache_dir).expanduser() / "gzip" if cache_dir else None
+    return GzipCache(root, max_bytes)
+
+
+def _create_httpd(engine: str, address: Tuple[str, int], handler_cls: Any, *, workers: Optional[int] = None,
+                  queue_size: Optional[int] = None, keepalive_timeout: Optional[float] = None) -> socketserver.TCPServer:
+    if engine == "threaded":
+        return ThreadedHTTPServer(address, handler_cls)
+    if engine == "pool":
+        options: Dict[str, Any] = {
+            "workers": workers or DEFAULT_WORKERS,
+            "queue_size": queue_size or DEFAULT_QUEUE_SIZE,
+        }
+        if keepalive_timeout is not None:
+            options["idle_timeout"] = keepalive_timeout
+        httpd = PooledHTTPServer(address, handler_cls, **options)
+        logger.info("服务器引擎: pool (%d 个工作线程, 队列 %d, keep-alive %.0f 秒)",
+                    httpd.workers, options["queue_size"], httpd.idle_timeout)
+        return httpd
+    raise ValueError(f"未知的服务器引擎: {engine} (可选: {', '.join(SERVER_ENGINES)})")
+
+
+def create_viewer_server(config_path: Optional[str] = None, *, host: str = "0.0.0.0", port: Optional[int] = None,
+                         use_cache: bool = True, cache_dir: Optional[str] = None,
+                         cache_max_mb: Optional[float] = None, compression: bool = True, use_sendfile: bool = True,
+                         engine: str = "threaded", workers: Optional[int] = None, queue_size: Optional[int] = None,
+                         keepalive_timeout: Optional[float] = None, crop: bool = True, watch: bool = False,
+                         watch_interval: Optional[float] = None, profiler: Optional[Profiler] = None,
+                         bundle_scripts: bool = False) -> Tuple[socketserver.TCPServer, ServerContext]:
+    """Build (but do not run) the server :func:`start_viewer_server` runs.
+
+    ``port`` defaults to the first free port (:func:`find_available_port`); 0 binds an
+    ephemeral port. The other arguments are those of :func:`start_viewer_server`.
+    The watcher, if any, is not started yet.
     """
 
     # Determine directories
@@ -307,6 +1154,13 @@ def start_viewer_server(config_path: Optional[str] = None) -> None:
         raise FileNotFoundError(f"HTML文件不存在: {html_path}")
     html_template = html_path.read_text(encoding="utf-8")
 
+    watcher: Optional[ConfigWatcher] = None
+    if watch:
+        watcher = ConfigWatcher(serve_dir, config_data, interval=watch_interval or DEFAULT_WATCH_INTERVAL)
+        if config_data is None:
+            logger.info("监视模式：根据 %s 中的 cube 文件生成了 %d 个查看器组", serve_dir, len(watcher.config["viewers"]))
+
+    cache = _create_cache(cache_dir, cache_max_mb) if use_cache else None
     context = ServerContext(
         serve_dir=serve_dir,
         static_dir=static_dir(),
@@ -314,30 +1168,92 @@ def start_viewer_server(config_path: Optional[str] = None) -> None:
         default_settings=defaults,
         config_data=config_data,
         config_name=config_name,
+        cache=cache,
+        compression=compression,
+        gzip_cache=_create_gzip_cache(cache_dir, cache_max_mb) if use_cache and compression else None,
+        use_sendfile=use_sendfile,
+        catalog=_create_catalog(serve_dir, cache),
+        crop_threshold=_crop_threshold(defaults, config_data) if crop else None,
+        watcher=watcher,
+        metrics=ServerMetrics(),
+        profiler=profiler,
+        template_path=html_path,
+        assets=StaticAssets(static_dir(), bundle=bundle_scripts),
     )
 
     # Bind server
-    port = find_available_port()
-    host = "0.0.0.0"
+    if port is None:
+        port = find_available_port()
+    handler_cls = make_handler(context)
+    httpd = _create_httpd(engine, (host, port), handler_cls, workers=workers, queue_size=queue_size,
+                          keepalive_timeout=keepalive_timeout)
+    return httpd, context
+
+
+def start_viewer_server(config_path: Optional[str] = None, *, use_cache: bool = True,
+                        cache_dir: Optional[str] = None, cache_max_mb: Optional[float] = None,
+                        compression: bool = True, use_sendfile: bool = True, engine: str = "threaded",
+                        workers: Optional[int] = None, queue_size: Optional[int] = None,
+                        keepalive_timeout: Optional[float] = None, crop: bool = True, watch: bool = False,
+                        watch_interval: Optional[float] = None, profiler: Optional[Profiler] = None,
+                        bundle_scripts: bool = False) -> None:
+    """Start the local Orbital Viewer HTTP server.
 
-    local_ip = get_local_ip()
+    Args:
+        config_path: optional JSON config to preload.
+        use_cache: keep parsed cube data in the on-disk cache (see orbviewer.cache).
+        cache_dir: cache directory (default: per-user cache dir / ORBVIEWER_CACHE_DIR).
+        cache_max_mb: cache size cap in MB (default: ORBVIEWER_CACHE_MAX_MB or 2048).
+        compression: gzip responses for clients that accept it (see orbviewer.compress).
+        use_sendfile: send files with os.sendfile() (disable to debug network issues).
+        engine: "threaded" (default) or "pool" (worker pool + HTTP/1.1 keep-alive).
+        workers: worker threads of the "pool" engine.
+        queue_size: pending requests the "pool" engine queues before applying backpressure.
+        keepalive_timeout: seconds an idle keep-alive connection stays open ("pool" engine).
+        crop: crop served grids to the region around the isosurfaces (see orbviewer.volume).
+        watch: follow new/modified cube files in serve_dir and push them to open pages
+            (see orbviewer.watch). Without a config, one is generated from serve_dir.
+        watch_interval: seconds between two polls of serve_dir in watch mode.
+        profiler: profile every request into this profiler's reports (see orbviewer.profiling).
+        bundle_scripts: serve consecutive page scripts as one bundle (see orbviewer.assets).
 
-    handler_cls = make_handler(context)
-    with ThreadedHTTPServer((host, port), handler_cls) as httpd:
+    Behaviour remains compatible with the original serve.py:
+    - Static files come from the bundled static/ directory.
+    - When a config is provided, files (cub/json) are served from the config directory.
+    """
+
+    httpd, context = create_viewer_server(
+        config_path, use_cache=use_cache, cache_dir=cache_dir, cache_max_mb=cache_max_mb, compression=compression,
+        use_sendfile=use_sendfile, engine=engine, workers=workers, queue_size=queue_size,
+        keepalive_timeout=keepalive_timeout, crop=crop, watch=watch, watch_interval=watch_interval,
+        profiler=profiler, bundle_scripts=bundle_scripts,
+    )
+    port = httpd.server_address[1]
+    local_ip = get_local_ip()
+    watcher = context.watcher
+    with httpd:
         logger.info("找到可用端口: %s", port)
         logger.info("本地访问地址: http://localhost:%s", port)
         logger.info("局域网访问地址: http://%s:%s", local_ip, port)
 
         # Construct URL (keep query param for backward compatibility)
-        if config_name:
-            url = f"http://localhost:{port}/?" + urllib.parse.urlencode({"config": config_name})
+        if context.config_name:
+            url = f"http://localhost:{port}/?" + urllib.parse.urlencode({"config": context.config_name})
         else:
             url = f"http://localhost:{port}/"
 
         logger.info("正在浏览器中打开: %s", url)
         _open_in_browser(url, wsl=is_wsl())
 
+        if watcher is not None:
+            watcher.start()
         try:
-            httpd.serve_forever()
+            with context.profiler.serving() if context.profiler is not None else contextlib.nullcontext():
+                httpd.serve_forever()
         except KeyboardInterrupt:
             logger.info("服务器已停止")
+        finally:
+            if watcher is not None:
+                watcher.stop()
+            if context.cache is not None:
+                context.cache.flush_stats()
@@ -16,6 +16,9 @@ DEFAULT_SETTINGS: Dict[str, Any] = {
     "showPositive": True,
 }
 
+# Accepted values of the volumeEncoding setting (see orbviewer.volume.VOLUME_ENCODINGS).
+VOLUME_ENCODING_NAMES = ("f32", "u16", "u8", "log16", "log8")
+
 
 def parse_default_file(file_content: str) -> Dict[str, Any]:
     """Parse a simple key=value file (default.txt)."""
@@ -54,6 +57,7 @@ def validate_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
 
     - isoValue/surfaceScale must be numeric (kept as string, consistent with existing JSON).
     - color1/color2 must be #RRGGBB.
+    - volumeEncoding (binary volume transport) must be one of VOLUME_ENCODING_NAMES.
     """
 
     out: Dict[str, Any] = dict(settings)
@@ -71,6 +75,10 @@ def validate_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
             logger.warning("无效的颜色格式 %s=%r，将忽略", key, out[key])
             out.pop(key, None)
 
+    if "volumeEncoding" in out and out["volumeEncoding"] not in VOLUME_ENCODING_NAMES:
+        logger.warning("无效的体数据编码 volumeEncoding=%r，可选: %s", out["volumeEncoding"], ", ".join(VOLUME_ENCODING_NAMES))
+        out.pop("volumeEncoding", None)
+
     return out
 
 
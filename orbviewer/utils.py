@@ -5,10 +5,12 @@ import os
 import socket
 from contextlib import closing
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 from urllib.parse import unquote
 
+logger = logging.getLogger(__name__)
+
 
 def setup_logging(level: int = logging.INFO) -> None:
     """Configure logging once.
@@ -93,3 +95,47 @@ def safe_join(base_dir: Path, request_path: str) -> Optional[Path]:
         return None
 
     return candidate
+
+
+# Size cap of the on-disk caches (orbviewer.cache / orbviewer.compress).
+DEFAULT_CACHE_MAX_MB = 2048
+
+# Share of that cap given to the gzip sidecars (orbviewer.compress); cube data gets the rest.
+GZIP_CACHE_SHARE = 0.25
+
+
+def default_cache_dir() -> Path:
+    """Per-user cache location (overridable with ORBVIEWER_CACHE_DIR)."""
+
+    env = os.environ.get("ORBVIEWER_CACHE_DIR")
+    if env:
+        return Path(env).expanduser()
+
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+        return Path(base) / "OrbitalViewer" / "cache"
+
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "orbital-viewer"
+
+
+def default_max_bytes() -> int:
+    """Size cap in bytes (overridable with ORBVIEWER_CACHE_MAX_MB)."""
+
+    try:
+        mb = float(os.environ.get("ORBVIEWER_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    except ValueError:
+        logger.warning("无效的 ORBVIEWER_CACHE_MAX_MB，使用默认值 %s MB", DEFAULT_CACHE_MAX_MB)
+        mb = DEFAULT_CACHE_MAX_MB
+    return int(mb * 1024 * 1024)
+
+
+def split_cache_budget(max_bytes: Optional[int] = None) -> Tuple[int, int]:
+    """Split the cache size cap (default :func:`default_max_bytes`) into (cube data, gzip sidecars).
+
+    Both caches live under the same directory and ``--cache-size`` caps them together.
+    """
+
+    total = default_max_bytes() if max_bytes is None else int(max_bytes)
+    gzip_bytes = int(total * GZIP_CACHE_SHARE)
+    return total - gzip_bytes, gzip_bytes
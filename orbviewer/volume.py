@@ -0,0 +1,319 @@
+"""Compact binary representation of cube volumes for the browser.
+
+Cube text costs ~13 bytes per voxel and has to be parsed in JavaScript, while a
+float32 grid costs 4 bytes and can be wrapped in a ``Float32Array`` without any
+parsing. The wire format produced by :func:`encode_grid` is::
+
+    b"OVOL"                     magic
+    uint32 (little endian)      length of the JSON header in bytes (multiple of 4)
+    JSON header                 utf-8, space padded so the payload is 4-byte aligned
+    payload                     little-endian float32 values, C order (z fastest)
+
+The JSON header carries ``dims``, ``origin``, ``axes`` (Bohr, like the cube file),
+``atoms`` and ``dtype``. It is decoded by ``ViewerGroup.parseBinaryVolume`` in
+static/viewer-group.js.
+
+Large grids also have coarse levels of detail: level ``n`` is the full grid averaged
+over blocks of ``2**n`` voxels per axis (8x / 64x fewer voxels for levels 1 / 2). The
+viewer draws a coarse level first and refines once the full grid arrived. Coarse
+headers carry ``level``, ``stride`` and the full grid's geometry under ``source``.
+
+For slow links the payload can be quantized (``encoding`` parameter of
+:func:`encode_grid`, see :data:`VOLUME_ENCODINGS`). The header then has ``dtype``
+``uint8``/``uint16`` and an ``encoding`` object; values decode as::
+
+    linear:  v = q * scale + offset
+    log:     t = q * scale + offset;  v = sign(t) * linthresh * expm1(|t|)
+
+The log variant is a symmetric log (linear below ``linthresh``), which keeps the
+relative precision constant across the orders of magnitude an orbital or density
+spans; 8-bit linear steps would be coarser than a typical 0.002 isovalue.
+
+Orbitals and densities are close to zero in most of the box, so grids can be
+cropped (``crop`` parameter of :func:`load_volume`) to the tight sub-box where
+``|value| > threshold``, padded by one voxel. With a threshold below the isovalue
+every isosurface of the cropped grid is identical to the full grid's. The bounds
+are computed once on the full grid and applied to every level of detail; cropped
+headers carry the corrected ``origin`` and ``dims``, a ``crop`` object
+(``start``, ``threshold``) and the full grid's geometry under ``source``.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cube import CubeHeader, read_cube, read_cube_header
+
+if TYPE_CHECKING:
+    from .cache import Sources, VolumeCache
+
+VOLUME_MAGIC = b"OVOL"
+VOLUME_CONTENT_TYPE = "application/x-orbital-volume"
+
+# encoding -> (quantization, bits); "f32" is the unquantized default.
+VOLUME_ENCODINGS = {
+    "f32": (None, 32),
+    "u16": ("linear", 16),
+    "u8": ("linear", 8),
+    "log16": ("log", 16),
+    "log8": ("log", 8),
+}
+
+# linthresh of the log encodings, relative to the largest |value|.
+LOG_LINTHRESH_RATIO = 1e-5
+
+# Coarsest level of detail (stride 2**LOD_MAX_LEVEL).
+LOD_MAX_LEVEL = 2
+
+# Coarse levels are only built while they keep at least this many voxels (32^3);
+# smaller grids render quickly at full resolution anyway.
+LOD_MIN_VOXELS = 32 ** 3
+
+# Crop threshold as a fraction of the smallest isovalue in use.
+CROP_FRACTION = 0.1
+
+# Slab thickness (first axis) when scanning a grid for its crop bounds.
+_CROP_SLAB = 16
+
+
+def volume_header(header: CubeHeader, **extra: Any) -> Dict[str, Any]:
+    """Build the JSON header describing a (single valued) grid."""
+
+    meta = header.to_dict()
+    # Multi-MO cubes are served one orbital at a time (the first one).
+    meta["nval"] = 1
+    meta["dtype"] = "float32"
+    meta.update(extra)
+    return meta
+
+
+def pack_volume(meta: Dict[str, Any], payload: bytes, *, magic: bytes = VOLUME_MAGIC) -> bytes:
+    """Frame a JSON header and a binary payload into a single buffer."""
+
+    head = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    head += b" " * (-len(head) % 4)
+    return magic + struct.pack("<I", len(head)) + head + payload
+
+
+def lod_levels(dims: Sequence[int]) -> int:
+    """Number of coarse levels worth building for a grid of ``dims``."""
+
+    n = float(np.prod([int(d) for d in dims]))
+    level = 0
+    while level < LOD_MAX_LEVEL and n / 8 ** (level + 1) >= LOD_MIN_VOXELS:
+        level += 1
+    return level
+
+
+def clamp_level(path: Path, level: int) -> int:
+    """Clamp a requested level of detail to the levels available for ``path``."""
+
+    if level <= 0:
+        return 0
+    return min(level, lod_levels(read_cube_header(path).dims))
+
+
+def downsample_grid(grid: np.ndarray, factor: int = 2) -> np.ndarray:
+    """Average ``factor``^3 blocks; trailing partial blocks are padded with edge values."""
+
+    pad = [(0, -n % factor) for n in grid.shape]
+    if any(after for _, after in pad):
+        grid = np.pad(grid, pad, mode="edge")
+    nx, ny, nz = (n // factor for n in grid.shape)
+    blocks = grid.reshape(nx, factor, ny, factor, nz, factor)
+    return blocks.mean(axis=(1, 3, 5), dtype=np.float32)
+
+
+def downsample_header(meta: Dict[str, Any], level: int, factor: int = 2) -> Dict[str, Any]:
+    """Header of a grid downsampled by ``factor`` from the grid described by ``meta``."""
+
+    axes = np.asarray(meta["axes"], dtype=np.float64)
+    # A block average sits at the centre of its block.
+    origin = np.asarray(meta["origin"], dtype=np.float64) + (factor - 1) / 2 * axes.sum(axis=0)
+
+    out = dict(meta)
+    out["dims"] = [-(-int(n) // factor) for n in meta["dims"]]
+    out["origin"] = origin.tolist()
+    out["axes"] = (axes * factor).tolist()
+    out["level"] = level
+    out["stride"] = 2 ** level
+    out["source"] = meta.get("source") or {k: meta[k] for k in ("dims", "origin", "axes")}
+    return out
+
+
+def crop_threshold(default_settings: Dict[str, Any], config_data: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """Crop threshold of a served folder: CROP_FRACTION of the smallest isovalue in
+    default.txt and the config (None when neither has a usable isovalue)."""
+
+    values = [default_settings.get("isoValue")]
+    if config_data is not None:
+        values += [v.get("isoValue") for v in config_data.get("viewers", []) if isinstance(v, dict)]
+
+    isovalues = []
+    for value in values:
+        try:
+            iso = abs(float(value))
+        except (TypeError, ValueError):
+            continue
+        if iso > 0 and math.isfinite(iso):
+            isovalues.append(iso)
+    if not isovalues:
+        return None
+    return CROP_FRACTION * min(isovalues)
+
+
+def crop_bounds(grid: np.ndarray, threshold: float) -> Optional[Tuple[List[int], List[int]]]:
+    """Tight ``(start, stop)`` box of the voxels with ``|value| > threshold``.
+
+    Returns None when no voxel exceeds the threshold. The grid is scanned in slabs
+    so a memory-mapped grid is never loaded (or copied) as a whole.
+    """
+
+    hits = [np.zeros(n, dtype=bool) for n in grid.shape[:3]]
+    for i in range(0, grid.shape[0], _CROP_SLAB):
+        mask = np.abs(grid[i : i + _CROP_SLAB]) > threshold
+        hits[0][i : i + _CROP_SLAB] |= mask.any(axis=(1, 2))
+        hits[1] |= mask.any(axis=(0, 2))
+        hits[2] |= mask.any(axis=(0, 1))
+
+    if not hits[0].any():
+        return None
+    start = [int(np.argmax(h)) for h in hits]
+    stop = [int(len(h) - np.argmax(h[::-1])) for h in hits]
+    return start, stop
+
+
+def crop_header(meta: Dict[str, Any], start: Sequence[int], stop: Sequence[int], threshold: float) -> Dict[str, Any]:
+    """Header of the sub-box ``[start, stop)`` of the grid described by ``meta``."""
+
+    axes = np.asarray(meta["axes"], dtype=np.float64)
+    origin = np.asarray(meta["origin"], dtype=np.float64) + np.asarray(start, dtype=np.float64) @ axes
+
+    out = dict(meta)
+    out["dims"] = [int(b - a) for a, b in zip(start, stop)]
+    out["origin"] = origin.tolist()
+    out["crop"] = {"start": [int(a) for a in start], "threshold": threshold}
+    out["source"] = meta.get("source") or {k: meta[k] for k in ("dims", "origin", "axes")}
+    return out
+
+
+def _crop_level(bounds: Tuple[List[int], List[int]], dims: Sequence[int], level: int) -> Tuple[List[int], List[int]]:
+    """Map full-grid crop bounds to ``level`` and pad them by one voxel there.
+
+    The padding keeps the cells between the last voxel above the threshold and the
+    first one below it, so surfaces are not clipped at the box faces.
+    """
+
+    f = 2 ** level
+    start = [max(a // f - 1, 0) for a in bounds[0]]
+    stop = [min(-(-b // f) + 1, int(n)) for b, n in zip(bounds[1], dims)]
+    return start, stop
+
+
+def load_volume(path: Path, cache: Optional["VolumeCache"] = None, level: int = 0,
+                crop: Optional[float] = None) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Return ``(json_header, float32_grid)`` for a cube file.
+
+    With a cache the grid is parsed once and memory-mapped on later calls. ``level``
+    selects a coarse level of detail; it is clamped to the levels the grid has.
+    Each level is built from the previous one and cached separately.
+
+    ``crop`` is a threshold: the returned grid is then a view of the sub-box where
+    ``|value| > crop`` (see :func:`crop_bounds`). The bounds are cached per threshold.
+    """
+
+    def build():
+        volume = read_cube(path)
+        data = volume.data[..., 0] if volume.data.ndim == 4 else volume.data
+        meta = volume_header(volume.header, min=float(data.min()), max=float(data.max()))
+        return meta, {"grid": data.astype("<f4", copy=False)}
+
+    if cache is None:
+        meta, arrays = build()
+        grid = arrays["grid"]
+    else:
+        entry = cache.get_or_create(path, "grid", build)
+        meta, grid = entry.meta, entry.arrays["grid"]
+    return select_volume(path, meta, grid, cache, level, crop)
+
+
+def select_volume(sources: "Sources", meta: Dict[str, Any], grid: np.ndarray, cache: Optional["VolumeCache"] = None,
+                  level: int = 0, crop: Optional[float] = None,
+                  params: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Apply the level of detail and crop of :func:`load_volume` to a full grid.
+
+    ``sources`` and ``params`` identify the grid in the cache (the source file, or
+    the operands and operation of a derived grid, see :mod:`orbviewer.algebra`).
+    """
+
+    params = dict(params or {})
+
+    bounds = None
+    if crop is not None and crop > 0:
+        def build_bounds(grid=grid):
+            found = crop_bounds(grid, crop)
+            return {"bounds": found and [found[0], found[1]]}, {}
+
+        if cache is None:
+            bounds = build_bounds()[0]["bounds"]
+        else:
+            bounds = cache.get_or_create(sources, "crop", build_bounds, params=dict(params, threshold=crop)).meta["bounds"]
+
+    for lv in range(1, min(max(level, 0), lod_levels(meta["dims"])) + 1):
+        def build_level(meta=meta, grid=grid, lv=lv):
+            return downsample_header(meta, lv), {"grid": downsample_grid(grid)}
+
+        if cache is None:
+            meta, arrays = build_level()
+            grid = arrays["grid"]
+        else:
+            entry = cache.get_or_create(sources, "grid", build_level, params=dict(params, level=lv))
+            meta, grid = entry.meta, entry.arrays["grid"]
+
+    if bounds is not None:
+        start, stop = _crop_level(bounds, meta["dims"], meta.get("level", 0))
+        if [b - a for a, b in zip(start, stop)] != [int(n) for n in meta["dims"]]:
+            meta = crop_header(meta, start, stop, crop)
+            grid = grid[start[0] : stop[0], start[1] : stop[1], start[2] : stop[2]]
+    return meta, grid
+
+
+def quantize_grid(grid: np.ndarray, encoding: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Quantize a grid; returns ``(encoding header, unsigned integer array)``."""
+
+    kind, bits = VOLUME_ENCODINGS[encoding]
+    levels = (1 << bits) - 1
+    dtype = "<u2" if bits == 16 else "u1"
+    values = np.asarray(grid, dtype=np.float32)
+    params: Dict[str, Any] = {"type": kind, "bits": bits}
+
+    if kind == "log":
+        peak = float(np.abs(values).max()) if values.size else 0.0
+        linthresh = peak * LOG_LINTHRESH_RATIO or 1.0
+        values = np.sign(values) * np.log1p(np.abs(values) / linthresh)
+        params["linthresh"] = linthresh
+
+    lo = float(values.min()) if values.size else 0.0
+    hi = float(values.max()) if values.size else 0.0
+    scale = (hi - lo) / levels if hi > lo else 1.0
+    q = np.rint((values - lo) / scale)
+    np.clip(q, 0, levels, out=q)
+    params.update(scale=scale, offset=lo)
+    return params, q.astype(dtype)
+
+
+def encode_grid(meta: Dict[str, Any], grid: np.ndarray, encoding: str = "f32") -> bytes:
+    """Encode a grid as header + little-endian payload (float32 or quantized)."""
+
+    if VOLUME_ENCODINGS[encoding][0] is None:
+        return pack_volume(meta, np.ascontiguousarray(grid, dtype="<f4").tobytes())
+
+    params, q = quantize_grid(grid, encoding)
+    meta = dict(meta, dtype="uint16" if params["bits"] == 16 else "uint8", encoding=params)
+    return pack_volume(meta, np.ascontiguousarray(q).tobytes())
@@ -0,0 +1,278 @@
+"""Watch mode: follow a calculation tree while jobs are still writing cube files.
+
+:class:`ConfigWatcher` polls ``serve_dir`` (no inotify/external services, so it
+also works on network and scratch filesystems) and keeps the served config up to
+date. A poll costs one ``stat`` per directory and per cube file:
+
+- directories are listed again only when their mtime changed (:class:`ScanCache`);
+- cube files are tracked in a ``(size, mtime_ns)`` index. A file is announced only
+  once its stamp is unchanged over one poll interval, so cubes that are still being
+  written are not pushed half finished.
+
+New files are grouped with the usual rules (:func:`group_directory`) and appended
+to the in-memory config; a group that gains its partner (``hole_N`` first,
+``electron_N`` a minute later) is completed in place, like :func:`merge_config`
+does. Groups with a deleted file are dropped (the page marks them with an error
+instead of reloading). Every change is published to
+the subscribers (the ``/api/events`` Server-Sent Events stream) as::
+
+    {"version": n, "added": [viewer, ...], "updated": [viewer, ...],
+     "removed": [[file, ...], ...], "modified": [file, ...]}
+
+``updated`` viewers carry their previous files under ``previousFiles``;
+``modified`` lists already shown files whose content changed. Stream event ids are
+``<session>-<version>`` so a page left open across a server restart notices that
+the versions started over.
+"""
+
+from __future__ import annotations
+
+import copy
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .config_gen import (
+    HoleElectronRule,
+    OrbitalRule,
+    ScanCache,
+    create_viewer_config,
+    group_directory,
+    scan_cube_dirs,
+    viewer_files,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_INTERVAL = 2.0
+
+# Events kept per subscriber; a client that falls further behind is disconnected
+# and catches up from the history when it reconnects.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Recent events replayed to reconnecting clients (see ConfigWatcher.events_since).
+EVENT_HISTORY = 200
+
+# (size, mtime_ns) of a cube file
+FileStamp = Tuple[int, int]
+
+
+def _stamp_files(root: Path, listing: Sequence[Tuple[str, List[str]]]) -> Dict[str, FileStamp]:
+    stamps: Dict[str, FileStamp] = {}
+    for rel_dir, cube_files in listing:
+        for name in cube_files:
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            try:
+                st = os.stat(os.path.join(root, rel))
+            except OSError:
+                continue
+            stamps[rel] = (st.st_size, st.st_mtime_ns)
+    return stamps
+
+
+class ConfigWatcher:
+    """Poll a folder and keep an in-memory viewer config in sync with it."""
+
+    def __init__(self, root: Path, config: Optional[Dict[str, Any]] = None, *,
+                 interval: float = DEFAULT_WATCH_INTERVAL, workers: Optional[int] = None,
+                 rules: Optional[List[OrbitalRule]] = None) -> None:
+        self.root = Path(root).resolve()
+        self.interval = max(0.1, float(interval))
+        self.workers = workers
+        self.rules = rules if rules is not None else [HoleElectronRule()]
+        self.version = 0
+        self.session = uuid.uuid4().hex[:8]
+
+        self._lock = threading.Lock()
+        self._subscribers: List["queue.Queue[Optional[Dict[str, Any]]]"] = []
+        self._history: "deque[Dict[str, Any]]" = deque(maxlen=EVENT_HISTORY)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._scan_cache = ScanCache()
+
+        # Files present at startup are published right away.
+        listing = scan_cube_dirs(self.root, self.workers, scan_cache=self._scan_cache)
+        self._seen = _stamp_files(self.root, listing)
+        self._index: Dict[str, FileStamp] = dict(self._seen)
+
+        if config is None:
+            config = {"version": "1.0", "timestamp": datetime.now().isoformat(), "viewers": []}
+            for rel_dir, cube_files in listing:
+                for group in group_directory(rel_dir, cube_files, self.rules):
+                    config["viewers"].append(create_viewer_config(group, len(config["viewers"])))
+        self._config = config
+
+    # -- subscribers ------------------------------------------------------
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._config
+
+    def snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """``(version, config)`` of the same moment (the config is replaced, never mutated)."""
+
+        with self._lock:
+            return self.version, self._config
+
+    def subscribe(self) -> "queue.Queue[Optional[Dict[str, Any]]]":
+        q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: "queue.Queue[Optional[Dict[str, Any]]]") -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def event_id(self, version: int) -> str:
+        return f"{self.session}-{version}"
+
+    def parse_event_id(self, event_id: str) -> Optional[int]:
+        """Version of an event id of this session (None for another session or garbage)."""
+
+        session, _, version = event_id.rpartition("-")
+        if session != self.session or not version.isdigit():
+            return None
+        return int(version)
+
+    def events_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Events after ``version``; None when they are no longer in the history."""
+
+        with self._lock:
+            if version == self.version:
+                return []
+            if version > self.version:
+                return None
+            events = [e for e in self._history if e["version"] > version]
+        if not events or events[0]["version"] != version + 1:
+            return None
+        return events
+
+    def _publish(self, event: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # End the stream (None); the client reconnects and catches up from the history.
+                logger.warning("实时更新客户端处理过慢，断开连接")
+                self.unsubscribe(q)
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                q.put_nowait(None)
+
+    # -- polling ----------------------------------------------------------
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """Scan once; returns the published event, or None when nothing changed."""
+
+        listing = scan_cube_dirs(self.root, self.workers, scan_cache=self._scan_cache)
+        current = _stamp_files(self.root, listing)
+        previous, self._seen = self._seen, current
+
+        # Settled: same stamp as one interval ago.
+        settled = {rel: st for rel, st in current.items() if previous.get(rel) == st}
+        added = sorted(rel for rel in settled if rel not in self._index)
+        modified = sorted(rel for rel, st in settled.items() if rel in self._index and self._index[rel] != st)
+        removed = {rel for rel in self._index if rel not in current}
+        if not (added or modified or removed):
+            return None
+
+        for rel in removed:
+            del self._index[rel]
+        for rel in added + modified:
+            self._index[rel] = settled[rel]
+
+        with self._lock:
+            config = copy.deepcopy(self._config)
+        event = self._apply(config, listing, set(added), removed)
+        event["modified"] = modified
+
+        with self._lock:
+            self.version += 1
+            event["version"] = self.version
+            config["timestamp"] = datetime.now().isoformat()
+            self._config = config
+            self._history.append(event)
+
+        logger.info("检测到文件变化：新增 %d 个、修改 %d 个、删除 %d 个 cube 文件",
+                    len(added), len(modified), len(removed))
+        self._publish(event)
+        return event
+
+    def _apply(self, config: Dict[str, Any], listing: Sequence[Tuple[str, List[str]]],
+               added: Set[str], removed: Set[str]) -> Dict[str, Any]:
+        """Update ``config`` in place for added/removed files; returns the event."""
+
+        event: Dict[str, Any] = {"added": [], "updated": [], "removed": []}
+
+        viewers: List[Dict[str, Any]] = []
+        for viewer in config.get("viewers", []):
+            files = viewer_files(viewer)
+            if files and any(f in removed for f in files):
+                event["removed"].append(files)
+            else:
+                viewers.append(viewer)
+        config["viewers"] = viewers
+        if not added:
+            return event
+
+        owner = {f: v for v in viewers for f in viewer_files(v)}
+        next_id = max((v["id"] for v in viewers if isinstance(v.get("id"), int)), default=-1) + 1
+        for rel_dir, cube_files in listing:
+            prefix = f"{rel_dir}/" if rel_dir else ""
+            names = [n for n in cube_files if prefix + n in self._index]
+            if not any(prefix + n in added for n in names):
+                continue
+            for group in group_directory(rel_dir, names, self.rules):
+                if not any(f in added for f in group):
+                    continue
+                existing = [owner[f] for f in group if f in owner]
+                if existing and all(v is existing[0] for v in existing):
+                    # The group gained a file (e.g. electron_N after hole_N): complete it in place.
+                    viewer = existing[0]
+                    previous_files = viewer_files(viewer)
+                    viewer["fileName1"] = group[0]
+                    viewer["fileName2"] = group[1] if len(group) > 1 else ""
+                    event["updated"].append(dict(viewer, previousFiles=previous_files))
+                elif not existing:
+                    viewer = create_viewer_config(group, next_id)
+                    next_id += 1
+                    viewers.append(viewer)
+                    event["added"].append(viewer)
+                else:
+                    continue
+                owner.update((f, viewer) for f in group)
+        return event
+
+    # -- lifecycle --------------------------------------------------------
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("监视目录时出错: %s", self.root)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="orbviewer-watch", daemon=True)
+        self._thread.start()
+        logger.info("正在监视 %s（每 %.1f 秒检查一次）", self.root, self.interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._publish(None)
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
@@ -107,6 +107,72 @@ async function loadConfiguration(event) {
     }
 }
 
+// 监视模式（--watch）：通过 Server-Sent Events 接收服务端发现的新增/修改文件
+// 只更新受影响的查看器组，其余组的数据无需重新下载
+function connectLiveUpdates(version) {
+    if (typeof EventSource === 'undefined') return null;
+
+    // 断线重连时浏览器会自动带上 Last-Event-ID，服务端补发错过的更新
+    const source = new EventSource(`/api/events?since=${encodeURIComponent(version)}`);
+    source.addEventListener('update', event => {
+        try {
+            applyLiveUpdate(JSON.parse(event.data));
+        } catch (error) {
+            console.error('处理实时更新失败:', error);
+        }
+    });
+    source.addEventListener('reset', () => {
+        source.close();
+        if (confirm('错过的文件更新过多，是否重新加载页面？')) {
+            location.reload();
+        }
+    });
+    return source;
+}
+
+function findGroupsByFiles(files) {
+    const names = files.filter(Boolean);
+    return viewerGroups.filter(group => names.includes(group.fileName1) || names.includes(group.fileName2));
+}
+
+function applyLiveUpdate(update) {
+    debugLog('live update', update);
+    const container = document.getElementById('viewers-container');
+
+    for (const viewerConfig of (update.added || [])) {
+        if (findGroupsByFiles([viewerConfig.fileName1, viewerConfig.fileName2]).length) continue;
+
+        // 页面上只有一个空白组时直接使用它
+        let group = viewerGroups.length === 1 && !viewerGroups[0].fileName1 && !viewerGroups[0].currentData1
+            ? viewerGroups[0]
+            : null;
+        if (!group) {
+            // 页面中组 ID 与数组下标一致，新组追加在末尾
+            group = new ViewerGroup(viewerGroups.length);
+            viewerGroups.push(group);
+            container.insertAdjacentHTML('beforeend', group.createHTML());
+            group.initialize();
+        }
+        group.loadConfiguration({ ...viewerConfig, id: group.id });
+    }
+
+    for (const viewerConfig of (update.updated || [])) {
+        for (const group of findGroupsByFiles(viewerConfig.previousFiles || [])) {
+            group.setServerFiles(viewerConfig.fileName1, viewerConfig.fileName2);
+        }
+    }
+
+    for (const group of findGroupsByFiles(update.modified || [])) {
+        group.autoLoadFiles();
+    }
+
+    for (const files of (update.removed || [])) {
+        for (const group of findGroupsByFiles(files)) {
+            group.showError(`文件已删除: ${files.join(', ')}`);
+        }
+    }
+}
+
 // 全局标题输入：同步浏览器标题
 (function setupGlobalTitleListener() {
     const globalTitleEl = document.getElementById('global-title');
@@ -157,6 +223,11 @@ document.addEventListener('DOMContentLoaded', function () {
     } else {
         addNewViewerGroup();
     }
+
+    const watchVersion = window.ORBITAL_VIEWER_CONFIG && window.ORBITAL_VIEWER_CONFIG.watchVersion;
+    if (watchVersion !== undefined) {
+        connectLiveUpdates(watchVersion);
+    }
 });
 
 // 调试用：检查 DOM 与 viewerGroups 是否一致
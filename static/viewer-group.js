@@ -25,6 +25,19 @@ class ViewerGroup {
         // 记录当前等值面（3Dmol 的 addVolumetricData/addIsosurface 生成的是 GLShape）
         // 需要用 viewer.removeShape() 移除；否则旧等值面会残留，导致修改等值面值看似无效
         this.isoShapes = [];
+        // 服务端提取等值面（/api/mesh/）时只下载网格；体数据仅在值映射时按需加载
+        this.useServerMeshes = false;
+        this.meshGeneration = 0;
+        this.volumesLoading = false;
+        // 大网格先显示粗糙层级（服务端 2^n 块平均），再细化到完整分辨率
+        this.coarseLevel = 2;
+        this.hasCoarseLevel = false;
+        // 服务端只传输 |值| 大于裁剪阈值的子网格；等值面值低于阈值时改为请求完整网格
+        this.volumeCropThreshold = 0;
+        this.cropDisabled = false;
+        // 差值模式：服务端计算 CUB2 - CUB1（如 electron - hole），只下载一个体数据
+        this.showDifference = false;
+        this.differenceData = null;
         this.title = `轨道组 ${id}`;
         this.uploadedFiles = [];
         this.fileName1 = '';
@@ -35,6 +48,9 @@ class ViewerGroup {
         this.showCub1 = true;
         this.showCub2 = true;
         this.isColorMappingEnabled = false;
+
+        // 配置中保存的视角，分子显示后恢复
+        this.pendingView = null;
         
         // 初始化备注管理器
         this.notesManager = new NotesManager(this.id);
@@ -205,6 +221,32 @@ class ViewerGroup {
         $(`#toggleCub2-${this.id}`).text(this.showCub2 ? '隐藏 CUB2' : '显示 CUB2');
     }
 
+    // 切换差值显示（CUB2 - CUB1），差值由服务端计算并缓存
+    async toggleDifference() {
+        if (!this.showDifference && !(this.fileName1 && this.fileName2)) {
+            this.showError('差值显示需要两个服务端文件');
+            return;
+        }
+        this.showDifference = !this.showDifference;
+        $(`#toggleDifference-${this.id}`).text(this.showDifference ? '显示原始数据' : '显示差值');
+        if (this.showDifference && !this.differenceData) {
+            try {
+                await this.loadDifference();
+            } catch (error) {
+                console.error('差值计算失败:', error);
+                this.showError(error.message);
+                this.showDifference = false;
+                $(`#toggleDifference-${this.id}`).text('显示差值');
+            }
+        }
+        this.updateSurfaces();
+    }
+
+    async loadDifference() {
+        const result = await this.fetchCombinedVolume('sub', [this.fileName2, this.fileName1]);
+        this.differenceData = result.volume;
+    }
+
     // 添加切换染色模式的方法
     toggleColorMapping() {
         this.isColorMappingEnabled = !this.isColorMappingEnabled;
@@ -315,6 +357,10 @@ class ViewerGroup {
             if (positiveColorEl && config.positiveColor !== undefined) {
                 positiveColorEl.value = config.positiveColor;
             }
+            const gradientTypeEl = document.getElementById(`gradientType-${this.id}`);
+            if (gradientTypeEl && config.gradientType) {
+                gradientTypeEl.value = config.gradientType;
+            }
             
             // 更新颜色选择器的禁用状态和按钮状态
             if (color1Input && color2Input) {
@@ -354,12 +400,26 @@ class ViewerGroup {
             console.error('加载备注时出错:', error);
         }
 
+        // 保存的视角在分子显示后恢复（代替 zoomTo）
+        this.pendingView = Array.isArray(config.view) && config.view.length === 8 ? config.view : null;
+
         // 如果至少有一个文件名，就开始加载
         if (this.fileName1) {
             setTimeout(() => this.autoLoadFiles(), 0);
         }
     }
 
+    // 监视模式下组内文件变化（例如 hole_N 之后才出现 electron_N）
+    setServerFiles(fileName1, fileName2) {
+        this.fileName1 = fileName1;
+        this.fileName2 = fileName2 || '';
+        this.showDifference = false;
+        $(`#toggleDifference-${this.id}`).text('显示差值');
+        $(`#file1-label-${this.id}`).text(`文件 1: ${this.fileName1}`);
+        $(`#file2-label-${this.id}`).text(`文件 2: ${this.fileName2}`);
+        this.autoLoadFiles();
+    }
+
     getConfiguration() {
         return {
             id: this.id,
@@ -376,7 +436,10 @@ class ViewerGroup {
             minMapValue: document.getElementById(`minMapValue-${this.id}`)?.value || '-0.02',
             maxMapValue: document.getElementById(`maxMapValue-${this.id}`)?.value || '0.03',
             negativeColor: document.getElementById(`negativeColor-${this.id}`)?.value || '#0000FF',
-            positiveColor: document.getElementById(`positiveColor-${this.id}`)?.value || '#FF0000'
+            positiveColor: document.getElementById(`positiveColor-${this.id}`)?.value || '#FF0000',
+            gradientType: document.getElementById(`gradientType-${this.id}`)?.value || 'rwb',
+            // 3Dmol 视角（getView() 数组），供 orbviewer render 和重新加载配置时使用
+            view: this.getViewState()
         };
     }
 
@@ -463,6 +526,9 @@ class ViewerGroup {
             this.resetViewer();
         }
 
+        // 拖放的是本地文件，只能在浏览器端提取等值面
+        this.useServerMeshes = false;
+
         // 加新文件
         this.uploadedFiles.push(...cubeFiles);
 
@@ -578,15 +644,28 @@ class ViewerGroup {
         try {
             // 加载配置时可能已经存在旧内容，先清理
             this.resetViewer();
+            this.useServerMeshes = false;
+            this.hasCoarseLevel = false;
+            this.volumeCropThreshold = 0;
+            this.differenceData = null;
+            this.currentData1 = null;
+            this.currentData2 = null;
+
+            // 优先由服务端提取等值面，只下载三角网格
+            if (this.fileName1 && await this.loadServerMeshes()) {
+                return;
+            }
 
             // 加载第一个文件
             if (this.fileName1) {
-                const response1 = await fetch(this.fileName1);
-                if (!response1.ok) {
-                    throw new Error(`无法加载文件 ${this.fileName1}: ${response1.status}`);
+                const data1 = await this.fetchVolume(this.fileName1);
+                if (typeof data1 === 'string') {
+                    this.currentData1 = data1;
+                    this.atomList = this.parseCubeFile(data1);
+                } else {
+                    this.currentData1 = data1.volume;
+                    this.atomList = this.applyVolumeHeader(data1.header);
                 }
-                this.currentData1 = await response1.text();
-                this.atomList = this.parseCubeFile(this.currentData1);
 
                 // 立即显示第一个文件
                 this.displayMolecule();
@@ -595,11 +674,8 @@ class ViewerGroup {
 
             // 仅当 fileName2 有实际值（非空字符串）时尝加载第二个文件
             if (this.fileName2 && this.fileName2.trim() !== '') {
-                const response2 = await fetch(this.fileName2);
-                if (!response2.ok) {
-                    throw new Error(`无法加载文件 ${this.fileName2}: ${response2.status}`);
-                }
-                this.currentData2 = await response2.text();
+                const data2 = await this.fetchVolume(this.fileName2);
+                this.currentData2 = typeof data2 === 'string' ? data2 : data2.volume;
 
                 // 更新显示以含第二个文件
                 this.updateSurfaces();
@@ -610,6 +686,318 @@ class ViewerGroup {
             this.showError(error.message);
         }
     }
+    // 文件名（相对 serve_dir）转换为 /api/ 路径的一部分
+    encodeApiPath(fileName) {
+        return fileName.split('/').map(encodeURIComponent).join('/');
+    }
+
+    // 优先请求服务端的二进制体数据（/api/volume/，float32），失败时回退到原始 cube 文本
+    async fetchVolume(fileName, level = 0) {
+        try {
+            const params = new URLSearchParams();
+            if (level > 0) params.set('level', level);
+            const encoding = this.getVolumeEncoding();
+            if (encoding !== 'f32') params.set('encoding', encoding);
+            if (this.cropDisabled) params.set('crop', 0);
+            const query = params.toString() ? `?${params}` : '';
+            const response = await fetch(`/api/volume/${this.encodeApiPath(fileName)}${query}`);
+            if (response.ok) {
+                const result = this.parseBinaryVolume(await response.arrayBuffer());
+                if (result.header.crop) {
+                    this.volumeCropThreshold = Math.max(this.volumeCropThreshold, result.header.crop.threshold);
+                }
+                return result;
+            }
+        } catch (e) {
+            console.warn('二进制体数据加载失败，回退到 cube 文本:', e);
+        }
+
+        const response = await fetch(fileName);
+        if (!response.ok) {
+            throw new Error(`无法加载文件 ${fileName}: ${response.status}`);
+        }
+        return response.text();
+    }
+
+    // 解析 orbviewer.volume 的二进制封装：4 字节标识 + uint32 头长度 + JSON 头 + 二进制数据
+    parseBinaryFrame(buffer, expectedMagic) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+        if (magic !== expectedMagic) {
+            throw new Error('无效的二进制数据格式');
+        }
+        const headerLength = view.getUint32(4, true);
+        const header = JSON.parse(new TextDecoder('utf-8').decode(new Uint8Array(buffer, 8, headerLength)));
+        return { header, offset: 8 + headerLength };
+    }
+
+    // 体数据传输编码：页面地址 ?encoding= 优先，其次 default.txt 的 volumeEncoding
+    // f32 为原始精度；低带宽时 u16/log16 与原始数据在常用等值面下无差别，log8 体积再减半
+    getVolumeEncoding() {
+        const fromUrl = new URLSearchParams(window.location.search).get('encoding');
+        const settings = (window.ORBITAL_VIEWER_CONFIG && window.ORBITAL_VIEWER_CONFIG.defaultSettings) || {};
+        return fromUrl || settings.volumeEncoding || 'f32';
+    }
+
+    // 服务端体数据运算（/api/combine）：op 为 add/sub/mul/abs，文件按操作数顺序排列
+    async fetchCombinedVolume(op, fileNames) {
+        const params = new URLSearchParams({ op });
+        fileNames.forEach(name => params.append('file', name));
+        const encoding = this.getVolumeEncoding();
+        if (encoding !== 'f32') params.set('encoding', encoding);
+        if (this.cropDisabled) params.set('crop', 0);
+        const response = await fetch(`/api/combine?${params}`);
+        if (!response.ok) {
+            throw new Error(`无法计算 ${op}(${fileNames.join(', ')}): ${response.status}`);
+        }
+        const result = this.parseBinaryVolume(await response.arrayBuffer());
+        if (result.header.crop) {
+            this.volumeCropThreshold = Math.max(this.volumeCropThreshold, result.header.crop.threshold);
+        }
+        return result;
+    }
+
+    // 'OVOL'：float32 网格数据，或量化后的 uint8/uint16（见 orbviewer.volume）
+    parseBinaryVolume(buffer) {
+        const { header, offset } = this.parseBinaryFrame(buffer, 'OVOL');
+        const [nx, ny, nz] = header.dims;
+        const data = this.decodeVolumeData(header, buffer, offset, nx * ny * nz);
+        return { header, volume: this.createVolumeData(header, data) };
+    }
+
+    decodeVolumeData(header, buffer, offset, count) {
+        const enc = header.encoding;
+        if (!enc) {
+            return new Float32Array(buffer, offset, count);
+        }
+
+        // 查表解码：每个量化值只计算一次
+        const q = enc.bits === 8 ? new Uint8Array(buffer, offset, count) : new Uint16Array(buffer, offset, count);
+        const table = new Float32Array(1 << enc.bits);
+        for (let i = 0; i < table.length; i++) {
+            const t = i * enc.scale + enc.offset;
+            table[i] = enc.type === 'log' ? Math.sign(t) * enc.linthresh * Math.expm1(Math.abs(t)) : t;
+        }
+
+        const data = new Float32Array(count);
+        for (let i = 0; i < count; i++) {
+            data[i] = table[q[i]];
+        }
+        return data;
+    }
+
+    // 'OMSH'：顶点坐标（Å）、法向量（float32）与三角形索引（uint32）
+    parseBinaryMesh(buffer) {
+        const { header, offset } = this.parseBinaryFrame(buffer, 'OMSH');
+        const nv = header.vertexCount;
+        const nt = header.triangleCount;
+        return {
+            header,
+            positions: new Float32Array(buffer, offset, nv * 3),
+            normals: new Float32Array(buffer, offset + nv * 12, nv * 3),
+            indices: new Uint32Array(buffer, offset + nv * 24, nt * 3)
+        };
+    }
+
+    // 请求服务端提取的等值面网格（服务端按 文件+等值面值 缓存）
+    async fetchMesh(fileName, isoValue, level = 0) {
+        const query = `?iso=${encodeURIComponent(isoValue)}` + (level > 0 ? `&level=${level}` : '');
+        const response = await fetch(`/api/mesh/${this.encodeApiPath(fileName)}${query}`);
+        if (!response.ok) {
+            throw new Error(`无法获取等值面 ${fileName}: ${response.status}`);
+        }
+        return this.parseBinaryMesh(await response.arrayBuffer());
+    }
+
+    // 尝试使用服务端等值面；服务端不支持（如未安装 numpy）时返回 false，回退到下载体数据
+    // 探测请求使用粗糙层级：网格太小时服务端返回 level 0，之后不再请求粗糙层级
+    async loadServerMeshes() {
+        let mesh;
+        try {
+            mesh = await this.fetchMesh(this.fileName1, this.getIsoValue(), this.coarseLevel);
+        } catch (e) {
+            console.warn('服务端等值面不可用，回退到浏览器端计算:', e);
+            return false;
+        }
+
+        this.useServerMeshes = true;
+        this.hasCoarseLevel = (mesh.header.level || 0) > 0;
+        this.atomList = this.applyVolumeHeader(mesh.header);
+        this.displayMolecule();
+        this.updateSurfaces();
+        return true;
+    }
+
+    // 值映射需要完整体数据：在服务端网格模式下首次需要时再下载
+    async loadVolumes() {
+        if (this.volumesLoading) return;
+        this.volumesLoading = true;
+        try {
+            if (this.hasCoarseLevel) {
+                const [coarse1, coarse2] = await Promise.all([
+                    this.fetchVolume(this.fileName1, this.coarseLevel),
+                    this.fileName2 ? this.fetchVolume(this.fileName2, this.coarseLevel) : null
+                ]);
+                this.currentData1 = typeof coarse1 === 'string' ? coarse1 : coarse1.volume;
+                this.currentData2 = coarse2 && (typeof coarse2 === 'string' ? coarse2 : coarse2.volume);
+                this.updateSurfaces();
+            }
+
+            const data1 = await this.fetchVolume(this.fileName1);
+            const data2 = this.fileName2 ? await this.fetchVolume(this.fileName2) : null;
+            this.currentData1 = typeof data1 === 'string' ? data1 : data1.volume;
+            this.currentData2 = data2 && (typeof data2 === 'string' ? data2 : data2.volume);
+            this.updateSurfaces();
+        } catch (error) {
+            console.error('体数据加载错误:', error);
+            this.showError(error.message);
+        } finally {
+            this.volumesLoading = false;
+        }
+    }
+
+    // 等值面值低于裁剪阈值时，裁剪掉的区域可能含有等值面：重新下载完整网格
+    async reloadUncroppedVolumes() {
+        this.cropDisabled = true;
+        this.volumeCropThreshold = 0;
+        try {
+            const [data1, data2] = await Promise.all([
+                this.fetchVolume(this.fileName1),
+                this.fileName2 ? this.fetchVolume(this.fileName2) : null
+            ]);
+            this.currentData1 = typeof data1 === 'string' ? data1 : data1.volume;
+            this.currentData2 = data2 && (typeof data2 === 'string' ? data2 : data2.volume);
+            this.differenceData = null;
+            if (this.showDifference) await this.loadDifference();
+            this.updateSurfaces();
+        } catch (error) {
+            console.error('体数据加载错误:', error);
+            this.showError(error.message);
+        }
+    }
+
+    // 服务端网格模式下的经典显示：并行请求 ±iso 网格，返回后替换旧等值面
+    // 大网格先显示粗糙层级的网格，完整分辨率的网格到达后再替换
+    async updateServerMeshes(isoValue) {
+        const generation = ++this.meshGeneration;
+
+        const requests = [];
+        if (this.showCub1) {
+            requests.push([this.fileName1, isoValue, this.color1]);
+            requests.push([this.fileName1, -isoValue, this.getComplementaryColor(this.color1)]);
+        }
+        if (this.showCub2 && this.fileName2) {
+            requests.push([this.fileName2, isoValue, this.color2]);
+            requests.push([this.fileName2, -isoValue, this.getComplementaryColor(this.color2)]);
+        }
+
+        const fetchAll = level => Promise.all(requests.map(([file, iso]) => this.fetchMesh(file, iso, level)));
+        const draw = meshes => {
+            this.clearIsoShapes();
+            meshes.forEach((mesh, i) => {
+                const shape = this.addMeshShape(mesh, requests[i][2]);
+                if (shape) this.isoShapes.push(shape);
+            });
+            this.viewer.render();
+        };
+
+        try {
+            let refined = false;
+            const fine = fetchAll(0).then(meshes => {
+                refined = true;
+                return meshes;
+            });
+            fine.catch(() => {});  // 错误在下面 await 时处理
+
+            if (this.hasCoarseLevel) {
+                const coarse = await fetchAll(this.coarseLevel).catch(() => null);
+                if (coarse && !refined && generation === this.meshGeneration && this.viewer) {
+                    draw(coarse);
+                }
+            }
+
+            const meshes = await fine;
+            // 等待期间等值面值又被修改过，丢弃过期结果
+            if (generation !== this.meshGeneration || !this.viewer) return;
+            draw(meshes);
+        } catch (error) {
+            console.error('等值面加载错误:', error);
+            this.showError(error.message);
+        }
+    }
+
+    addMeshShape(mesh, color) {
+        if (mesh.indices.length === 0) return null;
+
+        const { positions, normals } = mesh;
+        const n = positions.length / 3;
+        const vertexArr = new Array(n);
+        const normalArr = new Array(n);
+        for (let i = 0; i < n; i++) {
+            const j = i * 3;
+            vertexArr[i] = { x: positions[j], y: positions[j + 1], z: positions[j + 2] };
+            normalArr[i] = { x: normals[j], y: normals[j + 1], z: normals[j + 2] };
+        }
+
+        return this.viewer.addCustom({
+            vertexArr,
+            normalArr,
+            faceArr: Array.from(mesh.indices),
+            color,
+            opacity: 0.85,
+            wireframe: false
+        });
+    }
+
+    // 由头信息（Bohr）和 float32 数据直接构造 3Dmol VolumeData，与 3Dmol 自带的 cube 解析结果一致
+    createVolumeData(header, data) {
+        const bohrToAng = 0.529177;
+        const toAng = v => ({ x: v[0] * bohrToAng, y: v[1] * bohrToAng, z: v[2] * bohrToAng });
+        const origin = toAng(header.origin);
+        const [ax, ay, az] = header.axes.map(toAng);
+
+        // 未知格式名只会创建一个空的 VolumeData，随后手动填充字段
+        const volume = new $3Dmol.VolumeData('', 'binary');
+        volume.size = { x: header.dims[0], y: header.dims[1], z: header.dims[2] };
+        volume.data = data;
+
+        const orthogonal = ax.y === 0 && ax.z === 0 && ay.x === 0 && ay.z === 0 && az.x === 0 && az.y === 0;
+        if (orthogonal) {
+            volume.origin = origin;
+            volume.unit = { x: ax.x, y: ay.y, z: az.z };
+        } else {
+            const matrix = new $3Dmol.Matrix4(ax.x, ay.x, az.x, 0, ax.y, ay.y, az.y, 0, ax.z, ay.z, az.z, 0, 0, 0, 0, 1);
+            const translation = new $3Dmol.Matrix4().makeTranslation(origin.x, origin.y, origin.z);
+            volume.matrix = matrix.multiplyMatrices(translation, matrix);
+            volume.origin = { x: 0, y: 0, z: 0 };
+            volume.unit = { x: 1, y: 1, z: 1 };
+        }
+        return volume;
+    }
+
+    // 用二进制体数据的头信息设置原子/网格（等价于 parseCubeFile 对文本头部的处理）
+    applyVolumeHeader(header) {
+        const bohrToAng = 0.529177;
+        // 粗糙层级的头信息在 source 中保留完整网格的几何信息
+        const grid = header.source || header;
+        this.origin = { x: grid.origin[0], y: grid.origin[1], z: grid.origin[2] };
+        this.gridVectors = grid.axes.map((v, i) => ({ nx: grid.dims[i], x: v[0], y: v[1], z: v[2] }));
+        return header.atoms.map(atom => ({
+            elem: this.getElementSymbol(atom.number),
+            x: atom.position[0] * bohrToAng,
+            y: atom.position[1] * bohrToAng,
+            z: atom.position[2] * bohrToAng
+        }));
+    }
+
+    // currentData 可能是 cube 文本（拖放上传）或 VolumeData（二进制接口）
+    addIsoShape(data, spec) {
+        if (typeof data === 'string') {
+            return this.viewer.addVolumetricData(data, 'cube', spec);
+        }
+        return this.viewer.addIsosurface(data, spec);
+    }
+
     // 清理等值面/分子图形（加载新文件时用）
     resetViewer() {
         if (!this.viewer) return;
@@ -632,11 +1020,16 @@ class ViewerGroup {
         }
     }
 
-    // 更新表面（仅重建等值面，不重绘分子）
-    updateSurfaces() {
-        if (!this.viewer) return;
+    // 读取当前等值面值
+    getIsoValue() {
+        const isoEl = document.getElementById(`isoValue-${this.id}`);
+        let isoValue = isoEl ? parseFloat(isoEl.value) : 0.002;
+        if (!Number.isFinite(isoValue)) isoValue = 0.002;
+        return isoValue;
+    }
 
-        // 只移除已有等值面，保留分子结构/相机视角
+    // 移除已有等值面，保留分子结构/相机视角
+    clearIsoShapes() {
         // 注意：3Dmol 的 addVolumetricData/addIsosurface 生成的是 GLShape（存放在 viewer.shapes），
         // 不能用 removeAllSurfaces() 来清理，否则旧等值面会残留，导致 isoval 修改无效。
         if (typeof this.viewer.removeShape === 'function') {
@@ -672,15 +1065,47 @@ class ViewerGroup {
         if (typeof this.viewer.removeAllSurfaces === 'function') {
             this.viewer.removeAllSurfaces();
         }
+    }
 
-        const isoEl = document.getElementById(`isoValue-${this.id}`);
-        let isoValue = isoEl ? parseFloat(isoEl.value) : 0.002;
-        if (!Number.isFinite(isoValue)) isoValue = 0.002;
+    // 更新表面（仅重建等值面，不重绘分子）
+    updateSurfaces() {
+        if (!this.viewer) return;
+
+        const isoValue = this.getIsoValue();
+
+        // 差值模式：正值用 CUB2 的颜色，负值用 CUB1 的颜色
+        if (this.showDifference && this.differenceData && !this.isColorMappingEnabled) {
+            this.meshGeneration++;
+            this.clearIsoShapes();
+            if (this.volumeCropThreshold > 0 && Math.abs(isoValue) <= this.volumeCropThreshold) {
+                this.reloadUncroppedVolumes();
+            }
+            for (const [isoval, color] of [[isoValue, this.color2], [-isoValue, this.color1]]) {
+                const shape = this.addIsoShape(this.differenceData, { isoval, color, opacity: 0.85, wireframe: false });
+                if (shape) this.isoShapes.push(shape);
+            }
+            this.viewer.render();
+            return;
+        }
+
+        // 服务端网格模式：经典显示直接使用服务端等值面（旧等值面在新网格到达后再移除）
+        if (this.useServerMeshes && !(this.isColorMappingEnabled && this.fileName2)) {
+            this.updateServerMeshes(isoValue);
+            return;
+        }
+        this.meshGeneration++;
+
+        this.clearIsoShapes();
 
         if (!this.currentData1) {
+            if (this.useServerMeshes) this.loadVolumes();
             this.viewer.render();
             return;
         }
+        // 先用裁剪后的网格绘制，完整网格到达后再重绘
+        if (this.volumeCropThreshold > 0 && Math.abs(isoValue) <= this.volumeCropThreshold && this.fileName1) {
+            this.reloadUncroppedVolumes();
+        }
 
         if (this.isColorMappingEnabled && this.currentData2) {
             // 值映射模式：用 cub2 的值映射颜色，cub1 决定几何等值面
@@ -688,7 +1113,7 @@ class ViewerGroup {
             const maxValue = parseFloat(document.getElementById(`maxMapValue-${this.id}`)?.value ?? '0.03');
             const gradientType = document.getElementById(`gradientType-${this.id}`)?.value || 'rwb';
 
-            const shape = this.viewer.addVolumetricData(this.currentData1, 'cube', {
+            const shape = this.addIsoShape(this.currentData1, {
                 isoval: isoValue,
                 voldata: this.currentData2,
                 volformat: 'cube',
@@ -705,7 +1130,7 @@ class ViewerGroup {
         } else {
             // 经典模式：分别显示 cub1/cub2 的正负等值面
             if (this.showCub1) {
-                const s1 = this.viewer.addVolumetricData(this.currentData1, 'cube', {
+                const s1 = this.addIsoShape(this.currentData1, {
                     isoval: isoValue,
                     color: this.color1,
                     opacity: 0.85,
@@ -716,7 +1141,7 @@ class ViewerGroup {
                 if (s1) this.isoShapes.push(s1);
 
                 const neg1 = this.getComplementaryColor(this.color1);
-                const s2 = this.viewer.addVolumetricData(this.currentData1, 'cube', {
+                const s2 = this.addIsoShape(this.currentData1, {
                     isoval: -isoValue,
                     color: neg1,
                     opacity: 0.85,
@@ -728,7 +1153,7 @@ class ViewerGroup {
             }
 
             if (this.showCub2 && this.currentData2) {
-                const s3 = this.viewer.addVolumetricData(this.currentData2, 'cube', {
+                const s3 = this.addIsoShape(this.currentData2, {
                     isoval: isoValue,
                     color: this.color2,
                     opacity: 0.85,
@@ -739,7 +1164,7 @@ class ViewerGroup {
                 if (s3) this.isoShapes.push(s3);
 
                 const neg2 = this.getComplementaryColor(this.color2);
-                const s4 = this.viewer.addVolumetricData(this.currentData2, 'cube', {
+                const s4 = this.addIsoShape(this.currentData2, {
                     isoval: -isoValue,
                     color: neg2,
                     opacity: 0.85,
@@ -994,7 +1419,12 @@ class ViewerGroup {
             }
         }
 
-        this.viewer.zoomTo();
+        if (this.pendingView) {
+            this.viewer.setView(this.pendingView);
+            this.pendingView = null;
+        } else {
+            this.viewer.zoomTo();
+        }
         this.viewer.render();
     }
 
@@ -1106,6 +1536,9 @@ class ViewerGroup {
                     <button class="btn" id="toggleCub2-${this.id}" onclick="viewerGroups[${this.id}].toggleCub2()">
                         隐藏 CUB2
                     </button>
+                    <button class="btn" id="toggleDifference-${this.id}" onclick="viewerGroups[${this.id}].toggleDifference()">
+                        显示差值
+                    </button>
                 </div>
             </div>
         `;
@@ -1210,6 +1643,7 @@ class ViewerGroup {
                 { selector: `#isoValue-${oldId}`, newId: `isoValue-${index}` },
                 { selector: `#toggleCub1-${oldId}`, newId: `toggleCub1-${index}` },
                 { selector: `#toggleCub2-${oldId}`, newId: `toggleCub2-${index}` },
+                { selector: `#toggleDifference-${oldId}`, newId: `toggleDifference-${index}` },
                 { selector: `#toggleColorMap-${oldId}`, newId: `toggleColorMap-${index}` },
                 { selector: `#minMapValue-${oldId}`, newId: `minMapValue-${index}` },
                 { selector: `#maxMapValue-${oldId}`, newId: `maxMapValue-${index}` },
@@ -1234,6 +1668,7 @@ class ViewerGroup {
                 { selector: '.screenshot-btn', handler: `viewerGroups[${index}].takeScreenshot()` },
                 { selector: `#toggleCub1-${index}`, handler: `viewerGroups[${index}].toggleCub1()` },
                 { selector: `#toggleCub2-${index}`, handler: `viewerGroups[${index}].toggleCub2()` },
+                { selector: `#toggleDifference-${index}`, handler: `viewerGroups[${index}].toggleDifference()` },
                 { selector: `#toggleColorMap-${index}`, handler: `viewerGroups[${index}].toggleColorMapping()` }
             ];
 